@@ -1,35 +1,58 @@
-import os, time, pandas as pd
+from __future__ import annotations
+import os, time, threading, pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from loguru import logger
 
-from .utils import utcnow, next_hour_plus_15s
-from .notifier import send_text, send_text_plain
-from .store import ensure_schema
+from .utils import utcnow
+from .config import load_params
+from .notifier import send_text, send_text_plain, stats as notify_stats
+from .store import ensure_schema, BATCH as DB_BATCH, INSERT_EVAL
 from .binance import BinanceFutures
-from .scoring import score_symbol, aplus_pass
+from .klines import STORE as KLINE_STORE, OHLCV, decode_klines
+from .funding import CACHE as FUNDING
+from .tickers import TickerSnapshot, get_snapshot as get_tickers, snapshot_stats as tickers_stats
+from .scoring import score_many, aplus_pass
 from .gates import (gate_A_true_breakout, gate_B_pullback_confirm,
                     gate_C_crowded_check, gate_D_executable,
                     compute_c_metrics, gate_C_crowded_check_from_metrics,
                     estimate_orderbook_metrics)
 from .planner import make_plan
+from .instrument import StageTimer, profiled, profile_mode, write_report
+from .scheduler import YIELD, Job, Scheduler, parse_every, spread_batches
+from . import metrics
+from .pipeline import Pipeline, Stage
 from .risk import allow_new_open, switches
 from .runner import on_plan, place_orders, runner_tick
 from .base_pool import build_base_pool_from_24h
-from .overlay import decay as overlay_decay, update_from_t24 as overlay_update, top as overlay_top
+from .overlay import (decay as overlay_decay, update_from_t24 as overlay_update, top as overlay_top,
+                      flush as overlay_flush, set_half_life as overlay_half_life)
 
 BUILD_TAG = "v1.2-full"
 
 FALLBACK_POOL = ["BTCUSDT","ETHUSDT","SOLUSDT","BNBUSDT","XRPUSDT","ADAUSDT","DOGEUSDT","TONUSDT"]
 _DAILY_POOL = {"date": None, "symbols": []}
-_LAST_T24 = {"ts": 0, "data": []}
+_CLIENT = {"bnz": None}
+_SCAN_LOCK = threading.Lock()   # 同一进程内扫描互斥：调度器之外的调用也不会叠跑
 
-def fetch_df(bnz: BinanceFutures, symbol: str, interval="1h", limit=200) -> pd.DataFrame:
-    arr = bnz.klines(symbol=symbol, interval=interval, limit=limit)
-    cols = ["open_time","open","high","low","close","volume","close_time","qav","trades","taker_base","taker_quote","ignore"]
-    df = pd.DataFrame(arr, columns=cols)
-    for c in ["open","high","low","close","volume","qav","taker_base","taker_quote"]:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-    return df[["open","high","low","close","volume"]]
+def get_client(params: dict | None = None) -> BinanceFutures:
+    # 进程内复用同一个客户端，连接池跨扫描保持
+    if _CLIENT["bnz"] is None:
+        scan_cfg = (params or {}).get("scan",{})
+        kw = {}
+        if scan_cfg.get("http_pool_size"): kw["pool_size"] = int(scan_cfg["http_pool_size"])
+        if scan_cfg.get("weight_limit_1m"): kw["weight_limit"] = int(scan_cfg["weight_limit_1m"])
+        if scan_cfg.get("weight_safety"): kw["weight_safety"] = float(scan_cfg["weight_safety"])
+        _CLIENT["bnz"] = BinanceFutures(**kw)
+    return _CLIENT["bnz"]
+
+def fetch_df(bnz: BinanceFutures, symbol: str, interval="1h", limit=200, cached: bool = True) -> pd.DataFrame:
+    if cached:
+        # 本地列式 K 线库：预热后每次只拉最后收盘之后的新 bar，读出即为 float64 列
+        cols = KLINE_STORE.get(bnz, symbol, interval, limit)
+    else:
+        cols = decode_klines(bnz.klines(symbol=symbol, interval=interval, limit=limit))
+    return pd.DataFrame({c: cols[c] for c in OHLCV})
 
 def heartbeat(bnz: BinanceFutures):
     try:
@@ -38,22 +61,18 @@ def heartbeat(bnz: BinanceFutures):
     except Exception as e:
         logger.exception(e)
 
-def _get_t24(bnz: BinanceFutures, cache_sec: int):
-    now = time.time()
-    if _LAST_T24["data"] and now - _LAST_T24["ts"] < cache_sec:
-        return _LAST_T24["data"]
-    t24 = bnz.tickers_24h()
-    _LAST_T24.update(ts=now, data=t24)
-    return t24
-
-def refresh_daily_base_pool(bnz: BinanceFutures, params: dict):
-    date_utc = utcnow().strftime("%Y-%m-%d")
-    if _DAILY_POOL["date"] == date_utc and _DAILY_POOL["symbols"]:
+def _tickers(bnz: BinanceFutures, params: dict) -> TickerSnapshot:
+    return get_tickers(bnz, int(params.get("scan",{}).get("tickers_cache_sec",600)))
+
+def refresh_daily_base_pool(bnz: BinanceFutures, params: dict, snap: TickerSnapshot | None = None, date_utc: str | None = None):
+    # date_utc 可提前指定（调度器在零点前把次日池算好，零点扫描直接用）
+    date_utc = date_utc or utcnow().strftime("%Y-%m-%d")
+    if _DAILY_POOL["symbols"] and (_DAILY_POOL["date"] or "") >= date_utc:  # 已提前算好次日池时不回退
         return _DAILY_POOL["symbols"]
-    t24 = bnz.tickers_24h()
+    snap = snap if snap is not None else _tickers(bnz, params)
     size = int(params.get("symbol_pool", {}).get("base_pool_daily_size", 120))
     min_qv = float(params["symbol_pool"]["min_quote_vol"])
-    base = build_base_pool_from_24h(t24, size, min_qv)
+    base = build_base_pool_from_24h(snap, size, min_qv)
     if not base: base = FALLBACK_POOL
     _DAILY_POOL.update(date=date_utc, symbols=base)
     Path("reports").mkdir(exist_ok=True, parents=True)
@@ -61,96 +80,273 @@ def refresh_daily_base_pool(bnz: BinanceFutures, params: dict):
     send_text(f"🗂️ 日基础池刷新 `{date_utc}`：{len(base)} 个")
     return base
 
-def build_pool(bnz: BinanceFutures, params: dict):
-    daily = refresh_daily_base_pool(bnz, params)
-    cache_sec = int(params.get("scan",{}).get("tickers_cache_sec",600))
-    t24 = _get_t24(bnz, cache_sec)
-    overlay_decay(float(params.get("sampling",{}).get("overlay_decay_hours",2)))
-    overlay_update(t24, int(params.get("overlay",{}).get("top_movers",30)))
+def build_pool(bnz: BinanceFutures, params: dict, update: bool = True):
+    # 同一份 tickers 快照供基础池与 overlay 使用（刷新日也只拉一次）；update=False 只读热度（预取用，不重复加热）
+    snap = _tickers(bnz, params)
+    daily = refresh_daily_base_pool(bnz, params, snap)
+    if update:
+        overlay_decay(float(params.get("sampling",{}).get("overlay_decay_hours",2)),
+                      float(params.get("overlay",{}).get("prune_heat",0.001)))
+        overlay_update(snap, int(params.get("overlay",{}).get("top_movers",30)))
     ol_top = overlay_top(limit=int(params["symbol_pool"]["max_symbols"]))
+    if update: overlay_flush(float(params.get("overlay",{}).get("flush_sec",300)))
     merged=[]
     for s in ol_top + daily:
         if s not in merged: merged.append(s)
         if len(merged) >= int(params["symbol_pool"]["max_symbols"]): break
     return merged or (daily[:int(params["symbol_pool"]["max_symbols"])] or FALLBACK_POOL)
 
-def scan_once():
+def scan_stages(bnz: BinanceFutures, params: dict, timer: StageTimer | None = None) -> list[Stage]:
+    # 闸门决策与逐币串行版一致（全部为“与”关系），只是按代价重排：
+    # A/B 只看最后几根 bar，先否决绝大多数；评分（面板批量）只算幸存者；C/D 含网络请求放最后
+    notional = float(os.getenv("MAX_NOTIONAL_USDT","200") or 200)
+    timer = timer or StageTimer()
+
+    def _score(ctxs):
+        oks = []
+        for c, sc in zip(ctxs, score_many([c["df"] for c in ctxs], params)):
+            if isinstance(sc, Exception): oks.append(sc); continue
+            total, detail = sc
+            c["gate_ctx"] = dict(**detail, total=total)
+            oks.append(aplus_pass(c["gate_ctx"], params))
+        return oks
+
+    use_cache = bool(params.get("scan",{}).get("funding_cache", True))
+
+    def _gate_c(c):
+        fr = FUNDING.get(c["sym"]) if use_cache else None
+        if fr is None:  # 未预取（funding_cache 关闭或预取失败）才直连
+            try:
+                with timer.stage("funding"):
+                    fr = bnz.funding_rate(c["sym"], limit=30)
+            except Exception:
+                fr = []
+        c["cmet"] = compute_c_metrics(c["df"], fr)
+        return gate_C_crowded_check_from_metrics(c["cmet"], params)
+
+    def _gate_d(c):
+        df = c["df"]
+        with timer.stage("plan"):
+            plan = c["plan"] = make_plan(df, "LONG", params)
+        try:
+            with timer.stage("depth"):
+                ob = bnz.depth(c["sym"], limit=50)
+            mid = float(df["close"].iloc[-1])
+            obm = estimate_orderbook_metrics(ob, mid, notional_usdt=notional)
+            spread, impact, obi = obm["spread_bps"], obm["impact_bps"], obm["obi_abs"]
+        except Exception:
+            spread, impact, obi = 1e9, 1e9, 1e9
+        c["obm"] = {"spread_bps": spread, "impact_bps": impact, "obi_abs": obi}
+        return gate_D_executable(spread, plan["room"], plan["costR"], params, impact_bps=impact, obi_abs=obi)
+
+    return [
+        Stage("gate_A", 1,   lambda c: gate_A_true_breakout(c["df"], params)),
+        Stage("gate_B", 1,   lambda c: gate_B_pullback_confirm(c["df"], params)),
+        Stage("score",  20,  _score, batch=True),
+        Stage("gate_C", 100, _gate_c, io=True),
+        Stage("gate_D", 100, _gate_d, io=True, after=("gate_C",)),
+    ]
+
+def _num(x):
+    return None if x is None else float(x)
+
+def eval_rows(ts: int, ctxs: list, passed: set) -> list:
+    """ctx → scan_evals 行（列序同 store.EVAL_COLS）；未走到的阶段留 NULL。"""
+    rows = []
+    for c in ctxs:
+        g, cm, ob, pl = c.get("gate_ctx") or {}, c.get("cmet") or {}, c.get("obm") or {}, c.get("plan") or {}
+        rows.append((ts, c["sym"], int(c["sym"] in passed), c.get("rejected_by"), c.get("error"),
+                     *(_num(g.get(k)) for k in ("total","ema30_slope","r2","chop","piv_bias","cvd","tib","vboost")),
+                     *(_num(cm.get(k)) for k in ("funding_pctl","speed_pctl","z_abs")),
+                     *(_num(ob.get(k)) for k in ("spread_bps","impact_bps","obi_abs")),
+                     _num(pl.get("room")), _num(pl.get("costR"))))
+    return rows
+
+def scan_once(pool: str = "full", interval: str | None = None, max_symbols: int | None = None, tag: str = "scan") -> bool:
+    """pool="full"：日基础池 + overlay；pool="overlay"：只扫 overlay 热点（快扫）。已有扫描在跑时直接返回 False。"""
+    if not _SCAN_LOCK.acquire(blocking=False):
+        logger.warning("{} skipped: another scan is still running", tag)
+        return False
+    try:
+        # ATS_PROFILE=cprofile|sample 剖析本进程第一轮；运行中 touch reports/profile.next 剖析下一轮
+        with profiled(profile_mode()):
+            _scan_once(pool, interval, max_symbols, tag)
+        return True
+    finally:
+        _SCAN_LOCK.release()
+
+def _scan_once(pool: str, interval: str | None, max_symbols: int | None, tag: str):
     import yaml
     params = yaml.safe_load(open("params.yml")) or {}
     ensure_schema()
-    bnz = BinanceFutures()
+    bnz = get_client(params)
     sw = switches()
+    timer = StageTimer()
 
     scan_cfg = params.get("scan", {})
-    max_per_scan = int(scan_cfg.get("max_symbols_per_scan", 18))
-    pause_ms = int(scan_cfg.get("per_symbol_pause_ms", 350))
-    pause_sec = max(0.05, pause_ms/1000.0)
+    max_per_scan = int(max_symbols or scan_cfg.get("max_symbols_per_scan", 18))
+    concurrency = max(1, int(scan_cfg.get("concurrency", 1)))
     mute_err = os.getenv("NOTIFY_MUTE_ERRORS","0") == "1"
 
-    picks = build_pool(bnz, params)[:max_per_scan]
+    with timer.stage("pool"):
+        # 快扫只读 overlay 当前热度（加热/衰减仍只在整点全量扫描里做，热度节奏不变）
+        picks = (overlay_top(limit=max_per_scan) if pool == "overlay" else build_pool(bnz, params))[:max_per_scan]
 
-    passed, errors = [], []
-    for sym in picks:
-        try:
-            df = fetch_df(bnz, sym, params["sampling"]["main_interval"], 200)
-            total, detail = score_symbol(df, params)
-            gate_ctx = dict(**detail, total=total)
-            if not aplus_pass(gate_ctx, params):               time.sleep(pause_sec); continue
-            if not gate_A_true_breakout(df, params):           time.sleep(pause_sec); continue
-            if not gate_B_pullback_confirm(df, params):        time.sleep(pause_sec); continue
+    # 并发只影响取数/计算；结果按 picks 原顺序处理，下单仍在主线程
+    ex = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="scan") if concurrency > 1 else None
+    pmap = (lambda fn, items: list(ex.map(fn, items))) if ex else (lambda fn, items: list(map(fn, items)))
+    interval = interval or params["sampling"]["main_interval"]
+    use_store = bool(scan_cfg.get("kline_store", True))
 
-            try:
-                fr = bnz.funding_rate(sym, limit=30)
-            except Exception:
-                fr = []
-            cmet = compute_c_metrics(df, fr)
-            if not gate_C_crowded_check_from_metrics(cmet, params): time.sleep(pause_sec); continue
+    def _fetch(ctx):
+        try:
+            with timer.stage("klines"):
+                ctx["df"] = fetch_df(bnz, ctx["sym"], interval, 200, cached=use_store)
+        except Exception as e:
+            logger.exception(e)
+            ctx["error"] = (repr(e) or "err")[:240]
+        return ctx
 
-            plan = make_plan(df, "LONG", params)
-            try:
-                ob = bnz.depth(sym, limit=50)
-                mid = float(df["close"].iloc[-1])
-                notional = float(os.getenv("MAX_NOTIONAL_USDT","200") or 200)
-                obm = estimate_orderbook_metrics(ob, mid, notional_usdt=notional)
-                spread, impact, obi = obm["spread_bps"], obm["impact_bps"], obm["obi_abs"]
-            except Exception:
-                spread, impact, obi = 1e9, 1e9, 1e9
-            if not gate_D_executable(spread, plan["room"], plan["costR"], params, impact_bps=impact, obi_abs=obi):
-                time.sleep(pause_sec); continue
+    scan_ts = int(time.time())
+    ctxs = [{"sym": sym} for sym in picks]
+    pipe = Pipeline(scan_stages(bnz, params, timer))
+    try:
+        # 资金费率每 8h 才结算一次：扫描开始按 premiumIndex 只补缺失的结算（含未缓存币），Gate C 读内存
+        if bool(scan_cfg.get("funding_cache", True)):
+            with timer.stage("funding_prefetch"):
+                FUNDING.refresh(bnz, picks, pmap=pmap)
+        pmap(_fetch, ctxs)
+        survivors = pipe.run([c for c in ctxs if "error" not in c], pmap=pmap)
+    finally:
+        if ex: ex.shutdown()
+    for name, st in pipe.summary().items():
+        timer.add(name, st["sec"])
 
+    passed, errors = [], []
+    for c in ctxs:
+        if "error" in c: errors.append((c["sym"], c["error"]))
+    for c in survivors:
+        sym, plan, gate_ctx = c["sym"], c["plan"], c["gate_ctx"]
+        try:
             passed.append((sym, plan, gate_ctx))
-            on_plan(sym, plan, gate_ctx)
+            on_plan(sym, plan, gate_ctx, ts=scan_ts)
             if allow_new_open(params):
-                place_orders(bnz, sym, plan, maker_only=True, dry=sw["dry"])
+                with timer.stage("orders"):
+                    place_orders(bnz, sym, plan, maker_only=True, dry=sw["dry"])
         except Exception as e:
             logger.exception(e)
             errors.append((sym, (repr(e) or "err")[:240]))
-        finally:
-            time.sleep(pause_sec)
 
-    if errors and not mute_err:
-        sample = "\n".join([f"{s}: {m}" for s,m in errors[:8]])
-        send_text_plain(f"⚠️ 扫描异常 {len(errors)}/{len(picks)} 个：\n{sample}")
-    send_text(f"📊 扫描完成：候选 {len(picks)} / 计划 {len(passed)}")
-    runner_tick(bnz)
+    with timer.stage("notify"):
+        if errors and not mute_err:
+            sample = "\n".join([f"{s}: {m}" for s,m in errors[:8]])
+            send_text_plain(f"⚠️ 扫描异常 {len(errors)}/{len(picks)} 个：\n{sample}")
+        if pool != "overlay": send_text(f"📊 扫描完成：候选 {len(picks)} / 计划 {len(passed)}")
+        elif passed: send_text(f"⚡ 快扫（{interval}）：热点 {len(picks)} / 计划 {len(passed)}")
+    with timer.stage("runner"):
+        runner_tick(bnz)
+    # 逐币评估明细 + 本轮攒下的计划，一个事务落库
+    with timer.stage("db_flush"):
+        DB_BATCH.extend(INSERT_EVAL, eval_rows(scan_ts, ctxs, {c["sym"] for c in survivors} - {s for s,_ in errors}))
+        n_rows = DB_BATCH.flush()
+    http = bnz.stats(reset=True)
+    rec = {"ts": scan_ts, "job": tag, "interval": interval, "wall_sec": round(timer.wall(), 3), "picks": len(picks), "passed": len(passed), "errors": len(errors),
+           "concurrency": concurrency, "spans": timer.summary(), "gates": pipe.summary(),
+           "http": {p: {k: st[k] for k in ("n","err","avg_ms","max_sec","reused","new_conn","hist")} for p, st in http.items()},
+           "weight": bnz.limiter.snapshot(), "throttle": bnz.throttle_stats(), "klines": KLINE_STORE.reset_stats(), "funding": FUNDING.reset_stats(),
+           "tickers": tickers_stats(), "notify": notify_stats(), "db_rows": n_rows}
+    logger.info("{} done {} symbols in {:.2f}s (concurrency={}) | {}", tag, len(picks), rec["wall_sec"], concurrency, timer.line())
+    logger.info("gates {}", pipe.line())
+    for path, st in sorted(http.items()):
+        logger.info("http {} n={} err={} avg={}ms p90<={}ms max={:.0f}ms reused={} new_conn={}", path, st["n"], st["err"],
+                    st["avg_ms"], st["hist"]["p90"], st["max_sec"]*1e3, st["reused"], st["new_conn"])
+    logger.info("weight {} | klines {} | funding {} | tickers {} | db_rows {}", rec["weight"], rec["klines"], rec["funding"],
+                rec["tickers"], n_rows)
+    if params.get("instrument", {}).get("report", True):
+        try: write_report(rec)
+        except Exception as e: logger.warning("scan report write failed: {}", e)
+    metrics.observe_scan(rec)
+
+def prefetch_before_boundary(deadline: float, stop: threading.Event | None = None, yield_at=None):
+    """整点前的空闲窗口：按下一轮的池把冷币 K 线（本地文件缺失/过旧）与未缓存的资金费率分批拉好，
+    均匀摊到 deadline 之前，整点后的扫描只剩每币一次增量 K 线请求。yield_at() 到点则返回 YIELD 让出调度线程。"""
+    import yaml
+    params = yaml.safe_load(open("params.yml")) or {}
+    ensure_schema()
+    bnz = get_client(params)
+    scan_cfg = params.get("scan", {})
+    interval = params["sampling"]["main_interval"]
+    picks = build_pool(bnz, params, update=False)[:int(scan_cfg.get("max_symbols_per_scan", 18))]
+    items = [("klines", s) for s in picks if bool(scan_cfg.get("kline_store", True)) and not KLINE_STORE.is_warm(s, interval, 200)]
+    if bool(scan_cfg.get("funding_cache", True)):
+        FUNDING.refresh(bnz, picks, cold=False)   # 冷币留给下面分批拉，不在这里一次打满
+        items += [("funding", s) for s in picks if not FUNDING.has(s)]
+
+    def _one(it):
+        kind, sym = it
+        try:
+            if kind == "klines": KLINE_STORE.get(bnz, sym, interval, 200)
+            else: FUNDING.fetch(bnz, sym)
+        except Exception as e:
+            logger.warning("prefetch {} {} failed: {}", kind, sym, e)
+
+    t0 = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, int(scan_cfg.get("concurrency", 1))), thread_name_prefix="prefetch") as ex:
+        done, yielded = spread_batches(items, lambda b: list(ex.map(_one, b)), deadline, yield_at, stop)
+    # 预取的请求/缓存计数不计入下一轮扫描报告
+    http = bnz.stats(reset=True)
+    logger.info("prefetch {}/{} items for {} picks in {:.0f}s | requests {} | klines {} | funding {}", done, len(items), len(picks),
+                time.time()-t0, {p: st["n"] for p, st in http.items()}, KLINE_STORE.reset_stats(), FUNDING.reset_stats())
+    return YIELD if yielded else None
+
+def build_scheduler(params: dict) -> Scheduler:
+    """按 params.yml 的 schedule 段组装作业（改动需重启进程生效）。"""
+    cfg = params.get("schedule", {}) or {}
+    # overlay 热度的半衰期在首次 decay() 之前也要对：快扫可能比第一轮整点扫描先跑
+    overlay_half_life(float(params.get("sampling",{}).get("overlay_decay_hours",2)))
+    delay = float(cfg.get("delay_sec", 15))
+    every = parse_every(cfg.get("scan_every", params["sampling"]["main_interval"]))
+    late = float(cfg.get("max_late_frac", 0.5))
+    jobs = [Job("scan", every, lambda: scan_once(tag="scan"), offset=delay, priority=3, covers=("fast",), max_late_frac=late)]
+    if cfg.get("fast_every"):
+        jobs.append(Job("fast", parse_every(cfg["fast_every"]), lambda: scan_once(
+            pool="overlay", interval=cfg.get("fast_interval"), max_symbols=int(cfg.get("fast_max_symbols", 30)), tag="fast"),
+            offset=delay, priority=2, max_late_frac=late))
+    lead = float(cfg.get("daily_pool_lead_sec", 900))
+    # 零点前 lead 秒算好次日基础池，让零点前的预取能覆盖新进池的币
+    jobs.append(Job("daily_pool", 86400.0, lambda: refresh_daily_base_pool(
+        get_client(params), params, date_utc=time.strftime("%Y-%m-%d", time.gmtime(time.time()+lead+60))),
+        offset=-lead, priority=4, max_late_frac=0.9))
+    pre = float(cfg.get("prefetch_lead_sec", 600))
+    if pre > 0:
+        jobs.append(Job("prefetch", every, lambda: prefetch_before_boundary(
+                            sched.due_of("scan") - 20, sched.stop, lambda: sched.yield_at("prefetch")),
+                        offset=-pre, priority=1, max_late_frac=0.1))
+
+    def on_event(job, kind, info):
+        metrics.observe_job(job.name, {**job.stats, "every": job.every})
+        if kind == "overrun":
+            send_text_plain(f"⏱️ {job.name} 超时：耗时 {info['sec']:.0f}s，超过下一触发点 {info['over_sec']:.0f}s（周期 {job.every:.0f}s）")
+        elif kind == "skipped":
+            send_text_plain(f"⏭️ {job.name} 跳过 {info['missed']} 次（已迟到 {info['late_sec']:.0f}s）")
+        elif kind == "error" and job.name in ("scan", "fast"):
+            metrics.scan_failed()
+            send_text_plain(f"❌ 扫描异常：{(repr(info['error']) or 'unknown')[:400]}")
+
+    sched = Scheduler(jobs, on_event=on_event)
+    return sched
 
 def main_loop():
     Path("reports").mkdir(parents=True, exist_ok=True)
     logger.add("reports/ats.log", rotation="10 MB", retention=5)
     send_text("🚀 ATS QF v1.2 启动（模拟模式默认）")
-    heartbeat(BinanceFutures())
-    while True:
-        now = utcnow()
-        tgt = next_hour_plus_15s(now)
-        delay = max(1, int((tgt-now).total_seconds()))
-        logger.info("sleep {}s until {}", delay, tgt.isoformat())
-        time.sleep(delay)
-        try:
-            scan_once()
-        except Exception as e:
-            logger.exception(e)
-            send_text_plain(f"❌ 扫描异常：{(repr(e) or 'unknown')[:400]}")
-            time.sleep(5)
+    ensure_schema()
+    heartbeat(get_client(load_params()))
+    metrics.serve(get_client())  # METRICS_PORT 未设置则不启动
+    sched = build_scheduler(load_params())
+    for j in sorted(sched.jobs, key=lambda j: j.next_due):
+        logger.info("job {} every {:.0f}s, next {}", j.name, j.every, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(j.next_due)))
+    sched.run_forever()
 
 if __name__ == "__main__":
     main_loop()
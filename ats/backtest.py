@@ -0,0 +1,257 @@
+from __future__ import annotations
+# 离线回测：读本地列式 K 线（db/klines），对每币每根已收盘 bar 一次性算出评分与 A–D 闸门掩码，
+# 再按 planner.make_plan 的 L1/L2/L3、SL、TP1(保本)、TP2 逐笔撮合。无网络。
+#   python -m ats.backtest --interval 1h --start 2024-01-01 --end 2025-01-01 [--symbols A,B] [--out trades.csv]
+# 实盘扫描只在本地保留最近约 200 根；回测前先补历史：python -m ats.klines backfill --interval 1h --bars 9000
+# 与实盘扫描的差异（按影响大小）：
+#   1) 回测在已收盘 bar t 上判断、以 close[t] 入场；实盘扫描在整点后约 15 秒运行，KlineStore.get 返回的最后一根
+#      是刚开盘的未收盘 bar，评分与闸门（A 的突破、B 的实体/收盘位置、量能）都落在这根只有十几秒的 bar 上。
+#      这是回测与实盘之间最大的口径差，回测结果不能直接当作实盘信号的表现；
+#   2) 指标在全历史上递推（实盘为最近 200 根窗口，EMA/ZigZag 的起点不同）；
+#   3) 资金费率分位离线按 0 计；盘口（spread/impact/OBI）取 params.backtest 的假设值；不模拟选币池。
+import argparse, json, sys, time
+from pathlib import Path
+import numpy as np, pandas as pd
+from loguru import logger
+from . import panel as P
+from .indicators import zigzag
+from .klines import KLINE_DIR, INTERVAL_MS, read_klines
+
+DEFAULTS = {"window": 200, "entry_ttl_bars": 4, "max_hold_bars": 48, "tp1_frac": 0.5,
+            "fee_maker_bps": 2.0, "fee_taker_bps": 5.0, "chunk": 16,
+            "assume": {"spread_bps": 2.0, "impact_bps": 2.0, "obi_abs": 0.1}}
+
+def bt_config(params: dict) -> dict:
+    cfg = {**DEFAULTS, **(params.get("backtest") or {})}
+    cfg["assume"] = {**DEFAULTS["assume"], **(cfg.get("assume") or {})}
+    return cfg
+
+def gate_thr(params: dict, name: str) -> dict:
+    # 闸门阈值可写在 thresholds.<X> 或 thresholds.gates.<X>
+    th = params["thresholds"]
+    return th[name] if name in th else th["gates"][name]
+
+def list_symbols(interval: str, root: str = KLINE_DIR) -> list:
+    return sorted(p.stem for p in (Path(root)/interval).glob("*.kcol"))
+
+def load_panel(symbols: list, interval: str, root: str = KLINE_DIR, start_ms=None, end_ms=None) -> dict:
+    """各币按 open_time 对齐到同一时间网格 → {col: (S,T)}，缺失处为 NaN。"""
+    step = INTERVAL_MS[interval]
+    raw = {}
+    for s in symbols:
+        try: k = read_klines(s, interval, root, cols=["open_time","open","high","low","close","volume"])
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning("skip {}: {}", s, e); continue
+        m = np.ones(len(k["open_time"]), dtype=bool)
+        if start_ms is not None: m &= k["open_time"] >= start_ms
+        if end_ms is not None: m &= k["open_time"] < end_ms
+        if m.sum(): raw[s] = {c: np.asarray(v[m]) for c, v in k.items()}
+    if not raw: return {"symbols": [], "open_time": np.empty(0, dtype=np.int64)}
+    t0 = min(int(k["open_time"][0]) for k in raw.values()); t1 = max(int(k["open_time"][-1]) for k in raw.values())
+    T = (t1-t0)//step + 1
+    out = {c: np.full((len(raw), T), np.nan) for c in ("open","high","low","close","volume")}
+    for i, k in enumerate(raw.values()):
+        j = (k["open_time"]-t0)//step
+        for c in out: out[c][i, j] = k[c]
+    out["symbols"] = list(raw); out["open_time"] = t0 + np.arange(T, dtype=np.int64)*step
+    return out
+
+def _rolling_rank_last(x: np.ndarray, n: int) -> np.ndarray:
+    # 每个 bar：窗口内 ≤ 当前值的比例 ×100（gates._pct_rank_sorted 逐 bar 版）
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= n:
+        w = P.sliding_window_view(x, n, axis=1)
+        out[:, n-1:] = 100.0*(w <= w[..., -1:]).sum(axis=-1)/n
+    return out
+
+class Features:
+    """与阈值无关的逐 bar 指标只算一次；依赖阈值的中间量按所用阈值值缓存（参数扫描时复用）。"""
+    def __init__(self, p: dict, window: int = 200):
+        self.p, self.W = p, int(window); W = self.W
+        o, h, l, c, v = (p[k] for k in ("open","high","low","close","volume"))
+        self.slope, self.r2 = P.rolling_slope_r2(P.ema(c, 30), 30)
+        self.chop = P.chop(h, l, c); self.cvd = P.cvd_proxy(c, v); self.tib = P.tib_abs(o, h, l, c)
+        self.vboost = P.vboost(v); self.vma = P.rolling_mean(v, 20)
+        # 有效 bar：具备完整的 W 根历史（与实盘取 200 根一致）
+        self.has_hist = ~np.isnan(P.rolling_sum(c, W))
+        rng = h-l+1e-12; self.body_pct = np.abs(c-o)/rng; self.close_zone = (c-l)/rng
+        # Gate C（compute_c_metrics：窗口内 W-1 个收益）
+        ret = P.pct_change(c)
+        self.speed = _rolling_rank_last(P.rolling_mean(np.abs(ret), 6), W-6)
+        mu = P.rolling_mean(ret, W-1)
+        sd = np.sqrt(np.maximum(0, P.rolling_mean(ret**2, W-1) - mu**2)*(W-1)/(W-2))
+        self.z = np.where(sd > 0, np.abs((ret-mu)/(sd+1e-12)), 0.0)
+        # planner.make_plan 的 room / costR
+        self.atr = np.nan_to_num(P.atr(h, l, c, 14))
+        self.costR = (c*0.0005)/np.maximum(self.atr, 1e-6); self.room = (2.0*self.atr)/np.maximum(self.atr, 1e-6)
+        self._memo: dict = {}
+
+    def memo(self, key: tuple, fn):
+        if key not in self._memo: self._memo[key] = fn()
+        return self._memo[key]
+
+    def piv(self, mult: float) -> np.ndarray:
+        def calc():
+            h, l, c = self.p["high"], self.p["low"], self.p["close"]; zz = np.zeros(c.shape)
+            for i in range(c.shape[0]):
+                ok = np.flatnonzero(~np.isnan(c[i]))
+                if ok.size:
+                    a, b = ok[0], ok[-1]+1
+                    seg = pd.DataFrame({"high": h[i, a:b], "low": l[i, a:b], "close": c[i, a:b]})
+                    zz[i, a:b] = zigzag(seg, atr_mult=mult).to_numpy()
+            return P.rolling_sum((zz == 1).astype(float) - (zz == -1), 40)
+        return self.memo(("piv", mult), calc)
+
+    def hh(self, look: int) -> np.ndarray:
+        return self.memo(("hh", look), lambda: P.rolling_max(self.p["high"], look))
+
+def signals(src, params: dict) -> dict:
+    """逐 bar 的评分与闸门掩码（均为 (S,T)）。bar t 的判断只用到 t 及之前。
+    src 为 load_panel 的面板或已有的 Features；各掩码按其阈值缓存在 Features 上。"""
+    F = src if isinstance(src, Features) else Features(src, bt_config(params)["window"])
+    c, th = F.p["close"], params["thresholds"]
+    # 评分（scoring.score_symbol 同口径，逐 bar）
+    mult = float(th["struct"]["zigzag_min_atr"]["base"]); tv = th["volume"]
+    skey = (mult, float(th["trend"]["ema30_slope_min"]), float(tv["vboost_min"]["base"]),
+            float(tv["cvd_mix_pct"]["long"]), float(tv["tib_abs_min"]["base"]))
+    def score():
+        d = {"ema30_slope": F.slope, "r2": F.r2, "chop": F.chop, "piv_bias": F.piv(mult),
+             "cvd": F.cvd, "tib": F.tib, "vboost": F.vboost}
+        return P.score_terms(d, F.vma, params)
+    total = F.memo(("total",)+skey, score)
+    valid = F.memo(("valid",)+skey, lambda: F.has_hist & ~np.isnan(total))
+    # Gate A / B（gates.gate_A_true_breakout / gate_B_pullback_confirm）
+    ga = gate_thr(params, "A"); look, pad = int(ga["lookback"]), float(ga["breakout_pad"])
+    A = F.memo(("A", look, pad), lambda: c > F.hh(look)*(1+pad))
+    tb = gate_thr(params, "B")["confirm"]; bkey = (float(tb["body_pct_min"]), float(tb["close_zone"]))
+    B = F.memo(("B",)+bkey, lambda: (F.body_pct >= bkey[0]) & (F.close_zone >= bkey[1]))
+    aplus = total >= int(th["aplus"]["min_total"])
+    # Gate C：离线无资金费率历史，funding 分位按 0
+    tc = gate_thr(params, "C")
+    ckey = (float(tc["funding_pctl"]["small"]), float(tc["speed_pctl"]), float(min(tc["z_extreme"]["big"], tc["z_extreme"]["small"])))
+    C = F.memo(("C",)+ckey, lambda: (0.0 < ckey[0]) & (np.nan_to_num(F.speed) < ckey[1]) & (np.nan_to_num(F.z) < ckey[2]))
+    # Gate D：盘口指标取 params.backtest.assume
+    td, asm = gate_thr(params, "D"), bt_config(params)["assume"]
+    dkey = tuple(float(x) for x in (td["spread_bps"], td["impact_bps"], td["obi_abs"], td["room_atr_min"], td["cost_R_max"],
+                                    asm["spread_bps"], asm["impact_bps"], asm["obi_abs"]))
+    D = F.memo(("D",)+dkey, lambda: ((dkey[5] <= dkey[0]) & (dkey[6] <= dkey[1]) & (dkey[7] <= dkey[2])
+                                     & (F.room >= dkey[3]) & (F.costR <= dkey[4])))
+    return {"total": total, "valid": valid, "A": A & valid, "B": B & valid, "score": aplus & valid,
+            "C": C & valid, "D": D & valid, "signal": valid & A & B & aplus & C & D,
+            "atr": F.atr, "close": c,
+            "detail": {"ema30_slope": F.slope, "r2": F.r2, "chop": F.chop, "piv_bias": F.piv(mult), "cvd": F.cvd,
+                       "tib": F.tib, "vboost": F.vboost, "speed_pctl": F.speed, "z_abs": F.z, "costR": F.costR}}
+
+def simulate(p: dict, sig: dict, params: dict, i: int) -> list:
+    """单币逐笔撮合：信号 bar 收盘挂 L1/L2/L3 限价，持仓期间不接新信号。"""
+    cfg = bt_config(params)
+    w = params.get("planner",{}).get("weights",{}).get("default",[0.6,0.3,0.1])
+    o, h, l, c = (p[k][i] for k in ("open","high","low","close"))
+    ttl, hold, f1 = int(cfg["entry_ttl_bars"]), int(cfg["max_hold_bars"]), float(cfg["tp1_frac"])
+    mk, tk = float(cfg["fee_maker_bps"])/1e4, float(cfg["fee_taker_bps"])/1e4
+    T = len(c); trades = []; nxt = 0
+    for t in np.flatnonzero(sig["signal"][i]):
+        if t < nxt or t+1 >= T: continue
+        px, a = float(c[t]), float(sig["atr"][i, t])
+        legs = [px, px-0.5*a, px-1.0*a]; sl, tp1, tp2 = px-1.5*a, px+1.0*a, px+2.0*a
+        filled = [False]*3; qty = cost = pnl = fee = 0.0; stop = sl; tp1_done = False
+        reason, j_end, exit_px = "nofill", min(T, t+1+ttl)-1, np.nan
+        for j in range(t+1, min(T, t+1+max(ttl, hold))):
+            if np.isnan(c[j]): continue
+            if not tp1_done and j <= t+ttl:
+                for k in range(3):
+                    if not filled[k] and l[j] <= legs[k]:
+                        fp = min(legs[k], o[j]); filled[k] = True
+                        qty += w[k]; cost += w[k]*fp; fee += w[k]*fp*mk
+            if qty == 0:
+                if j >= t+ttl: break
+                continue
+            avg = cost/qty
+            if l[j] <= stop:
+                exit_px = min(stop, o[j]); pnl += qty*(exit_px-avg); fee += qty*exit_px*tk
+                qty = 0.0; reason = "be" if tp1_done else "sl"; j_end = j; break
+            if not tp1_done and h[j] >= tp1:
+                q1 = qty*f1; pnl += q1*(tp1-avg); fee += q1*tp1*mk
+                qty -= q1; cost = qty*avg; stop = avg; tp1_done = True
+            if tp1_done and h[j] >= tp2:
+                exit_px = tp2; pnl += qty*(tp2-avg); fee += qty*tp2*mk
+                qty = 0.0; reason = "tp2"; j_end = j; break
+            if j - t >= hold:
+                exit_px = float(c[j]); pnl += qty*(exit_px-avg); fee += qty*exit_px*tk
+                qty = 0.0; reason = "tp1_time" if tp1_done else "time"; j_end = j; break
+        else:
+            if qty > 0:  # 数据结束仍持仓：按最后收盘平
+                j_end = int(np.flatnonzero(~np.isnan(c[:j+1]))[-1]); exit_px = float(c[j_end])
+                pnl += qty*(exit_px-cost/qty); fee += qty*exit_px*tk; reason = "eod"
+        R = px - sl
+        trades.append({"symbol": p["symbols"][i], "signal_time": int(p["open_time"][t]), "exit_time": int(p["open_time"][j_end]),
+                       "bars": int(j_end-t), "entry": px, "atr": a, "legs_filled": int(sum(filled)),
+                       "exit_reason": reason, "exit_px": float(exit_px), "total": float(sig["total"][i, t]),
+                       "pnl_R": (pnl-fee)/R if R > 0 else 0.0, "fee_R": fee/R if R > 0 else 0.0})
+        nxt = j_end+1
+    return trades
+
+def stats(trades: pd.DataFrame) -> dict:
+    if trades.empty: return {"trades": 0}
+    f = trades[trades["legs_filled"] > 0].sort_values("exit_time")
+    r = f["pnl_R"].to_numpy()
+    eq = np.cumsum(r); dd = float((np.maximum.accumulate(np.concatenate([[0.0], eq]))[1:] - eq).max()) if r.size else 0.0
+    win, loss = r[r > 0].sum(), -r[r < 0].sum()
+    return {"signals": int(len(trades)), "trades": int(len(f)), "fill_rate": round(len(f)/len(trades), 4),
+            "win_rate": round(float((r > 0).mean()), 4) if r.size else 0.0,
+            "avg_R": round(float(r.mean()), 4) if r.size else 0.0, "sum_R": round(float(r.sum()), 3),
+            "profit_factor": round(float(win/loss), 3) if loss > 0 else None, "max_dd_R": round(dd, 3),
+            "avg_bars": round(float(f["bars"].mean()), 2) if r.size else 0.0,
+            "exits": {k: int(v) for k, v in f["exit_reason"].value_counts().items()},
+            "symbols": int(f["symbol"].nunique())}
+
+def gate_funnel(sig: dict) -> dict:
+    # 与扫描相同的顺序：每道闸门后剩下多少 (币×bar)
+    m = sig["valid"].copy(); out = {"bars": int(m.sum())}
+    for k in ("A","B","score","C","D"):
+        m &= sig[k]; out[k] = int(m.sum())
+    return out
+
+def iter_chunks(symbols: list, interval: str, root: str, start, end, window: int, chunk: int):
+    """分批载入面板；起点前多读 window 根做预热。产出 (panel, keep)，keep 为 ≥start 的列掩码。"""
+    to_ms = lambda d: None if d is None else int(pd.Timestamp(d, tz="UTC").value//1_000_000)
+    start_ms = to_ms(start); warm_ms = None if start_ms is None else start_ms - window*INTERVAL_MS[interval]
+    for k in range(0, len(symbols), chunk):
+        p = load_panel(symbols[k:k+chunk], interval, root, warm_ms, to_ms(end))
+        if p["symbols"]:
+            yield p, (None if start_ms is None else p["open_time"] >= start_ms)
+
+def clip(sig: dict, keep) -> dict:
+    if keep is None: return sig
+    return {**sig, **{k: sig[k] & keep for k in ("valid","A","B","score","C","D","signal")}}
+
+def run(params: dict, interval: str = "1h", symbols: list | None = None, start=None, end=None,
+        root: str = KLINE_DIR) -> tuple[pd.DataFrame, dict]:
+    t0 = time.perf_counter()
+    cfg = bt_config(params)
+    trades, funnel = [], {}
+    for p, keep in iter_chunks(symbols or list_symbols(interval, root), interval, root, start, end,
+                               int(cfg["window"]), int(cfg["chunk"])):
+        sig = clip(signals(p, params), keep)
+        for key, v in gate_funnel(sig).items(): funnel[key] = funnel.get(key, 0) + v
+        for i in range(len(p["symbols"])): trades += simulate(p, sig, params, i)
+    df = pd.DataFrame(trades)
+    st = {**stats(df), "funnel": funnel, "sec": round(time.perf_counter()-t0, 2)}
+    return df, st
+
+def main(argv=None):
+    import yaml
+    ap = argparse.ArgumentParser(prog="python -m ats.backtest")
+    ap.add_argument("--params", default="params.yml"); ap.add_argument("--interval", default="1h")
+    ap.add_argument("--symbols", default=""); ap.add_argument("--start"); ap.add_argument("--end")
+    ap.add_argument("--root", default=KLINE_DIR); ap.add_argument("--out", default="")
+    a = ap.parse_args(argv)
+    params = yaml.safe_load(open(a.params)) or {}
+    syms = [s for s in a.symbols.split(",") if s] or None
+    trades, st = run(params, a.interval, syms, a.start, a.end, a.root)
+    if a.out:
+        Path(a.out).parent.mkdir(parents=True, exist_ok=True); trades.to_csv(a.out, index=False)
+    print(json.dumps(st, ensure_ascii=False, indent=1))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,22 +1,11 @@
 from __future__ import annotations
-import pandas as pd, numpy as np
+import numpy as np
+from .tickers import TickerSnapshot, top_k_desc
 
-def _z24(item):
-    try:
-        p = float((item.get("priceChangePercent") or "0").replace("%",""))
-        return abs(p)
-    except: return 0.0
-
-def build_base_pool_from_24h(t24: list, size: int, min_quote_vol: float):
-    arr = []
-    for it in t24:
-        try:
-            if not it.get("symbol","").endswith("USDT"): continue
-            qv = float(it.get("quoteVolume") or 0.0)
-            if qv < float(min_quote_vol): continue
-            if _z24(it) < 1.0: continue
-            arr.append((it["symbol"], qv, _z24(it)))
-        except: continue
+def build_base_pool_from_24h(snap: TickerSnapshot, size: int, min_quote_vol: float, quotes=("USDT",)):
+    z = np.abs(snap.pcp)
+    # NaN 的成交额/涨跌幅比较为 False，直接被过滤
+    with np.errstate(invalid="ignore"):
+        m = snap.quote_mask(quotes) & (snap.qv >= float(min_quote_vol)) & (z >= 1.0)
     # 先按 z_24，次序按成交额
-    arr.sort(key=lambda x: (x[2], x[1]), reverse=True)
-    return [a[0] for a in arr[:int(size)]]
+    return snap.sym[top_k_desc((z, snap.qv), size, np.flatnonzero(m))].tolist()
@@ -0,0 +1,653 @@
+from __future__ import annotations
+# 微基准：python -m ats.bench [名称 ...]；每项同时校验新旧实现结果一致
+import os, sys, time, random
+import numpy as np, pandas as pd
+
+BENCHES = {}
+
+def bench(fn):
+    BENCHES[fn.__name__.removeprefix("bench_")] = fn
+    return fn
+
+def _timeit(fn, number=200) -> float:
+    fn()
+    t = time.perf_counter()
+    for _ in range(number): fn()
+    return (time.perf_counter()-t)/number
+
+def _report(name, legacy_sec, new_sec):
+    print(f"{name:<28} legacy {legacy_sec*1e6:>10.1f} us   new {new_sec*1e6:>10.1f} us   x{legacy_sec/max(new_sec,1e-12):.1f}")
+
+def synth_payload(n=200, seed=0, t0=1_700_000_000_000, step=3_600_000) -> list:
+    rnd = random.Random(seed); px = 100.0; out = []
+    for i in range(n):
+        o = px; c = px*(1+rnd.gauss(0, 0.01)); h = max(o,c)*(1+abs(rnd.gauss(0,0.004))); l = min(o,c)*(1-abs(rnd.gauss(0,0.004)))
+        v = rnd.random()*1e5; ot = t0+i*step
+        out.append([ot, f"{o:.4f}", f"{h:.4f}", f"{l:.4f}", f"{c:.4f}", f"{v:.3f}", ot+step-1,
+                    f"{v*c:.3f}", rnd.randint(1,9999), f"{v/2:.3f}", f"{v*c/2:.3f}", "0"])
+        px = c
+    return out
+
+def synth_df(n=200, seed=0) -> pd.DataFrame:
+    from .klines import decode_klines, OHLCV
+    cols = decode_klines(synth_payload(n, seed))
+    return pd.DataFrame({c: cols[c] for c in OHLCV})
+
+def _legacy_decode(arr) -> pd.DataFrame:
+    # 旧 fetch_df 的解析路径（对照组）
+    cols = ["open_time","open","high","low","close","volume","close_time","qav","trades","taker_base","taker_quote","ignore"]
+    df = pd.DataFrame(arr, columns=cols)
+    for c in ["open","high","low","close","volume","qav","taker_base","taker_quote"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce")
+    return df[["open","high","low","close","volume"]]
+
+@bench
+def bench_decode():
+    from .klines import decode_klines, OHLCV
+    def new(payload):
+        cols = decode_klines(payload)
+        return pd.DataFrame({c: cols[c] for c in OHLCV})
+    for n in (200, 1500):
+        payload = synth_payload(n)
+        assert _legacy_decode(payload).equals(new(payload)), "decode mismatch"
+        _report(f"fetch_df decode n={n}", _timeit(lambda: _legacy_decode(payload)), _timeit(lambda: new(payload)))
+
+@bench
+def bench_streaming():
+    import json
+    from . import indicators as I
+    from .streaming import IndicatorState
+    df = synth_df(400, seed=1)
+    st = IndicatorState(); rows = []
+    for i, r in enumerate(df.itertuples()):
+        if i == 200:  # 中途序列化/反序列化，模拟重启
+            st = IndicatorState.from_dict(json.loads(json.dumps(st.to_dict())))
+        rows.append(st.update(r.open, r.high, r.low, r.close, r.volume))
+    got = pd.DataFrame(rows)
+    ref = {"ema30": I.ema(df["close"], 30), "atr": I.atr(df), "chop": I.chop(df), "cvd": I.cvd_proxy(df),
+           "tib": I.tib_abs(df), "vboost": I.vboost(df), "vol_ma20": df["volume"].rolling(20).mean()}
+    for k, v in ref.items():
+        assert np.array_equal(got[k].to_numpy(), v.to_numpy(), equal_nan=True), f"streaming mismatch {k}"
+    win = df.tail(200).reset_index(drop=True); bar = df.iloc[-1]
+    def batch():
+        I.ema(win["close"], 30).iloc[-1]; I.atr(win).iloc[-1]; I.chop(win).iloc[-1]
+        I.cvd_proxy(win).iloc[-1]; I.tib_abs(win).iloc[-1]; I.vboost(win).iloc[-1]
+    b = (bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"])
+    _report("indicators per new bar", _timeit(batch), _timeit(lambda: st.update(*b)))
+    _report("  (peek incl. state copy)", _timeit(batch), _timeit(lambda: st.peek(*b)))
+
+def _legacy_zigzag(df: pd.DataFrame, atr_mult: float = 0.5) -> pd.Series:
+    # 旧版逐 bar 循环 + Series 版 ATR（对照组）
+    h,l,c = df["high"], df["low"], df["close"]
+    a = np.maximum(h-l, np.maximum(abs(h-c.shift(1)), abs(l-c.shift(1)))).rolling(14).mean()
+    piv = np.zeros(len(df), dtype=int)
+    last_p, last_dir = df["close"].iloc[0], 0
+    for i,(c,tr) in enumerate(zip(df["close"], a.bfill())):
+        if last_dir<=0 and c > last_p + atr_mult*tr: last_dir=1; piv[i]=1; last_p=c
+        elif last_dir>=0 and c < last_p - atr_mult*tr: last_dir=-1; piv[i]=-1; last_p=c
+    return pd.Series(piv, index=df.index)
+
+@bench
+def bench_zigzag():
+    from .indicators import zigzag
+    rnd = np.random.default_rng(7)
+    # 随机序列等价性：不同长度/波动/ATR 倍数，含极短序列与常数段
+    for trial in range(300):
+        n = int(rnd.integers(1, 600)); vol = float(rnd.choice([0.001, 0.01, 0.05]))
+        c = 100*np.exp(np.cumsum(rnd.normal(0, vol, n)))
+        if trial % 7 == 0: c[n//3: n//2] = c[n//3]
+        h = c*(1+np.abs(rnd.normal(0, vol/2, n))); l = c*(1-np.abs(rnd.normal(0, vol/2, n)))
+        df = pd.DataFrame({"open": c, "high": h, "low": l, "close": c, "volume": np.ones(n)})
+        mult = float(rnd.choice([0.0, 0.2, 0.4, 0.5, 1.0, 3.0]))
+        assert zigzag(df, mult).equals(_legacy_zigzag(df, mult)), f"zigzag mismatch trial={trial}"
+    for n in (200, 2000):
+        df = synth_df(n, seed=3)
+        _report(f"zigzag n={n}", _timeit(lambda: _legacy_zigzag(df, 0.4), 50), _timeit(lambda: zigzag(df, 0.4), 50))
+
+def _legacy_c_metrics(df: pd.DataFrame, funding_rates: list) -> dict:
+    # 旧版 Gate C：rolling().apply(lambda) + 逐元素比较计分位（对照组）
+    close = pd.to_numeric(df["close"], errors="coerce")
+    ret = close.pct_change().dropna()
+    sp6 = ret.rolling(6).apply(lambda x: np.mean(np.abs(x)), raw=True).dropna()
+    rank = lambda arr, x: 0.0 if arr.size==0 else 100.0*(np.sum(arr<=x)/arr.size)
+    cur_speed = float(sp6.iloc[-1]) if len(sp6) else 0.0
+    z_abs = float(abs((ret.iloc[-1]-ret.mean())/(ret.std()+1e-12))) if len(ret)>=10 and ret.std()>0 else 0.0
+    f_abs = np.array([abs(float(x.get("fundingRate",0))) for x in funding_rates], dtype=float)
+    return {"funding_pctl": rank(np.sort(f_abs), float(f_abs[-1]) if f_abs.size else 0.0),
+            "speed_pctl": rank(sp6.values, cur_speed), "z_abs": z_abs}
+
+@bench
+def bench_gate_c():
+    from .gates import compute_c_metrics, compute_c_metrics_batch
+    rnd = random.Random(5)
+    dfs = [synth_df(200, seed=i) for i in range(220)]
+    frs = [[{"fundingRate": f"{rnd.gauss(0, 1e-4):.6f}"} for _ in range(30)] for _ in dfs]
+    for df, fr in zip(dfs, frs):
+        assert compute_c_metrics(df, fr) == _legacy_c_metrics(df, fr), "gate C mismatch"
+    closes = np.vstack([df["close"].to_numpy() for df in dfs])
+    b = compute_c_metrics_batch(closes, frs)
+    for i, (df, fr) in enumerate(zip(dfs, frs)):
+        assert {k: float(v[i]) for k, v in b.items()} == _legacy_c_metrics(df, fr), "gate C batch mismatch"
+    _report("gate C metrics (1 symbol)", _timeit(lambda: _legacy_c_metrics(dfs[0], frs[0])),
+            _timeit(lambda: compute_c_metrics(dfs[0], frs[0])))
+    _report("gate C metrics (220, batch)", _timeit(lambda: [_legacy_c_metrics(d, f) for d, f in zip(dfs, frs)], 5),
+            _timeit(lambda: compute_c_metrics_batch(closes, frs), 5))
+
+@bench
+def bench_panel():
+    # 整池面板评分与逐币 score_symbol 逐位一致：总分与落库的每个明细值（含 ema30_slope/R²）
+    import yaml
+    from .scoring import score_symbol, score_many
+    params = yaml.safe_load(open("params.yml"))
+    dfs = [synth_df(200, seed=i) for i in range(300)]
+    got, ref = score_many(dfs, params), [score_symbol(df, params) for df in dfs]
+    for i, ((gt, gd), (rt, rd)) in enumerate(zip(got, ref)):
+        assert gt == rt and gd.keys() == rd.keys(), f"panel total mismatch #{i}"
+        bad = [k for k in rd if not (gd[k] == rd[k] or (np.isnan(gd[k]) and np.isnan(rd[k])))]
+        assert not bad, f"panel detail mismatch #{i}: {bad}"
+    _report("score 300 symbols", _timeit(lambda: [score_symbol(df, params) for df in dfs], 3), _timeit(lambda: score_many(dfs, params), 3))
+
+def synth_t24(n=400, seed=0) -> list:
+    rnd = random.Random(seed); quotes = ["USDT"]*6 + ["USDC", "BUSD"]
+    return [{"symbol": f"S{i}{rnd.choice(quotes)}", "lastPrice": f"{rnd.random()*100:.4f}",
+             "quoteVolume": f"{rnd.choice([0.0, 1e5, 5e6, 2e7, rnd.random()*1e9]):.2f}",
+             "priceChangePercent": f"{rnd.choice([0.5, -1.0, 1.0, 2.0, rnd.gauss(0, 6)]):.3f}"} for i in range(n)]
+
+def _legacy_base_pool(t24: list, size: int, min_quote_vol: float) -> list:
+    # 旧版：逐条 try/except + 两次字符串解析 + 全量排序（对照组）
+    def z24(it):
+        try: return abs(float((it.get("priceChangePercent") or "0").replace("%","")))
+        except: return 0.0
+    arr = []
+    for it in t24:
+        try:
+            if not it.get("symbol","").endswith("USDT"): continue
+            qv = float(it.get("quoteVolume") or 0.0)
+            if qv < float(min_quote_vol): continue
+            if z24(it) < 1.0: continue
+            arr.append((it["symbol"], qv, z24(it)))
+        except: continue
+    arr.sort(key=lambda x: (x[2], x[1]), reverse=True)
+    return [a[0] for a in arr[:int(size)]]
+
+def _legacy_top_movers(t24: list, k: int) -> list:
+    top = sorted(t24, key=lambda x: abs(float((x.get("priceChangePercent") or "0").replace("%",""))), reverse=True)[:int(k)]
+    return [it.get("symbol") for it in top if it.get("symbol","").endswith("USDT")]
+
+@bench
+def bench_pool():
+    from .tickers import TickerSnapshot, top_k_desc
+    from .base_pool import build_base_pool_from_24h
+    def movers(snap, k):
+        top = top_k_desc((np.nan_to_num(np.abs(snap.pcp), nan=0.0),), k)
+        return snap.sym[top][snap.quote_mask()[top]].tolist()
+    for seed in range(200):
+        t24 = synth_t24(random.Random(seed).randint(0, 600), seed); snap = TickerSnapshot.from_payload(t24)
+        for size in (0, 1, 7, 120, 1000):
+            assert build_base_pool_from_24h(snap, size, 5e6) == _legacy_base_pool(t24, size, 5e6), f"base pool mismatch seed={seed}"
+            assert movers(snap, size) == _legacy_top_movers(t24, size), f"top movers mismatch seed={seed}"
+    for n, size in ((400, 120), (5000, 2000)):
+        t24 = synth_t24(n, 1); snap = TickerSnapshot.from_payload(t24)
+        _report(f"base pool n={n} k={size}", _timeit(lambda: _legacy_base_pool(t24, size, 5e6), 50),
+                _timeit(lambda: build_base_pool_from_24h(snap, size, 5e6), 50))
+        _report(f"top movers n={n} k=80", _timeit(lambda: _legacy_top_movers(t24, 80), 50), _timeit(lambda: movers(snap, 80), 50))
+    def fresh():  # 含快照解析（每次 tickers 刷新付一次）
+        snap = TickerSnapshot.from_payload(t24); build_base_pool_from_24h(snap, 2000, 5e6); movers(snap, 80)
+    _report("  (incl. parse) n=5000", _timeit(lambda: (_legacy_base_pool(t24, 2000, 5e6), _legacy_top_movers(t24, 80)), 20),
+            _timeit(fresh, 20))
+
+class _MarketClient:
+    """把 fakebinance.FakeMarket 包成 bnz.klines 接口（进程内，不起服务）；记录每次请求的 (limit, start_time)。"""
+    def __init__(self, market):
+        self.m, self.calls = market, []
+    def klines(self, symbol, interval="1h", limit=200, start_time=None, end_time=None):
+        self.calls.append((int(limit), start_time))
+        return self.m.klines(symbol, interval, int(limit), start_time, end_time)
+
+@bench
+def bench_kline_store():
+    # 缓存读取与直接 bnz.klines(limit) 逐列一致：增量、以及 limit 大于本地已存长度时
+    import tempfile
+    from .fakebinance import FakeMarket
+    from .klines import KlineStore, KLINE_COLS, decode_klines
+    bnz = _MarketClient(FakeMarket(4))
+    with tempfile.TemporaryDirectory() as root:
+        st = KlineStore(root)
+        def same(sym, limit):
+            got, ref = st.get(bnz, sym, "1h", limit), decode_klines(bnz.m.klines(sym, "1h", limit))
+            assert all(np.array_equal(got[c], ref[c]) for c in KLINE_COLS), f"kline store mismatch {sym} limit={limit}"
+        for sym in bnz.m.symbols:
+            same(sym, 200); same(sym, 200); same(sym, 500); same(sym, 200)
+            n0 = len(bnz.calls); same(sym, 500)
+            assert bnz.calls[n0][1] is not None, f"limit=500 not incremental after the window was stored {sym}"
+        # 回测补历史：向前分页 prepend，结果与交易所的同一段已收盘历史一致
+        sym = bnz.m.symbols[0]; f = st._file((sym, "1h"))
+        assert st.backfill(bnz, sym, "1h", 1200) > 0 and len(f) == 1200
+        ref = decode_klines(bnz.m.klines(sym, "1h", 1201))
+        assert all(np.array_equal(f.column(c), ref[c][:-1]) for c in KLINE_COLS), "backfill mismatch"
+        assert st.backfill(bnz, sym, "1h", 5000) == len(f)-1200 and len(f) == 1499, "backfill should stop at listing"
+        # 停机超过 MAX_FETCH 根：向后分页补齐，文件连续无空洞，返回值仍与 bnz.klines(limit) 一致
+        from . import fakebinance
+        from .klines import ColumnFile, kline_path, MAX_FETCH
+        hist, fakebinance.HISTORY = fakebinance.HISTORY, 4000
+        try:
+            long = _MarketClient(FakeMarket(1, seed=1)); sym = long.m.symbols[0]; lroot = os.path.join(root, "long")
+            ref = decode_klines(long.m.klines(sym, "1h", 4000))
+            ColumnFile(kline_path(sym, "1h", lroot)).append({c: ref[c][:500] for c in KLINE_COLS})
+            got = KlineStore(lroot).get(long, sym, "1h", 200); pages = long.calls
+            f = ColumnFile(kline_path(sym, "1h", lroot), writable=False)
+            assert np.all(np.diff(f.column("open_time")) == 3_600_000) and len(f) == 3999, "downtime catch-up left a gap"
+            assert all(np.array_equal(got[c], ref[c][-200:]) for c in KLINE_COLS), "downtime catch-up result mismatch"
+            assert all(st_ is not None for _, st_ in pages) and len(pages) == 3 and pages[0][0] == MAX_FETCH, f"pages {pages}"
+        finally:
+            fakebinance.HISTORY = hist
+        # 两个写者（相当于主循环与 backfill CLI 各自的映射）：一方 prepend 换掉文件后，另一方追加不丢
+        path = kline_path("LOCKTEST", "1h", root)
+        ref = decode_klines(bnz.m.klines(bnz.m.symbols[1], "1h", 1000)); take = lambda a, b: {c: ref[c][a:b] for c in KLINE_COLS}
+        same_disk = lambda n: all(np.array_equal(ColumnFile(path, writable=False).column(c), ref[c][:n]) for c in KLINE_COLS)
+        loop = ColumnFile(path); loop.append(take(500, 600))
+        cli = ColumnFile(path); cli.prepend(take(0, 500))
+        loop.append(take(600, 900))
+        assert same_disk(900), "append after another writer replaced the file lost bars"
+        # 锁被占用时写者等待，而不是并发改写
+        import threading
+        order = []
+        with cli.locked():
+            t = threading.Thread(target=lambda: (loop.append(take(900, 1000)), order.append("append"))); t.start()
+            time.sleep(0.2); order.append("release")
+        t.join()
+        assert order == ["release", "append"] and same_disk(1000), f"file lock not honoured {order}"
+    print(f"kline store == bnz.klines   ok ({len(bnz.calls)} requests)")
+
+@bench
+def bench_funding_cache():
+    # 冷路径：扫描开始的 refresh 把池里所有未缓存币整段拉好，Gate C 全部命中、扫描中不再发请求；
+    # 预取的 cold=False 只补已缓存币，冷币由 fetch 分批拉且不计命中；之后只按结算增量补
+    from .fakebinance import FakeMarket, FUNDING_MS
+    from .funding import FundingCache
+    m = FakeMarket(40); now = [int(time.time()*1000)]; calls = []
+    class C:
+        def premium_index(self): return m.premium(now_ms=now[0])
+        def funding_rate(self, symbol, limit=30, start_time=None):
+            calls.append((symbol, start_time)); return m.funding(symbol, limit, start_time, now_ms=now[0])
+    bnz, fc = C(), FundingCache()
+    assert fc.refresh(bnz, m.symbols[:10], cold=False) == 0 and not calls, "cold=False must not fetch uncached symbols"
+    assert all(fc.fetch(bnz, s) == m.funding(s, 30, now_ms=now[0]) for s in m.symbols[:10]) and len(calls) == 10
+    assert fc.refresh(bnz, m.symbols) == 30 and len(calls) == 40, "scan-start refresh must fetch every uncached symbol"
+    n0 = len(calls)
+    for sym in m.symbols: assert fc.get(sym) == m.funding(sym, 30, now_ms=now[0])
+    assert len(calls) == n0, "Gate C must not hit the network after refresh"
+    assert fc.reset_stats() == {"hit": 40, "miss": 0, "full": 40, "incr": 0}, "cold scan stats"
+    calls.clear(); assert fc.refresh(bnz, m.symbols) == 0 and not calls, "no new settlement → no requests"
+    now[0] += FUNDING_MS
+    assert fc.refresh(bnz, m.symbols[:10]) == 10 and all(st is not None for _, st in calls), "new settlement → incremental"
+    assert fc.get(m.symbols[0]) == m.funding(m.symbols[0], 30, now_ms=now[0])
+    print("funding cache cold/warm paths ok")
+
+@bench
+def bench_scheduler():
+    # 假时钟：(1) 预取窗口内到期的快扫不被预取占住线程而跳过，预取让出后续跑完；(2) 整点扫描连续超时时快扫仍能在两轮之间跑
+    from .scheduler import YIELD, Job, Scheduler, spread_batches
+    def sim(scan_sec, hours=6):
+        T = [0.0]; left = []; prefetched = []; runs = []  # runs: (作业, 开始时刻, 相对触发点的迟到秒数)
+        def busy(sec): T[0] += sec
+        def scan(): busy(scan_sec); left[:] = list(range(40))
+        def prefetch():
+            def batch(b): busy(2.0*len(b)); del left[:len(b)]
+            done, yielded = spread_batches(list(left), batch, s.due_of("scan") - 20, lambda: s.yield_at("prefetch"),
+                                           clock=lambda: T[0], sleep=busy)
+            prefetched.append(done); return YIELD if yielded else None
+        def on_event(job, kind, info):
+            if kind in ("done", "yielded"): runs.append((job.name, T[0]-info["sec"], info.get("late_sec", 0.0)))
+        s = Scheduler([Job("scan", 3600, scan, offset=15, priority=3, covers=("fast",)),
+                       Job("fast", 900, lambda: busy(60), offset=15, priority=2),
+                       Job("prefetch", 3600, prefetch, offset=-1200, priority=1, max_late_frac=0.1)], on_event, clock=lambda: T[0])
+        left[:] = list(range(40))
+        while T[0] < hours*3600:
+            if s.run_pending() is None: T[0] = s.next_due()[0]
+        return {j.name: j.stats for j in s.jobs}, prefetched, runs
+    st, pre, _ = sim(300)
+    assert st["fast"]["skipped"] == 0 and st["fast"]["runs"] == 18, f"fast skipped inside the prefetch window: {st['fast']}"
+    assert st["prefetch"]["yielded"] == 6 and st["prefetch"]["skipped"] == 0 and sum(pre) == 6*40, f"prefetch: {st['prefetch']} {pre}"
+    # 扫描 4000s > 周期 3600s：15 分钟节奏做不到，设计保证的是每轮超时扫描一结束快扫立即补跑一次（先于预取与下一轮扫描），
+    # 所以快扫间隔不超过一轮扫描 + 快扫自身，迟到不超过一轮扫描
+    scan_sec = 4000
+    st, _, runs = sim(scan_sec)
+    scans = [t for n, t, _ in runs if n == "scan"]; fast = [(t, late) for n, t, late in runs if n == "fast"]
+    assert st["scan"]["overruns"] >= 4 and len(scans) >= 5, f"scan did not overrun: {st['scan']}"
+    for a, b in zip(scans, scans[1:]):
+        assert any(t == a+scan_sec for t, _ in fast), f"no fast run right after the scan at {a}: {runs}"
+        assert any(a+scan_sec <= t < b for t, _ in fast), f"fast starved between scans {a} and {b}: {runs}"
+    gaps = np.diff([0.0] + [t for t, _ in fast])
+    assert gaps.max() <= scan_sec+60 and max(l for _, l in fast) <= scan_sec, f"fast gap/lateness: {gaps} {fast}"
+    print(f"scheduler fake clock ok (overrun: {len(scans)} scans, fast runs {len(fast)}, "
+          f"max gap {gaps.max():.0f}s, max late {max(l for _, l in fast):.0f}s)")
+
+@bench
+def bench_limiter():
+    # 令牌桶放行速率、X-MBX-USED-WEIGHT-1m 收紧余量、到顶停到下一分钟、418/429 按 Retry-After 暂停后重试
+    from .binance import BinanceFutures, WeightLimiter
+    from .fakebinance import FakeBinance, FakeMarket, serve
+    lim = WeightLimiter(60, 1.0, window_sec=1.0)
+    t = time.monotonic(); lim.acquire(60); assert time.monotonic()-t < 0.05, "full bucket must not wait"
+    lim.acquire(30); dt = time.monotonic()-t
+    assert 0.4 < dt < 0.8, f"30 weight at 60/s should wait ~0.5s, waited {dt:.2f}s"
+    lim = WeightLimiter(100, 1.0); lim.observe(70)
+    assert lim.snapshot()["tokens"] <= 30 and lim.used_1m == 70 and lim.pause_until == 0.0, "header must clamp the bucket"
+    lim.observe(100); left = 60.0 - time.time()%60.0
+    assert abs((lim.pause_until - time.monotonic()) - left) < 0.5, "at cap the limiter must pause to the next minute"
+    lim = WeightLimiter(100, 1.0, window_sec=1.0); lim.penalize(0.3)
+    t = time.monotonic(); lim.acquire(1); assert 0.25 < time.monotonic()-t < 0.6, "penalize must block acquire"
+
+    class Once429(FakeBinance):
+        def handle(self, path, q):
+            if not self.counts.get(path):
+                self.counts[path] = 1
+                return 429, {"code": -1003, "msg": "Too many requests (fake)"}, {"Retry-After": "1", "X-MBX-USED-WEIGHT-1m": "5"}
+            return super().handle(path, q)
+    srv = serve(Once429(FakeMarket(1)), port=0, background=True)
+    try:
+        bnz = BinanceFutures(f"http://127.0.0.1:{srv.server_address[1]}")
+        t = time.monotonic(); bnz.server_time(); dt = time.monotonic()-t
+        th = bnz.throttle_stats()
+        assert th["429"] == 1 and th["backoff_sec"] == 1.0 and 0.9 < dt < 2.0, f"Retry-After not honoured: {th} {dt:.2f}s"
+        assert bnz.limiter.used_1m >= 1 and bnz.stats()["/fapi/v1/time"]["n"] == 2, "header weight / retry not recorded"
+        bnz.close()
+    finally:
+        srv.shutdown()
+    print("weight limiter ok (rate, header clamp, minute pause, Retry-After)")
+
+@bench
+def bench_pipeline():
+    # 阶段按代价+依赖排序；只把幸存者交给下一阶段；计数与异常落到 ctx；
+    # 真实闸门（scan_stages）重排后的通过集合与逐币串行版（基线 scan_once 的顺序）一致
+    import yaml
+    from .pipeline import Pipeline, Stage
+    seen = {}
+    def st(name, keep, **kw):
+        def fn(x):
+            xs = x if kw.get("batch") else [x]; seen.setdefault(name, []).extend(c["i"] for c in xs)
+            if name == "boom" and not kw.get("batch") and x["i"] == 3: raise RuntimeError("boom")
+            oks = [keep(c["i"]) for c in xs]; return oks if kw.get("batch") else oks[0]
+        return fn
+    pipe = Pipeline([Stage("late", 100, st("late", lambda i: i % 3 == 0), io=True, after=("mid",)),
+                     Stage("mid", 50, st("mid", lambda i: i < 15, batch=True), batch=True),
+                     Stage("boom", 1, st("boom", lambda i: True)),
+                     Stage("cheap", 1, st("cheap", lambda i: i % 2 == 0))])
+    assert [s.name for s in pipe.stages] == ["boom", "cheap", "mid", "late"], "cost/declaration/after order"
+    ctxs = [{"sym": f"S{i}", "i": i} for i in range(20)]
+    from loguru import logger
+    logger.disable("ats.pipeline"); out = pipe.run(ctxs); logger.enable("ats.pipeline")
+    assert [c["i"] for c in out] == [0, 6, 12] and seen["mid"] == [0, 2, 4, 6, 8, 10, 12, 14, 16, 18]
+    assert seen["late"] == [0, 2, 4, 6, 8, 10, 12, 14] and "error" in ctxs[3] and ctxs[5]["rejected_by"] == "cheap"
+    assert pipe.summary()["boom"] == {"in": 20, "pass": 19, "reject": 0, "err": 1, "sec": pipe.summary()["boom"]["sec"]}
+    assert [(v["in"], v["pass"], v["reject"]) for v in pipe.summary().values()] == [(20, 19, 0), (19, 10, 9), (10, 8, 2), (8, 3, 5)]
+    try: Pipeline([Stage("a", 1, None, after=("b",)), Stage("b", 2, None, after=("a",))]); raise AssertionError("cycle accepted")
+    except ValueError: pass
+
+    from .app import scan_stages
+    from .fakebinance import FakeMarket
+    from .gates import (gate_A_true_breakout, gate_B_pullback_confirm, compute_c_metrics,
+                        gate_C_crowded_check_from_metrics, gate_D_executable, estimate_orderbook_metrics)
+    from .planner import make_plan
+    from .scoring import score_symbol, aplus_pass
+    params = yaml.safe_load(open("params.yml")); params["scan"]["funding_cache"] = False
+    # 放宽 A 与 A+ 门槛（A 的区间高点含当根，默认几乎不放行），让每个阶段都有币走到、否决
+    params["thresholds"]["gates"]["A"]["breakout_pad"] = -0.03; params["thresholds"]["aplus"]["min_total"] = 22
+    for g in ("C", "D"): params["thresholds"].setdefault(g, params["thresholds"]["gates"][g])   # 闸门 C/D 读 thresholds.C/D
+    m = FakeMarket(400)
+    class C:
+        def funding_rate(self, symbol, limit=30, start_time=None): return m.funding(symbol, limit, start_time)
+        def depth(self, symbol, limit=50): return m.depth(symbol, limit)
+    bnz = C(); dfs = {s: synth_df(200, seed=i) for i, s in enumerate(m.symbols)}
+    def sequential(sym, df):
+        total, detail = score_symbol(df, params)
+        if not (aplus_pass(dict(**detail, total=total), params) and gate_A_true_breakout(df, params)
+                and gate_B_pullback_confirm(df, params)): return False
+        if not gate_C_crowded_check_from_metrics(compute_c_metrics(df, bnz.funding_rate(sym, limit=30)), params): return False
+        plan = make_plan(df, "LONG", params); obm = estimate_orderbook_metrics(bnz.depth(sym, limit=50), float(df["close"].iloc[-1]),
+                                                                               notional_usdt=float(os.getenv("MAX_NOTIONAL_USDT", "200") or 200))
+        return bool(gate_D_executable(obm["spread_bps"], plan["room"], plan["costR"], params, impact_bps=obm["impact_bps"], obi_abs=obm["obi_abs"]))
+    ref = [s for s, df in dfs.items() if sequential(s, df)]
+    pipe = Pipeline(scan_stages(bnz, params))
+    got = [c["sym"] for c in pipe.run([{"sym": s, "df": df} for s, df in dfs.items()])]
+    assert got == ref, f"pipeline passes {len(got)} vs sequential {len(ref)}"
+    assert all(v["in"] > 0 for v in pipe.summary().values()), f"every stage should see symbols here: {pipe.line()}"
+    print(f"pipeline ok: order/laziness/counters; 400 symbols same decisions as sequential ({len(ref)} pass) | {pipe.line()}")
+
+@bench
+def bench_overlay():
+    # 惰性衰减索引与逐轮全表衰减（旧 SQLite 版的口径）对照：多轮 decay+bump 后 top() 的热度序、prune、换半衰期、
+    # 落盘再载入一致；build_scheduler 按 sampling.overlay_decay_hours 设好模块索引的半衰期
+    import math, tempfile, yaml
+    from . import overlay, store
+    rnd = random.Random(11); T = [1_700_000_000]; syms = [f"S{i:04d}USDT" for i in range(3000)]
+    real_now, real_db, real_index = overlay._now, store.DB_PATH, overlay.INDEX
+    overlay._now, overlay.INDEX = (lambda: T[0]), overlay.OverlayIndex()
+    try:
+        with tempfile.TemporaryDirectory() as d:
+            store.DB_PATH = f"{d}/state.db"; store.ensure_schema()
+            idx = overlay.OverlayIndex(2.0); idx.loaded = True; ref, hl = {}, 2.0
+            def check(limit=200, min_heat=0.01):
+                got = idx.top(limit, min_heat); want = sorted((h for h in ref.values() if h > min_heat), reverse=True)[:limit]
+                assert len(got) == len(want), f"top size {len(got)} != {len(want)}"
+                assert all(math.isclose(ref[s], w, rel_tol=1e-9) for s, w in zip(got, want)), "top order != current heat order"
+            for r in range(60):
+                if r == 30: hl = 5.0; idx.set_half_life(hl)
+                dt = rnd.choice([900, 3600, 7200]); T[0] += dt
+                ref = {s: h*math.pow(0.5, dt/(hl*3600)) for s, h in ref.items()}
+                if r % 10 == 9:
+                    n = idx.prune(0.05); gone = [s for s, h in ref.items() if h < 0.05]
+                    assert n == len(gone), f"prune {n} != {len(gone)}"
+                    for s in gone: del ref[s]
+                hot = rnd.sample(syms, 300); w = rnd.choice([1.0, 0.5, 2.0])
+                idx.bump(hot, w)
+                for s in hot: ref[s] = ref.get(s, 0.0) + w
+                check()
+            assert idx.flush() > 0
+            again = overlay.OverlayIndex(hl); again.load()
+            assert again.top(500, 0.01) == idx.top(500, 0.01), "flush/load round trip changed the order"
+            from .app import build_scheduler
+            params = yaml.safe_load(open("params.yml")); params["sampling"]["overlay_decay_hours"] = 6
+            build_scheduler(params); assert overlay.INDEX.hl == 6*3600.0, "half-life not taken from params at startup"
+    finally:
+        overlay._now, store.DB_PATH, overlay.INDEX = real_now, real_db, real_index
+    print(f"overlay index ok (3000 symbols, 60 decay+bump rounds, {len(ref)} live)")
+
+@bench
+def bench_store():
+    # 共享 WAL 连接；WriteBatch 多线程 add 后一个事务落库，行数/计数一致；某条语句失败时整批回滚、库里不留半批
+    import sqlite3, tempfile
+    from concurrent.futures import ThreadPoolExecutor
+    from . import store
+    real_db = store.DB_PATH
+    try:
+        with tempfile.TemporaryDirectory() as d:
+            store.DB_PATH = f"{d}/state.db"; store.ensure_schema()
+            assert store.conn().execute("PRAGMA journal_mode").fetchone()[0] == "wal" and store.conn() is store.conn()
+            b = store.WriteBatch(); row = lambda i: (1_700_000_000, f"S{i}", i % 2, None, None, *([float(i)]*16))
+            with ThreadPoolExecutor(8) as ex: list(ex.map(lambda i: b.add(store.INSERT_EVAL, row(i)), range(3000)))
+            b.extend(store.INSERT_PLAN, [(1, "S0", "LONG", *([1.0]*12), "{}", "dry")])
+            assert b.pending() == 3001 and b.flush() == 3001 and b.pending() == 0 and b.rows_total == 3001 and b.hist.n == 1
+            count = lambda t: sqlite3.connect(store.DB_PATH).execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+            assert count("scan_evals") == 3000 and count("plans") == 1, "flushed rows not visible to another connection"
+            b.extend(store.INSERT_EVAL, [row(i) for i in range(100)]); b.add("INSERT INTO no_such_table VALUES (?)", (1,))
+            try: b.flush(); raise AssertionError("bad statement must raise")
+            except sqlite3.OperationalError: pass
+            assert count("scan_evals") == 3000 and b.rows_total == 3001, "failed flush must roll back the whole batch"
+            assert b.flush() == 0
+    finally:
+        store.close(); store.DB_PATH = real_db
+    print("store ok (WAL, 3001 rows in one flush, rollback on failure)")
+
+@bench
+def bench_notifier():
+    # 本地 Telegram 替身：入队不阻塞；积压的同格式消息按 4096 合并、按行切分，顺序不变；429 按 retry_after 重试
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import parse_qs
+    from . import notifier as N
+    got, lock = [], threading.Lock()
+    class H(BaseHTTPRequestHandler):
+        def log_message(self, *a): pass
+        def do_POST(self):
+            q = {k: v[0] for k, v in parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode()).items()}
+            with lock:
+                got.append(q); n = len(got)
+            if n == 1: time.sleep(0.3)   # 第一条慢：其余消息在此期间积压
+            code, body = (429, b'{"ok":false,"parameters":{"retry_after":1}}') if n == 2 else (200, b'{"ok":true}')
+            self.send_response(code); self.send_header("Content-Length", str(len(body))); self.end_headers(); self.wfile.write(body)
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), H); threading.Thread(target=srv.serve_forever, daemon=True).start()
+    saved = {k: getattr(N, k) for k in ("BOT", "CHAT", "API", "MIN_INTERVAL", "ASYNC")}
+    N.BOT, N.CHAT, N.API, N.MIN_INTERVAL, N.ASYNC = "T", "1", f"http://127.0.0.1:{srv.server_address[1]}", 0.0, True
+    try:
+        msgs = [(f"m{i:02d} " + "x"*400, None if i >= 50 else "Markdown") for i in range(52)]
+        t = time.perf_counter()
+        for text, pm in msgs: (N.send_text if pm else N.send_text_plain)(text)
+        enq = time.perf_counter()-t
+        assert N.flush(15.0), "queue not drained"
+        ok = [q for i, q in enumerate(got) if i != 1]   # 第 2 次请求被 429，其内容原样重发
+        assert got[1] == got[2] and len(got) <= 9, f"{len(got)} requests for {len(msgs)} messages"
+        assert "\n\n".join(q["text"] for q in ok).split("\n\n") == [m for m, _ in msgs], "messages lost or reordered"
+        assert all(q.get("parse_mode") == ("Markdown" if q["text"].startswith(("m0", "m1", "m2", "m3", "m4")) else None) for q in ok)
+        assert all(len(q["text"]) <= N.MAX_LEN for q in ok) and enq < 0.05, f"enqueue took {enq*1e3:.1f}ms"
+        long = "\n".join("y"*300 for _ in range(40))
+        parts = list(N._chunks(long)); assert all(len(p) <= N.MAX_LEN for p in parts) and "\n".join(parts) == long
+    finally:
+        for k, v in saved.items(): setattr(N, k, v)
+        srv.shutdown()
+    print(f"notifier ok ({len(msgs)} messages → {len(got)} requests incl. one 429 retry, enqueue {enq*1e3:.2f}ms)")
+
+def _kline_root(root: str, n: int, bars: int = 1499) -> list:
+    # 用 FakeMarket 的确定性历史在 root 下建 n 个币的本地 K 线文件（回测/扫描的离线输入）
+    from .fakebinance import FakeMarket
+    from .klines import KlineStore
+    bnz = _MarketClient(FakeMarket(n)); st = KlineStore(root)
+    for s in bnz.m.symbols: st.backfill(bnz, s, "1h", bars)
+    return bnz.m.symbols
+
+def _bt_params() -> dict:
+    import yaml
+    params = yaml.safe_load(open("params.yml"))
+    # 放宽 A 与 A+（A 的区间高点含当根，默认几乎不放行），让信号与成交足够多
+    params["thresholds"]["gates"]["A"]["breakout_pad"] = -0.03; params["thresholds"]["aplus"]["min_total"] = 22
+    return params
+
+@bench
+def bench_backtest():
+    # (1) 逐 bar 掩码与实盘闸门函数在同一段已收盘窗口上对照；(2) 手算的两笔撮合（TP1→保本→TP2、三档成交后止损）
+    import math, tempfile
+    from . import backtest as BT
+    from .gates import gate_A_true_breakout, gate_B_pullback_confirm, compute_c_metrics
+    from .scoring import score_symbol
+    params = _bt_params(); W = int(BT.bt_config(params)["window"])
+    with tempfile.TemporaryDirectory() as root:
+        syms = _kline_root(root, 12)
+        p = BT.load_panel(syms, "1h", root); sig = BT.signals(p, params)
+        rnd = random.Random(3); same = n = 0
+        for _ in range(300):
+            i, t = rnd.randrange(len(syms)), rnd.randrange(W, p["close"].shape[1])
+            df = pd.DataFrame({k: p[k][i, t-W+1:t+1] for k in ("open","high","low","close","volume")})
+            assert sig["valid"][i, t], "bar with a full window must be valid"
+            assert bool(sig["A"][i, t]) == bool(gate_A_true_breakout(df, params)), f"gate A mismatch {i},{t}"
+            assert bool(sig["B"][i, t]) == bool(gate_B_pullback_confirm(df, params)), f"gate B mismatch {i},{t}"
+            cm = compute_c_metrics(df, [])
+            assert math.isclose(sig["detail"]["speed_pctl"][i, t], cm["speed_pctl"], rel_tol=1e-9), "speed_pctl mismatch"
+            assert math.isclose(sig["detail"]["z_abs"][i, t], cm["z_abs"], rel_tol=1e-6, abs_tol=1e-9), "z_abs mismatch"
+            n += 1; same += int(sig["total"][i, t]) == score_symbol(df, params)[0]
+        # 全历史递推 vs 实盘 200 根窗口：EMA/ZigZag 起点不同，总分只要求绝大多数一致
+        assert same/n >= 0.85, f"only {same}/{n} bars score like the live window"
+        df, st = BT.run(params, "1h", syms, root=root)
+        assert st["trades"] > 0 and st["funnel"]["bars"] == int(sig["valid"].sum()) and len(df) == st["signals"]
+
+    T = 8; flat = lambda v: np.full((2, T), v, dtype=float)
+    p = {"symbols": ["TP2", "SL"], "open_time": np.arange(T, dtype=np.int64)*3_600_000,
+         "open": flat(100.5), "high": flat(100.6), "low": flat(100.4), "close": flat(100.5)}
+    for k, bars in {"open": [(100, 100, 100, 100), (100, 100, 99)], "high": [(100, 100.2, 101.2, 102.5), (100, 100.1, 99.2)],
+                    "low": [(100, 99.8, 99.9, 100.5), (100, 98.9, 98.0)], "close": [(100, 100, 101, 102), (100, 99, 98.2)]}.items():
+        for i, row in enumerate(bars): p[k][i, :len(row)] = row
+    sig = {"signal": np.zeros((2, T), dtype=bool), "atr": flat(1.0), "total": flat(50.0)}; sig["signal"][:, 0] = True
+    tp2, sl = BT.simulate(p, sig, params, 0), BT.simulate(p, sig, params, 1)
+    # TP2：L1@100 成交 0.6；TP1@101 平一半（maker）；保本后 TP2@102 平余下；R=1.5
+    fee = (0.6*100 + 0.3*101 + 0.3*102)*2e-4
+    assert len(tp2) == 1 and tp2[0]["exit_reason"] == "tp2" and tp2[0]["legs_filled"] == 1 and tp2[0]["bars"] == 3
+    assert math.isclose(tp2[0]["pnl_R"], (0.3*1 + 0.3*2 - fee)/1.5, rel_tol=1e-12), tp2[0]
+    # SL：三档同 bar 成交（均价 99.75），下一根开 99 穿 98.5 止损（taker）
+    fee = (0.6*100 + 0.3*99.5 + 0.1*99)*2e-4 + 98.5*5e-4
+    assert len(sl) == 1 and sl[0]["exit_reason"] == "sl" and sl[0]["legs_filled"] == 3 and sl[0]["bars"] == 2
+    assert math.isclose(sl[0]["pnl_R"], (98.5-99.75 - fee)/1.5, rel_tol=1e-12), sl[0]
+    print(f"backtest ok ({same}/{n} sampled bars score like the live window; A/B/C metrics exact; hand-checked fills) | {st['trades']} trades")
+
+@bench
+def bench_sweep():
+    # 进程池扫描的每个组合与单独跑 backtest.run 的统计一致：阈值、撮合键、backtest.window（按窗口分组预热）、带 start 的预热裁剪
+    import copy, tempfile
+    from . import backtest as BT, sweep as SW
+    base = _bt_params(); base["backtest"]["chunk"] = 5
+    grid = {"thresholds.aplus.min_total": [22, 26], "backtest.window": [120, 200], "backtest.entry_ttl_bars": [2, 4]}
+    cs = SW.combos(grid, {}); start = time.strftime("%Y-%m-%d", time.gmtime(time.time() - 30*86400))
+    with tempfile.TemporaryDirectory() as root:
+        syms = _kline_root(root, 12)
+        t = time.perf_counter(); res = SW.sweep(base, cs, "1h", syms, start=start, root=root, workers=2); sec = time.perf_counter()-t
+        t = time.perf_counter()
+        for c in cs:
+            params = copy.deepcopy(base)
+            for k, v in c.items(): SW.set_dotted(params, k, v)
+            _, st = BT.run(params, "1h", syms, start=start, root=root)
+            row = res[(res[list(c)] == pd.Series(c)).all(axis=1)].iloc[0].to_dict()
+            for k in ("signals", "trades", "sum_R", "win_rate", "max_dd_R", "symbols"):
+                assert row[k] == st[k], f"sweep {c} {k}: {row[k]} != backtest {st[k]}"
+        one = time.perf_counter()-t
+        assert res["trades"].nunique() > 1, "combos should not all give the same result"
+    try: SW.sweep(base, [{"backtest.chunk": 8}]); raise AssertionError("backtest.chunk accepted")
+    except ValueError: pass
+    print(f"sweep ok ({len(cs)} combos == backtest.run each; sweep {sec:.1f}s vs {one:.1f}s one by one)")
+
+# 端到端：子进程在临时目录对本地替身（ats.fakebinance）跑 scan_once，冷启动一轮 + 预热后一轮
+_SCAN_CHILD = """
+import json, resource, sys, time, requests
+from ats.app import scan_once
+base = sys.argv[1]; out = []
+for run in ("cold", "warm"):
+    requests.get(base + "/__reset"); t, c = time.perf_counter(), time.process_time()
+    scan_once()
+    st = requests.get(base + "/__stats").json()
+    out.append(dict(run=run, wall=time.perf_counter()-t, cpu=time.process_time()-c,
+                    rss_mb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024, **st))
+print("BENCH " + json.dumps(out))
+"""
+
+@bench
+def bench_scan(sizes=(20, 220, 1000)):
+    import json, os, subprocess, tempfile, yaml
+    from pathlib import Path
+    from .fakebinance import FakeBinance, FakeMarket, serve
+    root = Path(__file__).resolve().parent.parent
+    srv = serve(FakeBinance(FakeMarket(max(sizes) + 200), latency_ms=float(os.getenv("BENCH_LATENCY_MS", "20"))),
+                port=0, background=True)
+    url = f"http://127.0.0.1:{srv.server_address[1]}"
+    env = {**os.environ, "BINANCE_FAPI_BASE": url, "PYTHONPATH": str(root), "TELEGRAM_BOT_TOKEN": "", "DRY_RUN": "true"}
+    try:
+        for n in sizes:
+            params = yaml.safe_load(open(root/"params.yml"))
+            params["symbol_pool"].update(base_pool_daily_size=n, max_symbols=n); params["scan"]["max_symbols_per_scan"] = n
+            with tempfile.TemporaryDirectory() as d:
+                yaml.safe_dump(params, open(Path(d)/"params.yml", "w"))
+                r = subprocess.run([sys.executable, "-W", "ignore", "-c", _SCAN_CHILD, url], cwd=d, env=env,
+                                   capture_output=True, text=True)
+            line = next((l for l in r.stdout.splitlines() if l.startswith("BENCH ")), None)
+            if line is None: raise RuntimeError(f"scan n={n} failed:\n{r.stderr[-2000:]}")
+            for st in json.loads(line[6:]):
+                reqs = " ".join(f"{k.rsplit('/', 1)[-1]}={v}" for k, v in sorted(st["counts"].items()))
+                print(f"scan n={n:<5} {st['run']:<5} wall {st['wall']:>7.2f}s  cpu {st['cpu']:>6.2f}s  "
+                      f"peak_rss {st['rss_mb']:>6.0f}MB  requests {sum(st['counts'].values()):>5} ({reqs})")
+    finally:
+        srv.shutdown()
+
+def main(argv=None):
+    names = (argv if argv is not None else sys.argv[1:]) or list(BENCHES)
+    for n in names:
+        BENCHES[n]()
+
+if __name__ == "__main__":
+    main()
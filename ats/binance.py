@@ -1,22 +1,144 @@
 from __future__ import annotations
-import os, time, requests
+import os, time, threading, requests
+from requests.adapters import HTTPAdapter
 from loguru import logger
+from .instrument import Histogram
 
 BASE = os.getenv("BINANCE_FAPI_BASE","https://fapi.binance.com")
 BASE_DELAY = int(os.getenv("BINANCE_BASE_DELAY_MS","400") or 400)
+POOL_SIZE = int(os.getenv("BINANCE_POOL_SIZE","16") or 16)
+WEIGHT_LIMIT = int(os.getenv("BINANCE_WEIGHT_LIMIT_1M","2400") or 2400)
+WEIGHT_SAFETY = float(os.getenv("BINANCE_WEIGHT_SAFETY","0.8") or 0.8)
+
+# ----- 请求权重（USDⓈ-M 文档口径）-----
+def _klines_weight(limit: int) -> int:
+    return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+
+def _depth_weight(limit: int) -> int:
+    return 2 if limit <= 50 else 5 if limit <= 100 else 10 if limit <= 500 else 20
+
+def request_weight(path: str, params: dict | None = None) -> int:
+    params = params or {}
+    if path == "/fapi/v1/klines": return _klines_weight(int(params.get("limit", 500)))
+    if path == "/fapi/v1/depth": return _depth_weight(int(params.get("limit", 500)))
+    if path == "/fapi/v1/ticker/24hr": return 1 if params.get("symbol") else 40
+    if path == "/fapi/v1/premiumIndex": return 1 if params.get("symbol") else 10
+    return 1
+
+# 独立计数的端点：(上限, 窗口秒)。fundingRate 与 fundingInfo 共用 500/5min/IP
+PATH_LIMITS = {"/fapi/v1/fundingRate": (500, 300)}
+
+class WeightLimiter:
+    """令牌桶：按权重放行，并用 X-MBX-USED-WEIGHT-1m 与服务器口径对齐。"""
+    def __init__(self, limit_1m: int = WEIGHT_LIMIT, safety: float = WEIGHT_SAFETY, window_sec: float = 60.0):
+        self.cap = max(1.0, float(limit_1m)*float(safety))
+        self.rate = self.cap/float(window_sec)
+        self.tokens = self.cap
+        self.t = time.monotonic()
+        self.pause_until = 0.0
+        self.used_1m = 0
+        self.waited_sec = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.cap, self.tokens + (now-self.t)*self.rate); self.t = now
+
+    def acquire(self, w: int = 1):
+        w = min(float(w), self.cap)
+        while True:
+            with self._lock:
+                now = time.monotonic(); self._refill(now)
+                if now >= self.pause_until and self.tokens >= w:
+                    self.tokens -= w; return
+                wait = max(self.pause_until-now, (w-self.tokens)/self.rate)
+                self.waited_sec += wait
+            time.sleep(wait)
+
+    def observe(self, used_1m: int):
+        # 服务器按整分钟窗口计数；接近上限时停到下一分钟，而不是等 429
+        with self._lock:
+            now = time.monotonic(); self._refill(now)
+            self.used_1m = int(used_1m)
+            self.tokens = min(self.tokens, self.cap-used_1m)
+            if used_1m >= self.cap:
+                self.pause_until = max(self.pause_until, now + 60.0 - time.time()%60.0)
+
+    def penalize(self, sec: float):
+        with self._lock:
+            self.tokens = 0.0; self.pause_until = max(self.pause_until, time.monotonic()+float(sec))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"used_1m": self.used_1m, "tokens": round(self.tokens,1), "cap": self.cap, "waited_sec": round(self.waited_sec,2)}
 
 class BinanceFutures:
-    def __init__(self, base=BASE):
+    def __init__(self, base=BASE, pool_size: int = POOL_SIZE, weight_limit: int = WEIGHT_LIMIT, weight_safety: float = WEIGHT_SAFETY):
         self.base = base
+        self.limiter = WeightLimiter(weight_limit, weight_safety)
+        self.path_limiters = {p: WeightLimiter(n, weight_safety, w) for p,(n,w) in PATH_LIMITS.items()}
+        # 长连接池：所有请求共用一个 Session，避免每次 TCP+TLS 握手
+        self.session = requests.Session()
+        self.session.headers.update({"Accept-Encoding":"gzip, deflate", "Connection":"keep-alive"})
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(pool_size), pool_block=True)
+        self.session.mount("https://", self.adapter); self.session.mount("http://", self.adapter)
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict] = {}
+        # 进程累计（不随 stats(reset) 清零）：被限流次数与退避睡眠秒数（不含令牌桶排队，见 limiter.waited_sec）
+        self.throttle = {"429": 0, "418": 0, "backoff_sec": 0.0}
+
+    def _conn_count(self):
+        # urllib3 各连接池累计新建连接数；不变即本次请求复用了已有连接
+        try:
+            pools = self.adapter.poolmanager.pools
+            return sum(pools[k].num_connections for k in pools.keys())
+        except Exception: return None
+
+    def _record(self, path, dt, ok, reused):
+        with self._lock:
+            st = self._stats.get(path)
+            if st is None:
+                st = self._stats[path] = {"n":0,"err":0,"sec":0.0,"max_sec":0.0,"reused":0,"new_conn":0,"hist":Histogram()}
+            st["n"] += 1; st["sec"] += dt; st["max_sec"] = max(st["max_sec"], dt); st["hist"].observe(dt*1e3)
+            if not ok: st["err"] += 1
+            if reused is True: st["reused"] += 1
+            elif reused is False: st["new_conn"] += 1
+
+    def stats(self, reset: bool = False) -> dict:
+        with self._lock:
+            out = {p: dict(s, avg_ms=round(s["sec"]/max(1,s["n"])*1e3,1), hist=s["hist"].to_dict()) for p,s in self._stats.items()}
+            if reset: self._stats = {}
+        return out
+
+    def _backoff(self, sec: float, status=None):
+        with self._lock:
+            if status: self.throttle[str(status)] += 1
+            self.throttle["backoff_sec"] += sec
+
+    def throttle_stats(self) -> dict:
+        with self._lock: return dict(self.throttle)
+
+    def close(self):
+        self.session.close()
 
     def _request(self, method, path, **kw):
         url = self.base + path
         backoff = BASE_DELAY/1000.0
+        weight = request_weight(path, kw.get("params"))
+        path_limiter = self.path_limiters.get(path)
         for i in range(6):
+            if path_limiter: path_limiter.acquire(1)
+            self.limiter.acquire(weight)
+            n0 = self._conn_count()
+            t0 = time.perf_counter(); ok = False
             try:
-                r = requests.request(method, url, timeout=10, **kw)
+                r = self.session.request(method, url, timeout=10, **kw)
+                ok = r.status_code == 200
+                used = r.headers.get("X-MBX-USED-WEIGHT-1m") or r.headers.get("x-mbx-used-weight-1m")
+                if used: self.limiter.observe(int(used))
                 if r.status_code in (418,429):
-                    time.sleep(backoff); backoff *= 1.6; continue
+                    retry = float(r.headers.get("Retry-After") or 0) or backoff
+                    logger.warning("binance {} on {}, pause {:.1f}s", r.status_code, path, retry)
+                    self._backoff(retry, r.status_code); self.limiter.penalize(retry); backoff *= 1.6; continue
                 if r.status_code == 200:
                     return r.json()
                 if r.status_code == 451:  # location restricted
@@ -28,18 +150,30 @@ class BinanceFutures:
                 j = r.json() if r.headers.get("content-type","").startswith("application/json") else {}
                 code = j.get("code")
                 if code in (-1003,):
-                    time.sleep(backoff); backoff *= 1.6; continue
+                    self._backoff(backoff); time.sleep(backoff); backoff *= 1.6; continue
                 r.raise_for_status()
             except Exception as e:
                 logger.warning("binance req err: {}", e)
-                time.sleep(backoff); backoff *= 1.6
+                self._backoff(backoff); time.sleep(backoff); backoff *= 1.6
+            finally:
+                # 并发下连接数差值只是近似值，足以观察握手是否消失
+                n1 = self._conn_count()
+                reused = None if n0 is None or n1 is None else n1 == n0
+                self._record(path, time.perf_counter()-t0, ok, reused)
         raise RuntimeError(f"request failed {method} {path}")
 
     def server_time(self): return self._request("GET","/fapi/v1/time")
-    def klines(self, symbol, interval="1h", limit=200):
-        return self._request("GET","/fapi/v1/klines", params={"symbol":symbol,"interval":interval,"limit":int(limit)})
-    def funding_rate(self, symbol, limit=30):
-        return self._request("GET","/fapi/v1/fundingRate", params={"symbol":symbol,"limit":int(limit)})
+    def klines(self, symbol, interval="1h", limit=200, start_time=None, end_time=None):
+        params = {"symbol":symbol,"interval":interval,"limit":int(limit)}
+        if start_time is not None: params["startTime"] = int(start_time)
+        if end_time is not None: params["endTime"] = int(end_time)
+        return self._request("GET","/fapi/v1/klines", params=params)
+    def funding_rate(self, symbol, limit=30, start_time=None):
+        params = {"symbol":symbol,"limit":int(limit)}
+        if start_time is not None: params["startTime"] = int(start_time)
+        return self._request("GET","/fapi/v1/fundingRate", params=params)
+    def premium_index(self, symbol=None):
+        return self._request("GET","/fapi/v1/premiumIndex", params={"symbol":symbol} if symbol else None)
     def tickers_24h(self):
         return self._request("GET","/fapi/v1/ticker/24hr")
     def depth(self, symbol, limit=50):
@@ -0,0 +1,167 @@
+from __future__ import annotations
+# 本地 Binance USDⓈ-M 替身：实现 BinanceFutures 用到的端点，数据为确定性合成（或本地 K 线库回放），
+# 支持延迟、X-MBX-USED-WEIGHT-1m、超限 429、按概率注入 429/418。用于压测与回归，不连外网。
+#   python -m ats.fakebinance --port 8765 --symbols 1200 --latency-ms 20 --p429 0.005
+#   BINANCE_FAPI_BASE=http://127.0.0.1:8765 python -c "from ats.app import scan_once; scan_once()"
+import argparse, json, random, threading, time, zlib
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from .binance import request_weight
+from .klines import INTERVAL_MS, kline_path, read_klines
+
+HISTORY = 1500   # 每币合成的 bar 数（到当前未收盘 bar 为止）
+HOUR = 3_600_000; FUNDING_MS = 8*HOUR
+
+class FakeMarket:
+    """确定性行情：同一 (symbol, interval) 每次请求得到同一段历史，随时间自然向前滚动。"""
+    def __init__(self, n_symbols: int = 1200, kline_root: str | None = None, seed: int = 0):
+        self.symbols = [f"F{i:04d}USDT" for i in range(n_symbols)]
+        self.root, self.seed = kline_root, seed
+        self._series: dict = {}; self._lock = threading.Lock()
+
+    def _recorded(self, sym, interval):
+        # 本地 K 线库回放：整体平移到“最后一根 = 当前未收盘 bar”
+        if not self.root or not kline_path(sym, interval, self.root).exists(): return None
+        k = read_klines(sym, interval, self.root, cols=["open_time","open","high","low","close","volume"])
+        return {c: np.array(v) for c, v in k.items()}
+
+    def series(self, sym: str, interval: str, now_ms: int) -> dict:
+        step = INTERVAL_MS[interval]; key = (sym, interval)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._recorded(sym, interval)
+                if s is None:
+                    rnd = np.random.default_rng(zlib.crc32(f"{self.seed}:{sym}:{interval}".encode()))
+                    r = rnd.normal(0.0002, 0.012, HISTORY)
+                    c = (10 + 90*rnd.random())*np.exp(np.cumsum(r)); o = np.concatenate([[c[0]], c[:-1]])
+                    s = {"open": o, "close": c, "high": np.maximum(o, c)*(1+np.abs(rnd.normal(0, 0.004, HISTORY))),
+                         "low": np.minimum(o, c)*(1-np.abs(rnd.normal(0, 0.004, HISTORY))),
+                         "volume": 1000*rnd.random(HISTORY), "open_time": np.arange(HISTORY, dtype=np.int64)*step}
+                self._series[key] = s
+        # 整段平移：最后一根始终是当前未收盘 bar（时间前进即历史自然滚动）
+        return {**s, "open_time": s["open_time"] + (now_ms//step*step - int(s["open_time"][-1]))}
+
+    def klines(self, sym, interval, limit=500, start=None, end=None, now_ms=None):
+        now_ms = now_ms or int(time.time()*1000); step = INTERVAL_MS[interval]
+        s = self.series(sym, interval, now_ms); ot = s["open_time"]
+        m = np.ones(len(ot), dtype=bool)
+        if start is not None: m &= ot >= start
+        if end is not None: m &= ot <= end
+        idx = np.flatnonzero(m); idx = idx[:limit] if start is not None else idx[-limit:]
+        return [[int(ot[i]), f"{s['open'][i]:.6f}", f"{s['high'][i]:.6f}", f"{s['low'][i]:.6f}", f"{s['close'][i]:.6f}",
+                 f"{s['volume'][i]:.3f}", int(ot[i])+step-1, f"{s['volume'][i]*s['close'][i]:.3f}", 100,
+                 f"{s['volume'][i]/2:.3f}", f"{s['volume'][i]*s['close'][i]/2:.3f}", "0"] for i in idx]
+
+    def funding(self, sym, limit=100, start=None, now_ms=None):
+        now_ms = now_ms or int(time.time()*1000); last = now_ms//FUNDING_MS*FUNDING_MS
+        times = [last - k*FUNDING_MS for k in range(199, -1, -1)]
+        if start is not None: times = [t for t in times if t >= start][:limit]
+        else: times = times[-limit:]
+        return [{"symbol": sym, "fundingTime": t, "markPrice": "1",
+                 "fundingRate": f"{random.Random(f'{sym}{t}').gauss(0, 3e-4):.8f}"} for t in times]
+
+    def premium(self, sym=None, now_ms=None):
+        now_ms = now_ms or int(time.time()*1000); nxt = (now_ms//FUNDING_MS + 1)*FUNDING_MS
+        rows = [{"symbol": s, "markPrice": "1", "lastFundingRate": "0.0001", "nextFundingTime": nxt, "time": now_ms}
+                for s in ([sym] if sym else self.symbols)]
+        return rows[0] if sym else rows
+
+    def tickers(self):
+        out = []
+        for s in self.symbols:
+            rnd = random.Random(f"{self.seed}{s}")
+            out.append({"symbol": s, "lastPrice": f"{rnd.uniform(1, 100):.4f}", "priceChangePercent": f"{rnd.choice([-1, 1])*rnd.uniform(1, 15):.3f}",
+                        "quoteVolume": f"{rnd.uniform(2e7, 2e9):.2f}"})
+        return out
+
+    def depth(self, sym, limit=50):
+        s = self._series.get((sym, "1h")); mid = float(s["close"][-1]) if s else 1.0
+        return {"lastUpdateId": 1, "bids": [[f"{mid*(1-0.0001*i):.6f}", "5000"] for i in range(1, limit+1)],
+                "asks": [[f"{mid*(1+0.0001*i):.6f}", "5000"] for i in range(1, limit+1)]}
+
+class FakeBinance:
+    """服务端状态：1 分钟权重窗口 + 注入故障 + 请求计数（/__stats 查看，/__reset 清零）。"""
+    def __init__(self, market: FakeMarket, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 weight_limit: int = 2400, p429: float = 0.0, p418: float = 0.0, retry_after: int = 2, seed: int = 0):
+        self.m, self.latency, self.jitter = market, latency_ms/1e3, jitter_ms/1e3
+        self.limit, self.p429, self.p418, self.retry_after = weight_limit, p429, p418, retry_after
+        self.rnd = random.Random(seed); self._w = deque(); self._lock = threading.Lock()
+        self.counts: dict = {}; self.injected = {"429": 0, "418": 0, "over_limit": 0}
+
+    def _used(self, add: int) -> int:
+        # 与 Binance 同口径：当前自然分钟内的累计权重
+        minute = int(time.time()//60)
+        with self._lock:
+            while self._w and self._w[0][0] != minute: self._w.popleft()
+            self._w.append((minute, add))
+            return sum(w for _, w in self._w)
+
+    def handle(self, path: str, q: dict):
+        """→ (status, body, headers)"""
+        if path == "/__stats": return 200, {"counts": self.counts, "injected": self.injected}, {}
+        if path == "/__reset":
+            with self._lock: self.counts = {}; self.injected = {k: 0 for k in self.injected}
+            return 200, {}, {}
+        with self._lock:
+            self.counts[path] = self.counts.get(path, 0) + 1
+        if self.latency or self.jitter: time.sleep(max(0.0, self.rnd.gauss(self.latency, self.jitter)))
+        used = self._used(request_weight(path, q))
+        hdr = {"X-MBX-USED-WEIGHT-1m": str(used)}
+        with self._lock:
+            r = self.rnd.random()
+            fault = "418" if r < self.p418 else "429" if r < self.p418+self.p429 else None
+            if fault is None and used > self.limit: fault = "over_limit"
+            if fault: self.injected[fault] += 1
+        if fault:
+            code = 418 if fault == "418" else 429
+            return code, {"code": -1003, "msg": "Too many requests (fake)"}, {**hdr, "Retry-After": str(self.retry_after)}
+        m = self.m
+        if path == "/fapi/v1/time": body = {"serverTime": int(time.time()*1000)}
+        elif path == "/fapi/v1/klines":
+            body = m.klines(q["symbol"], q.get("interval", "1h"), int(q.get("limit", 500)),
+                            int(q["startTime"]) if "startTime" in q else None, int(q["endTime"]) if "endTime" in q else None)
+        elif path == "/fapi/v1/fundingRate":
+            body = m.funding(q["symbol"], int(q.get("limit", 100)), int(q["startTime"]) if "startTime" in q else None)
+        elif path == "/fapi/v1/premiumIndex": body = m.premium(q.get("symbol"))
+        elif path == "/fapi/v1/ticker/24hr": body = m.tickers()
+        elif path == "/fapi/v1/depth": body = m.depth(q["symbol"], int(q.get("limit", 50)))
+        else: return 404, {"code": -1, "msg": "not found"}, hdr
+        return 200, body, hdr
+
+def serve(fake: FakeBinance, host: str = "127.0.0.1", port: int = 8765, background: bool = False):
+    class H(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def log_message(self, *a): pass
+        def do_GET(self):
+            u = urlparse(self.path)
+            code, body, hdr = fake.handle(u.path, {k: v[0] for k, v in parse_qs(u.query).items()})
+            b = json.dumps(body).encode()
+            self.send_response(code)
+            for k, v in {"Content-Type": "application/json", "Content-Length": str(len(b)), **hdr}.items(): self.send_header(k, v)
+            self.end_headers(); self.wfile.write(b)
+    srv = ThreadingHTTPServer((host, port), H); srv.daemon_threads = True
+    if background:
+        threading.Thread(target=srv.serve_forever, name="fakebinance", daemon=True).start()
+    else:
+        srv.serve_forever()
+    return srv
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m ats.fakebinance")
+    ap.add_argument("--host", default="127.0.0.1"); ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--symbols", type=int, default=1200); ap.add_argument("--kline-root", default=None)
+    ap.add_argument("--latency-ms", type=float, default=0.0); ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--weight-limit", type=int, default=2400)
+    ap.add_argument("--p429", type=float, default=0.0); ap.add_argument("--p418", type=float, default=0.0)
+    ap.add_argument("--retry-after", type=int, default=2); ap.add_argument("--seed", type=int, default=0)
+    a = ap.parse_args(argv)
+    fake = FakeBinance(FakeMarket(a.symbols, a.kline_root, a.seed), a.latency_ms, a.jitter_ms, a.weight_limit,
+                       a.p429, a.p418, a.retry_after, a.seed)
+    print(f"fake binance on http://{a.host}:{a.port} ({a.symbols} symbols)", flush=True)
+    serve(fake, a.host, a.port)
+
+if __name__ == "__main__":
+    main()
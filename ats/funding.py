@@ -0,0 +1,73 @@
+from __future__ import annotations
+import threading
+from loguru import logger
+
+class FundingCache:
+    """按币缓存最近的资金费率结算记录（与 /fapi/v1/fundingRate 返回格式相同）。
+    每次扫描开始用一次 premiumIndex（全市场）判断哪些币有新结算，只为这些币（及未缓存币）补拉缺失的记录；
+    Gate C 之后直接读内存。整点前的预取用 cold=False + fetch 把冷币分批摊开，避免冷启动一次打满 fundingRate 的 500/5min 配额。"""
+    def __init__(self, keep: int = 30):
+        self.keep = int(keep)
+        self._rows: dict[str, list] = {}
+        self._next: dict[str, int] = {}
+        self._premium: dict[str, int] = {}   # 最近一次 premiumIndex 的 nextFundingTime
+        self._lock = threading.Lock()
+        self.stats = {"hit": 0, "miss": 0, "full": 0, "incr": 0}
+
+    def _count(self, k):
+        with self._lock: self.stats[k] += 1
+
+    def refresh(self, bnz, symbols: list, pmap=None, cold: bool = True) -> int:
+        """补齐 symbols 的资金费率（cold=False 时只补已缓存币的新结算）；返回发起的请求数。"""
+        pmap = pmap or (lambda fn, items: list(map(fn, items)))
+        try:
+            nxt = {it["symbol"]: int(it.get("nextFundingTime") or 0) for it in bnz.premium_index()}
+        except Exception as e:
+            logger.warning("premiumIndex failed: {}", e); nxt = {}
+        with self._lock:
+            if nxt: self._premium = nxt
+            need = [s for s in dict.fromkeys(symbols)
+                    if (cold and s not in self._rows) or (s in self._rows and s in nxt and nxt[s] != self._next.get(s))]
+
+        def _one(sym):
+            try: self._sync(bnz, sym, nxt.get(sym, 0))
+            except Exception as e: logger.warning("funding prefetch {} failed: {}", sym, e)
+
+        pmap(_one, need)
+        return len(need)
+
+    def _sync(self, bnz, sym: str, next_time: int):
+        with self._lock: have = list(self._rows.get(sym) or [])
+        if have:
+            new = bnz.funding_rate(sym, limit=100, start_time=int(have[-1]["fundingTime"])+1)
+            self._count("incr")
+        else:
+            new = bnz.funding_rate(sym, limit=self.keep)
+            self._count("full")
+        seen = {int(r["fundingTime"]) for r in have}
+        rows = (have + [r for r in new or [] if int(r["fundingTime"]) not in seen])[-self.keep:]
+        with self._lock:
+            self._rows[sym] = rows
+            # 新结算尚未发布时不推进 next，下次扫描再补
+            if new or not have: self._next[sym] = next_time
+
+    def fetch(self, bnz, symbol: str) -> list:
+        """预取单个未缓存币：整段拉取并入缓存（next 取最近一次 premiumIndex 的值）。"""
+        self._sync(bnz, symbol, self._premium.get(symbol, 0))
+        with self._lock: return list(self._rows.get(symbol) or [])   # 不经 get()：预取不计命中/未命中
+
+    def has(self, symbol: str) -> bool:
+        with self._lock: return symbol in self._rows
+
+    def get(self, symbol: str):
+        with self._lock:
+            rows = self._rows.get(symbol)
+            self.stats["hit" if rows is not None else "miss"] += 1
+            return list(rows) if rows is not None else None
+
+    def reset_stats(self) -> dict:
+        with self._lock:
+            out = dict(self.stats); self.stats = {k: 0 for k in self.stats}
+        return out
+
+CACHE = FundingCache()
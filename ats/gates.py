@@ -1,5 +1,6 @@
 from __future__ import annotations
 import numpy as np, pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 
 def gate_A_true_breakout(df: pd.DataFrame, params: dict) -> bool:
     look = int(params["thresholds"]["gates"]["A"]["lookback"])
@@ -21,19 +22,50 @@ def _pct_rank(arr: np.ndarray, x: float) -> float:
     if arr.size==0: return 0.0
     return 100.0 * (np.sum(arr<=x)/arr.size)
 
+def _pct_rank_sorted(sorted_arr: np.ndarray, x: float) -> float:
+    # 已排序数组上二分计数 arr<=x，与 _pct_rank 同值
+    if sorted_arr.size==0 or x != x: return 0.0
+    return 100.0 * (np.searchsorted(sorted_arr, x, side="right")/sorted_arr.size)
+
+def _speed6(abs_ret: np.ndarray) -> np.ndarray:
+    # 6 根绝对收益的滚动均值：窗口和/6（等同 rolling(6).apply(mean(abs))，无逐窗 Python 调用）
+    if abs_ret.shape[-1] < 6: return abs_ret[..., :0]
+    return sliding_window_view(abs_ret, 6, axis=-1).sum(axis=-1)/6
+
+def _funding_pctl(funding_rates: list[dict]) -> float:
+    f_abs = np.array([abs(float(x.get("fundingRate",0))) for x in funding_rates], dtype=float)
+    f_last= float(f_abs[-1]) if f_abs.size else 0.0
+    return _pct_rank_sorted(np.sort(f_abs), f_last)
+
 def compute_c_metrics(df: pd.DataFrame, funding_rates: list[dict]) -> dict:
     close = pd.to_numeric(df["close"], errors="coerce")
     ret = close.pct_change().dropna()
-    sp6 = ret.rolling(6).apply(lambda x: np.mean(np.abs(x)), raw=True).dropna()
-    cur_speed = float(sp6.iloc[-1]) if len(sp6) else 0.0
-    speed_pctl = _pct_rank(sp6.values, cur_speed)
+    sp6 = _speed6(np.abs(ret.to_numpy()))
+    sp6 = sp6[~np.isnan(sp6)]
+    cur_speed = float(sp6[-1]) if len(sp6) else 0.0
+    speed_pctl = _pct_rank_sorted(np.sort(sp6), cur_speed)
     if len(ret)>=10 and ret.std()>0:
         z_abs = float(abs((ret.iloc[-1]-ret.mean())/(ret.std()+1e-12)))
     else:
         z_abs = 0.0
-    f_abs = np.array([abs(float(x.get("fundingRate",0))) for x in funding_rates], dtype=float)
-    f_last= float(f_abs[-1]) if f_abs.size else 0.0
-    funding_pctl = _pct_rank(np.sort(f_abs), f_last)
+    return {"funding_pctl":_funding_pctl(funding_rates), "speed_pctl":speed_pctl, "z_abs":z_abs}
+
+def compute_c_metrics_batch(closes: np.ndarray, funding_rates: list[list[dict]]) -> dict:
+    """多币一次算 Gate C 指标：closes 为 (symbols × bars) 无 NaN 面板，返回各指标数组。"""
+    closes = np.asarray(closes, dtype=float)
+    S = closes.shape[0]
+    ret = closes[:, 1:]/closes[:, :-1] - 1
+    sp6 = _speed6(np.abs(ret))
+    if sp6.shape[1]:
+        speed_pctl = 100.0 * ((sp6 <= sp6[:, -1:]).sum(axis=1)/sp6.shape[1])
+    else:
+        speed_pctl = np.zeros(S)
+    z_abs = np.zeros(S)
+    if ret.shape[1] >= 10:
+        mu = ret.mean(axis=1); sd = ret.std(axis=1, ddof=1)
+        ok = sd > 0
+        z_abs[ok] = np.abs((ret[ok, -1]-mu[ok])/(sd[ok]+1e-12))
+    funding_pctl = np.array([_funding_pctl(fr or []) for fr in funding_rates], dtype=float)
     return {"funding_pctl":funding_pctl, "speed_pctl":speed_pctl, "z_abs":z_abs}
 
 def gate_C_crowded_check_from_metrics(metrics: dict, params: dict) -> bool:
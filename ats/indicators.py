@@ -4,24 +4,40 @@ import numpy as np, pandas as pd
 def ema(s: pd.Series, n: int) -> pd.Series:
     return s.ewm(span=n, adjust=False, min_periods=n).mean()
 
+def true_range(df: pd.DataFrame) -> pd.Series:
+    # 直接在 ndarray 上算（与 Series 运算逐位相同，省掉 pandas 对齐开销）
+    h,l,c = (df[k].to_numpy(dtype=float) for k in ("high","low","close"))
+    pc = np.empty_like(c); pc[:1] = np.nan; pc[1:] = c[:-1]
+    return pd.Series(np.maximum(h-l, np.maximum(np.abs(h-pc), np.abs(l-pc))), index=df.index)
+
 def atr(df: pd.DataFrame, n: int = 14) -> pd.Series:
-    h,l,c = df["high"], df["low"], df["close"]
-    tr = np.maximum(h-l, np.maximum(abs(h-c.shift(1)), abs(l-c.shift(1))))
-    return tr.rolling(n).mean()
+    return true_range(df).rolling(n).mean()
 
 def chop(df: pd.DataFrame, n: int = 14) -> pd.Series:
-    h,l,c = df["high"], df["low"], df["close"]
-    tr = np.maximum(h-l, np.maximum(abs(h-c.shift(1)), abs(l-c.shift(1))))
+    h,l = df["high"], df["low"]
+    tr = true_range(df)
     num = np.log10((h.rolling(n).max()-l.rolling(n).min()) / tr.rolling(n).sum().replace(0,np.nan))
     return 100*num.replace([np.inf,-np.inf],np.nan)
 
 def zigzag(df: pd.DataFrame, atr_mult: float = 0.5) -> pd.Series:
-    a = atr(df,14)
-    piv = np.zeros(len(df), dtype=int)
-    last_p, last_dir = df["close"].iloc[0], 0
-    for i,(c,tr) in enumerate(zip(df["close"], a.bfill())):
-        if last_dir<=0 and c > last_p + atr_mult*tr: last_dir=1; piv[i]=1; last_p=c
-        elif last_dir>=0 and c < last_p - atr_mult*tr: last_dir=-1; piv[i]=-1; last_p=c
+    # 状态机只在枢轴处改变状态：从当前枢轴向后向量化搜索下一个触发点，逐枢轴跳跃而非逐 bar 循环
+    c = df["close"].to_numpy(dtype=float)
+    m = atr_mult*atr(df,14).bfill().to_numpy(dtype=float)
+    n = len(c); piv = np.zeros(n, dtype=int)
+    if n == 0: return pd.Series(piv, index=df.index)
+    i, last_p, last_dir, w = 0, c[0], 0, 16
+    while i < n:
+        j = min(n, i+w); cc, mm = c[i:j], m[i:j]
+        up = (cc > last_p + mm) if last_dir <= 0 else np.zeros(j-i, dtype=bool)
+        dn = (cc < last_p - mm) if last_dir >= 0 else np.zeros(j-i, dtype=bool)
+        hit = up | dn
+        if not hit.any():
+            if j >= n: break
+            i, w = j, w*2; continue
+        k = int(hit.argmax())
+        last_dir = 1 if up[k] else -1
+        piv[i+k] = last_dir; last_p = c[i+k]
+        i, w = i+k+1, 16
     return pd.Series(piv, index=df.index)
 
 def ema_slope_r2(s: pd.Series, n=30, win=30):
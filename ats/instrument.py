@@ -0,0 +1,126 @@
+from __future__ import annotations
+import json, os, sys, time, threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from loguru import logger
+
+class StageTimer:
+    """按阶段累计耗时/次数，线程安全（并发扫描共用一个实例）。"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._acc: dict[str, list] = {}
+        self.t0 = time.perf_counter()
+
+    def add(self, name: str, sec: float):
+        with self._lock:
+            a = self._acc.setdefault(name, [0, 0.0, 0.0])
+            a[0] += 1; a[1] += sec; a[2] = max(a[2], sec)
+
+    @contextmanager
+    def stage(self, name: str):
+        t = time.perf_counter()
+        try: yield
+        finally: self.add(name, time.perf_counter()-t)
+
+    def wall(self) -> float:
+        return time.perf_counter() - self.t0
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {k: {"n": n, "sec": round(s,3), "max_ms": round(m*1e3,1)} for k,(n,s,m) in self._acc.items()}
+
+    def line(self) -> str:
+        return " ".join(f"{k}={v['sec']:.2f}s/{v['n']}" for k,v in self.summary().items())
+
+# 请求延迟桶上界（毫秒），最后一格为 +Inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class Histogram:
+    """固定桶直方图；不加锁，由调用方在自己的锁内 observe。"""
+    __slots__ = ("bounds", "counts", "n", "sum")
+    def __init__(self, bounds=LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds); self.counts = [0]*(len(self.bounds)+1); self.n = 0; self.sum = 0.0
+
+    def observe(self, v: float):
+        self.counts[bisect_left(self.bounds, v)] += 1; self.n += 1; self.sum += v
+
+    def quantile(self, q: float):
+        # 返回所在桶的上界（+Inf 桶返回 None）
+        if not self.n: return None
+        need, acc = q*self.n, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= need: return self.bounds[i] if i < len(self.bounds) else None
+        return None
+
+    def to_dict(self) -> dict:
+        return {"le": [*self.bounds, "+Inf"], "counts": list(self.counts), "n": self.n, "sum": round(self.sum, 3),
+                "p50": self.quantile(0.5), "p90": self.quantile(0.9), "p99": self.quantile(0.99)}
+
+REPORT_PATH = "reports/scan_metrics.jsonl"
+
+def write_report(rec: dict, path: str = REPORT_PATH):
+    """每轮扫描追加一行 JSON。"""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a") as f:
+        f.write(json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=str) + "\n")
+
+# 单轮剖析：进程内第一轮读环境变量 ATS_PROFILE，之后 touch reports/profile.next（内容为模式，空=cprofile）触发下一轮
+PROFILE_TRIGGER = "reports/profile.next"
+_PROFILE = {"env_used": False}
+
+def profile_mode() -> str | None:
+    if not _PROFILE["env_used"]:
+        _PROFILE["env_used"] = True
+        mode = os.getenv("ATS_PROFILE", "").strip().lower()
+        if mode: return mode
+    p = Path(PROFILE_TRIGGER)
+    if p.exists():
+        mode = p.read_text().strip().lower() or "cprofile"; p.unlink(missing_ok=True)
+        return mode
+    return None
+
+class _Sampler(threading.Thread):
+    """采样剖析：每 interval 秒抓一次全部线程栈（含扫描线程池），按折叠栈计数。"""
+    def __init__(self, interval: float = 0.005):
+        super().__init__(name="sampler", daemon=True)
+        self.interval, self.stacks, self._halt = interval, Counter(), threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._halt.wait(self.interval):
+            for tid, fr in sys._current_frames().items():
+                if tid == me: continue
+                st = []
+                while fr is not None:
+                    co = fr.f_code; st.append(f"{Path(co.co_filename).name}:{co.co_name}"); fr = fr.f_back
+                self.stacks[";".join(reversed(st))] += 1
+
+    def halt(self):
+        self._halt.set(); self.join()
+
+@contextmanager
+def profiled(mode: str | None, out_dir: str = "reports", top: int = 25):
+    """mode=cprofile（仅调用线程，线程池里的取数看不到）或 sample（全部线程，折叠栈可直接喂 flamegraph）。"""
+    if not mode:
+        yield; return
+    stamp = time.strftime("%Y%m%dT%H%M%S"); Path(out_dir).mkdir(parents=True, exist_ok=True)
+    if mode == "sample":
+        s = _Sampler(); s.start()
+        try: yield
+        finally:
+            s.halt(); out = Path(out_dir)/f"profile_{stamp}.folded"
+            out.write_text("".join(f"{k} {v}\n" for k, v in s.stacks.most_common()))
+            leaf = Counter()
+            for k, v in s.stacks.items(): leaf[k.rsplit(";", 1)[-1]] += v
+            logger.info("profile(sample) -> {} | top {}", out, leaf.most_common(top))
+    else:
+        import cProfile, io, pstats
+        pr = cProfile.Profile(); pr.enable()
+        try: yield
+        finally:
+            pr.disable(); out = Path(out_dir)/f"profile_{stamp}.prof"; pr.dump_stats(str(out))
+            buf = io.StringIO(); pstats.Stats(pr, stream=buf).sort_stats("cumulative").print_stats(top)
+            logger.info("profile(cprofile) -> {}\n{}", out, buf.getvalue())
@@ -0,0 +1,309 @@
+from __future__ import annotations
+import os, time, threading
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from loguru import logger
+try: import fcntl
+except ImportError: fcntl = None  # 非 POSIX：只剩进程内锁
+
+# Binance kline 数组前 11 列（第 12 列 ignore 丢弃）
+KLINE_COLS = ["open_time","open","high","low","close","volume","close_time","qav","trades","taker_base","taker_quote"]
+OHLCV = ["open","high","low","close","volume"]
+_INT_COLS = {0, 6, 8}
+KLINE_DTYPES = [np.int64 if i in _INT_COLS else np.float64 for i in range(len(KLINE_COLS))]
+INTERVAL_MS = {"1m":60_000, "3m":180_000, "5m":300_000, "15m":900_000, "30m":1_800_000,
+               "1h":3_600_000, "2h":7_200_000, "4h":14_400_000, "6h":21_600_000,
+               "8h":28_800_000, "12h":43_200_000, "1d":86_400_000}
+MAX_FETCH = 1500  # 单次 klines 上限
+KLINE_DIR = os.getenv("KLINE_DIR", "db/klines")
+
+def decode_klines(payload: list) -> dict:
+    """原始 klines JSON 一次性转为连续列数组（float64；时间/笔数列 int64），含 taker_base/taker_quote。"""
+    n = len(payload)
+    if n == 0:
+        return {c: np.empty(0, dtype=dt) for c,dt in zip(KLINE_COLS, KLINE_DTYPES)}
+    try:
+        # 一次遍历解析成 (n, 11) 块，转置后每列都是连续内存
+        block = np.array([k[:11] for k in payload], dtype=np.float64).T.copy()
+    except (ValueError, TypeError):
+        # 含非数值字段时退回逐列容错（与 pd.to_numeric(errors="coerce") 一致记为 NaN）
+        import pandas as pd
+        block = np.vstack([pd.to_numeric(pd.Series([k[i] for k in payload]), errors="coerce").to_numpy(np.float64)
+                           for i in range(11)])
+    return {c: (block[i].astype(np.int64) if i in _INT_COLS else block[i]) for i,c in enumerate(KLINE_COLS)}
+
+def _take(cols: dict, mask) -> dict:
+    return {c: v[mask] for c,v in cols.items()}
+
+# ----- 列式文件：64B 头 + 每列 capacity*8 字节的连续块，只追加 -----
+# 头部 int64[8]: magic, version, ncols, capacity, length, 0, 0, 0
+# 多进程写（扫描主循环 + backfill CLI）：写操作都在旁路 <symbol>.lock 的 flock 内进行；
+# _grow/prepend 用 os.replace 换掉文件，其他进程拿锁时发现 inode 变了先重新映射，不会写进旧文件
+_MAGIC = int.from_bytes(b"ATSKCOL1", "little")
+_HDR = 64
+
+class ColumnFile:
+    """单个 (symbol, interval) 的列式 K 线文件；用 numpy.memmap 打开，读取零解析。"""
+    def __init__(self, path, writable: bool = True, capacity: int = 1024):
+        self.path = Path(path); self.writable = writable
+        self._rlock = threading.RLock(); self._depth = 0; self._lfd = None
+        if not self.path.exists():
+            if not writable: raise FileNotFoundError(self.path)
+            self._create(self.path, int(capacity))
+        self._map()
+
+    @staticmethod
+    def _create(path: Path, cap: int):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        hdr = np.array([_MAGIC, 1, len(KLINE_COLS), cap, 0, 0, 0, 0], dtype=np.int64)
+        with open(path, "wb") as f:
+            f.write(hdr.tobytes()); f.truncate(_HDR + len(KLINE_COLS)*cap*8)
+
+    def _map(self):
+        self._ino = os.stat(self.path).st_ino  # 先取 inode 再映射：中间被替换也只会多一次重映射
+        self._mm = np.memmap(self.path, dtype=np.uint8, mode="r+" if self.writable else "r")
+        self._hdr = self._mm[:_HDR].view(np.int64)
+        if int(self._hdr[0]) != _MAGIC or int(self._hdr[2]) != len(KLINE_COLS):
+            raise ValueError(f"bad kline file {self.path}")
+        cap = self.capacity
+        self._cols = [self._mm[_HDR+i*cap*8 : _HDR+(i+1)*cap*8].view(dt) for i,dt in enumerate(KLINE_DTYPES)]
+
+    def _stale(self) -> bool:
+        try: return os.stat(self.path).st_ino != self._ino
+        except FileNotFoundError: return False
+
+    @contextmanager
+    def locked(self):
+        """跨进程写锁（可重入）；拿到锁时若文件已被别的进程替换，先重新映射到新文件。"""
+        with self._rlock:
+            if self._depth == 0 and self.writable and fcntl is not None:
+                self._lfd = os.open(self.path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._lfd, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                if self._depth == 1 and self._stale():
+                    del self._cols, self._hdr, self._mm
+                    self._map()
+                yield self
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and self._lfd is not None:
+                    os.close(self._lfd); self._lfd = None  # close 即释放 flock
+
+    @property
+    def capacity(self) -> int: return int(self._hdr[3])
+    def __len__(self) -> int: return int(self._hdr[4])
+
+    def last_open_time(self):
+        n = len(self)
+        return int(self._cols[0][n-1]) if n else None
+
+    def column(self, name: str, start: int = 0, stop: int | None = None) -> np.ndarray:
+        n = len(self)
+        return self._cols[KLINE_COLS.index(name)][start:n if stop is None else min(stop, n)]
+
+    def tail(self, k: int, cols=KLINE_COLS, copy: bool = True) -> dict:
+        n = len(self); s = max(0, n-int(k))
+        return {c: (np.array if copy else np.asarray)(self._cols[KLINE_COLS.index(c)][s:n]) for c in cols}
+
+    def _grow(self, need: int):
+        with self.locked(): self._grow_locked(need)
+
+    def _grow_locked(self, need: int):
+        old = len(self); cap = max(self.capacity*2, need)
+        tmp = self.path.with_suffix(".tmp")
+        self._create(tmp, cap)
+        mm = np.memmap(tmp, dtype=np.uint8, mode="r+")
+        for i,dt in enumerate(KLINE_DTYPES):
+            mm[_HDR+i*cap*8 : _HDR+i*cap*8+old*8].view(dt)[:] = self._cols[i][:old]
+        mm[:_HDR].view(np.int64)[4] = old
+        mm.flush(); del mm
+        del self._cols, self._hdr, self._mm  # 旧映射由 GC 回收，外部持有的视图仍有效
+        os.replace(tmp, self.path)
+        self._map()
+
+    def prepend(self, cols: dict):
+        """在头部补入更早的 bar（open_time 须早于现有第一根）：写临时文件后原子替换，读者要么看到旧文件要么看到新文件。"""
+        n = len(cols["open_time"])
+        if n == 0: return
+        with self.locked(): self._prepend_locked(cols, n)
+
+    def _prepend_locked(self, cols: dict, n: int):
+        old = len(self)
+        if old and int(cols["open_time"][-1]) >= int(self._cols[0][0]):
+            raise ValueError(f"prepend overlaps existing bars in {self.path}")
+        cap = max(self.capacity, old+n)
+        tmp = self.path.with_suffix(".tmp")
+        self._create(tmp, cap)
+        mm = np.memmap(tmp, dtype=np.uint8, mode="r+")
+        for i,(c,dt) in enumerate(zip(KLINE_COLS, KLINE_DTYPES)):
+            col = mm[_HDR+i*cap*8 : _HDR+i*cap*8+(old+n)*8].view(dt)
+            col[:n] = cols[c]; col[n:] = self._cols[i][:old]
+        mm[:_HDR].view(np.int64)[4] = old+n
+        mm.flush(); del mm
+        del self._cols, self._hdr, self._mm
+        os.replace(tmp, self.path)
+        self._map()
+
+    def first_open_time(self):
+        return int(self._cols[0][0]) if len(self) else None
+
+    def append(self, cols: dict):
+        n = len(cols["open_time"])
+        if n == 0: return
+        with self.locked(): self._append_locked(cols, n)
+
+    def _append_locked(self, cols: dict, n: int):
+        cur = len(self)
+        if cur+n > self.capacity: self._grow_locked(cur+n)
+        for i,c in enumerate(KLINE_COLS):
+            self._cols[i][cur:cur+n] = cols[c]
+        self._hdr[4] = cur+n  # 数据先落，最后提交长度
+        self._mm.flush()
+
+def kline_path(symbol: str, interval: str, root: str = KLINE_DIR) -> Path:
+    return Path(root) / interval / f"{symbol}.kcol"
+
+def read_klines(symbol: str, interval: str = "1h", root: str = KLINE_DIR, cols=KLINE_COLS) -> dict:
+    """离线读取：返回各列的只读 memmap 视图（不拷贝、不解析）。"""
+    f = ColumnFile(kline_path(symbol, interval, root), writable=False)
+    return f.tail(len(f), cols, copy=False)
+
+class KlineStore:
+    """按 (symbol, interval) 缓存已收盘 K 线（列式 memmap 文件）；每次只补最后收盘之后的新 bar。"""
+    def __init__(self, root: str = KLINE_DIR):
+        self.root = root
+        self._files: dict[tuple, ColumnFile] = {}
+        self._locks: dict[tuple, threading.Lock] = {}
+        self._glock = threading.Lock()
+        self.stats = {"warm": 0, "incr": 0, "bars_fetched": 0}
+
+    def _lock(self, key):
+        with self._glock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _count(self, kind, bars):
+        with self._glock:
+            self.stats[kind] += 1; self.stats["bars_fetched"] += bars
+
+    def _file(self, key) -> ColumnFile:
+        if key not in self._files:
+            self._files[key] = ColumnFile(kline_path(key[0], key[1], self.root))
+        return self._files[key]
+
+    def get(self, bnz, symbol: str, interval: str = "1h", limit: int = 200) -> dict:
+        """返回最近 limit 根（含未收盘的当前 bar）的列数组，与 bnz.klines(limit=limit) 一致。"""
+        key = (symbol, interval)
+        step = INTERVAL_MS.get(interval)
+        with self._lock(key), self._file(key).locked() as f:
+            # flock 覆盖读-拉取-追加整段：另一个进程不会在中间补同一批 bar
+            last_ot = f.last_open_time()
+            now_ms = int(time.time()*1000)
+            missing = (now_ms - last_ot)//step if (step and last_ot is not None) else None
+            if missing is not None and missing+1 > MAX_FETCH and len(f) >= limit-1:
+                # 停机过久：从最后收盘 bar 之后向后分页补齐（backfill 是向前分页），文件里不留空洞
+                last_ot, missing = self._catch_up(bnz, f, symbol, interval, step, last_ot, now_ms)
+            full = missing is None or len(f) < limit-1 or missing+1 > MAX_FETCH
+            if full:
+                # 冷启动 / 文件比 limit 短 / 补齐失败：整段拉取
+                raw = bnz.klines(symbol=symbol, interval=interval, limit=limit)
+                self._count("warm", len(raw))
+            else:
+                # 增量：最后收盘 bar 之后的全部（含补缺口），通常 limit=2
+                raw = bnz.klines(symbol=symbol, interval=interval, limit=int(missing)+1, start_time=last_ot+step)
+                self._count("incr", len(raw))
+            cols = decode_klines(raw)
+            floor = -1 if last_ot is None else last_ot
+            is_closed = cols["close_time"] < now_ms
+            new_closed = is_closed & (cols["open_time"] > floor)
+            first_ot = f.first_open_time()
+            if full and first_ot is not None:
+                # 整段拉取带回了比文件更早的已收盘 bar：补到文件头部，下次即可走增量
+                older = is_closed & (cols["open_time"] < first_ot)
+                if older.any():
+                    try: f.prepend(_take(cols, older))
+                    except Exception as e: logger.warning("kline prepend failed {}: {}", symbol, e)
+            forming = np.flatnonzero(~is_closed)[-1:]
+            keep = np.zeros(len(is_closed), dtype=bool); keep[forming] = True
+            if new_closed.any():
+                try: f.append(_take(cols, new_closed)); new_closed[:] = False
+                except Exception as e: logger.warning("kline append failed {}: {}", symbol, e)
+            keep |= new_closed  # 落盘失败时直接拼接本次数据
+            if full:
+                # 整段拉取的窗口本身就是 bnz.klines(limit) 的结果；文件可能比它短（只追加了更新的 bar）
+                return {c: np.array(cols[c][-limit:]) for c in KLINE_COLS}
+            k = int(keep.sum())
+            out = f.tail(max(0, limit-k))
+            if k:
+                out = {c: np.concatenate([out[c], cols[c][keep]])[-limit:] for c in KLINE_COLS}
+            return out
+
+    def _catch_up(self, bnz, f: ColumnFile, symbol, interval, step, last_ot, now_ms):
+        # 每页 MAX_FETCH 根已收盘 bar，直到剩余缺口一次增量即可取完；返回新的 (last_ot, missing)
+        missing = (now_ms - last_ot)//step
+        while missing+1 > MAX_FETCH:
+            raw = bnz.klines(symbol=symbol, interval=interval, limit=MAX_FETCH, start_time=last_ot+step)
+            cols = decode_klines(raw)
+            cols = _take(cols, (cols["close_time"] < now_ms) & (cols["open_time"] > last_ot))
+            if len(cols["open_time"]) == 0: break
+            try: f.append(cols)
+            except Exception as e:
+                logger.warning("kline append failed {}: {}", symbol, e); break
+            self._count("incr", len(raw))
+            last_ot = f.last_open_time(); missing = (now_ms - last_ot)//step
+        return last_ot, missing
+
+    def backfill(self, bnz, symbol: str, interval: str = "1h", bars: int = 3000) -> int:
+        """向前分页补历史，直到本地至少 bars 根或交易所没有更早数据；返回新增根数（回测 / 导入用）。"""
+        key = (symbol, interval); added = 0
+        if len(self._file(key)) == 0: self.get(bnz, symbol, interval, min(int(bars), MAX_FETCH))
+        with self._lock(key):
+            f = self._file(key)
+            while len(f) < bars and f.first_open_time() is not None:
+                raw = bnz.klines(symbol=symbol, interval=interval, limit=min(MAX_FETCH, int(bars)-len(f)),
+                                 end_time=f.first_open_time()-1)
+                cols = decode_klines(raw)
+                cols = _take(cols, cols["open_time"] < f.first_open_time())
+                if len(cols["open_time"]) == 0: break      # 已到上市第一根
+                f.prepend(cols); added += len(cols["open_time"]); self._count("warm", len(raw))
+        return added
+
+    def is_warm(self, symbol: str, interval: str = "1h", limit: int = 200) -> bool:
+        """本地文件够长且够新：下一次 get() 一次增量即可（停机过久要分页补齐的不算）。"""
+        key = (symbol, interval); step = INTERVAL_MS.get(interval)
+        with self._lock(key), self._file(key).locked() as f:
+            last_ot = f.last_open_time(); n = len(f)
+        if last_ot is None or not step or n < limit-1: return False
+        return (int(time.time()*1000) - last_ot)//step + 1 <= MAX_FETCH
+
+    def reset_stats(self) -> dict:
+        with self._glock:
+            out = dict(self.stats); self.stats = {k: 0 for k in self.stats}
+        return out
+
+STORE = KlineStore()
+
+def main(argv=None):
+    # 回测需要的长历史：python -m ats.klines backfill --interval 1h --bars 3000 [--symbols A,B]（默认本地已有的全部币）
+    # 可与扫描主循环同时跑：每页 prepend 持有该币的文件锁（ColumnFile.locked），主循环下次 get() 拿锁时重新映射新文件；
+    # 拉取交易所数据时不持锁，主循环最多等一次文件重写
+    import argparse
+    from concurrent.futures import ThreadPoolExecutor
+    from .binance import BinanceFutures
+    ap = argparse.ArgumentParser(prog="python -m ats.klines")
+    ap.add_argument("cmd", choices=["backfill"]); ap.add_argument("--interval", default="1h")
+    ap.add_argument("--bars", type=int, default=3000); ap.add_argument("--symbols", default="")
+    ap.add_argument("--root", default=KLINE_DIR); ap.add_argument("--workers", type=int, default=4)
+    a = ap.parse_args(argv)
+    syms = [s for s in a.symbols.split(",") if s] or sorted(p.stem for p in (Path(a.root)/a.interval).glob("*.kcol"))
+    bnz, st = BinanceFutures(), KlineStore(a.root)
+    def _one(sym):
+        try: return sym, st.backfill(bnz, sym, a.interval, a.bars)
+        except Exception as e:
+            logger.warning("backfill {} failed: {}", sym, e); return sym, 0
+    with ThreadPoolExecutor(max_workers=max(1, a.workers)) as ex:
+        for sym, n in ex.map(_one, syms): logger.info("backfill {} {} +{} bars", sym, a.interval, n)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+# 常驻进程（main_loop）的可选指标端点：Prometheus 文本格式，后台线程，无额外依赖。
+#   METRICS_PORT=9108 python -m ats.app      curl -s localhost:9108/metrics
+# 告警示例：ats_scan_headroom_seconds < 600 —— 本轮结束时距下一整点不足 10 分钟，扫描在逼近下一轮
+import os, resource, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from loguru import logger
+from .store import BATCH as DB_BATCH
+from .notifier import stats as notify_stats
+from .tickers import snapshot_stats as tickers_stats
+
+PORT = os.getenv("METRICS_PORT", "")
+HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+
+_LOCK = threading.Lock()
+_M = {"server": None, "client": None, "t0": time.time(), "scans": 0, "failures": 0, "symbols": 0, "last": {},
+      "gates": {}, "http": {}, "klines": {}, "funding": {}, "jobs": {}}
+
+def _add(acc: dict, d: dict):
+    for k, v in (d or {}).items():
+        if isinstance(v, (int, float)) and not isinstance(v, bool): acc[k] = acc.get(k, 0) + v
+
+def observe_scan(rec: dict):
+    """scan_once 每轮结束调用：把单轮报告（instrument 的 JSON 行）累加进进程级计数。"""
+    with _LOCK:
+        _M["scans"] += 1; _M["symbols"] += rec.get("picks", 0); _M["last"][rec.get("job", "scan")] = rec
+        for g, st in (rec.get("gates") or {}).items(): _add(_M["gates"].setdefault(g, {}), st)
+        for p, st in (rec.get("http") or {}).items():
+            acc = _M["http"].setdefault(p, {"n": 0, "err": 0, "sum_ms": 0.0, "le": st["hist"]["le"], "counts": None})
+            acc["n"] += st["n"]; acc["err"] += st["err"]; acc["sum_ms"] += st["hist"]["sum"]
+            acc["counts"] = [a+b for a, b in zip(acc["counts"] or [0]*len(st["hist"]["counts"]), st["hist"]["counts"])]
+        _add(_M["klines"], rec.get("klines")); _add(_M["funding"], rec.get("funding"))
+
+def observe_job(name: str, stats: dict):
+    """调度器每个事件后调用：作业的累计次数与最近一次耗时/迟到。"""
+    with _LOCK: _M["jobs"][name] = dict(stats)
+
+def scan_failed():
+    with _LOCK: _M["failures"] += 1
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f: return int(f.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss*1024   # 非 Linux：退化为峰值
+
+class _Out:
+    def __init__(self): self.lines = []
+    def metric(self, name, kind, help_, samples):
+        self.lines += [f"# HELP {name} {help_}", f"# TYPE {name} {kind}"]
+        for labels, v in samples:
+            lab = "{" + ",".join(f'{k}="{x}"' for k, x in labels.items()) + "}" if labels else ""
+            self.lines.append(f"{name}{lab} {float(v)!r}")
+    def histogram(self, name, help_, series):
+        # series: [(labels, le_ms, counts, sum_ms)]；桶累计、单位秒
+        self.lines += [f"# HELP {name} {help_}", f"# TYPE {name} histogram"]
+        for labels, le, counts, sum_ms in series:
+            lab = ",".join(f'{k}="{x}"' for k, x in labels.items())
+            acc = 0
+            for b, c in zip(le, counts):
+                acc += c; bound = "+Inf" if b == "+Inf" else f"{b/1e3:g}"
+                self.lines.append(f"{name}_bucket{{{lab}{',' if lab else ''}le=\"{bound}\"}} {acc}")
+            self.lines += [f"{name}_sum{{{lab}}} {sum_ms/1e3!r}" if lab else f"{name}_sum {sum_ms/1e3!r}",
+                           f"{name}_count{{{lab}}} {acc}" if lab else f"{name}_count {acc}"]
+
+def render() -> str:
+    o = _Out()
+    with _LOCK:
+        last = dict(_M["last"]); jobs = {k: dict(v) for k, v in _M["jobs"].items()}; gates = {g: dict(s) for g, s in _M["gates"].items()}
+        http = {p: dict(s) for p, s in _M["http"].items()}; kl, fu = dict(_M["klines"]), dict(_M["funding"])
+        scans, failures, symbols = _M["scans"], _M["failures"], _M["symbols"]
+    o.metric("ats_up", "gauge", "进程存活", [({}, 1)])
+    o.metric("ats_uptime_seconds", "gauge", "进程运行时长", [({}, time.time()-_M["t0"])])
+    o.metric("ats_process_resident_memory_bytes", "gauge", "当前 RSS", [({}, _rss_bytes())])
+    o.metric("ats_scans_total", "counter", "完成的扫描轮数", [({}, scans)])
+    o.metric("ats_scan_failures_total", "counter", "抛异常中断的扫描轮数", [({}, failures)])
+    o.metric("ats_symbols_scanned_total", "counter", "累计扫描币数", [({}, symbols)])
+    if last:
+        # 按作业（scan=整点全量，fast=快扫）分别给出上一轮的值
+        wall = {j: float(r.get("wall_sec") or 0.0) for j, r in last.items()}; ts = {j: int(r.get("ts") or 0) for j, r in last.items()}
+        o.metric("ats_last_scan_timestamp_seconds", "gauge", "上一轮开始时间（unix）", [({"job": j}, ts[j]) for j in last])
+        o.metric("ats_last_scan_duration_seconds", "gauge", "上一轮耗时", [({"job": j}, wall[j]) for j in last])
+        o.metric("ats_last_scan_symbols", "gauge", "上一轮扫描币数", [({"job": j}, r.get("picks", 0)) for j, r in last.items()])
+        o.metric("ats_last_scan_plans", "gauge", "上一轮产出计划数", [({"job": j}, r.get("passed", 0)) for j, r in last.items()])
+        o.metric("ats_last_scan_symbols_per_second", "gauge", "上一轮吞吐",
+                 [({"job": j}, r.get("picks", 0)/max(wall[j], 1e-9)) for j, r in last.items()])
+        o.metric("ats_scan_headroom_seconds", "gauge", "上一轮结束距本作业下一触发边界的秒数（越小越接近重叠）",
+                 [({"job": j}, (ts[j]//(p := int(jobs.get(j, {}).get("every") or 3600))+1)*p - (ts[j]+wall[j])) for j in last])
+        o.metric("ats_last_scan_span_seconds", "gauge", "上一轮各阶段累计耗时（并发阶段为各线程之和）",
+                 [({"job": j, "span": k}, v["sec"]) for j, r in last.items() for k, v in (r.get("spans") or {}).items()])
+    if jobs:
+        o.metric("ats_job_events_total", "counter", "调度作业累计：runs/errors/overruns（超过下一触发点）/skipped（错过未补跑）/covered/yielded（让出后续跑）",
+                 [({"job": j, "event": e}, st.get(e, 0)) for j, st in jobs.items()
+                  for e in ("runs", "errors", "overruns", "skipped", "covered", "yielded")])
+        o.metric("ats_job_last_duration_seconds", "gauge", "作业最近一次耗时", [({"job": j}, st.get("last_sec", 0)) for j, st in jobs.items()])
+        o.metric("ats_job_last_late_seconds", "gauge", "作业最近一次相对触发点的迟到", [({"job": j}, st.get("last_late_sec", 0)) for j, st in jobs.items()])
+    o.metric("ats_gate_symbols_total", "counter", "各闸门累计进入/通过/否决/异常币数",
+             [({"gate": g, "result": r}, st.get(k, 0)) for g, st in gates.items()
+              for r, k in (("in", "in"), ("pass", "pass"), ("reject", "reject"), ("error", "err"))])
+    o.metric("ats_http_requests_total", "counter", "Binance 请求数（含失败重试）", [({"path": p}, s["n"]) for p, s in http.items()])
+    o.metric("ats_http_errors_total", "counter", "Binance 非 200/异常次数", [({"path": p}, s["err"]) for p, s in http.items()])
+    o.histogram("ats_http_request_duration_seconds", "Binance 请求延迟",
+                [({"path": p}, s["le"], s["counts"], s["sum_ms"]) for p, s in http.items()])
+    c = _M["client"]
+    if c is not None:
+        w, th = c.limiter.snapshot(), c.throttle_stats()
+        o.metric("ats_weight_used_1m", "gauge", "服务器回报的 1 分钟已用权重", [({}, w["used_1m"])])
+        o.metric("ats_weight_cap_1m", "gauge", "客户端权重预算（上限×安全系数）", [({}, w["cap"])])
+        o.metric("ats_weight_wait_seconds_total", "counter", "令牌桶排队累计秒数", [({}, w["waited_sec"])])
+        o.metric("ats_rate_limited_total", "counter", "收到 429/418 次数", [({"status": "429"}, th["429"]), ({"status": "418"}, th["418"])])
+        o.metric("ats_backoff_sleep_seconds_total", "counter", "限流/错误退避累计秒数", [({}, th["backoff_sec"])])
+    o.metric("ats_kline_fetch_total", "counter", "K 线拉取：warm=整段 incr=增量",
+             [({"kind": k}, kl.get(k, 0)) for k in ("warm", "incr")])
+    o.metric("ats_funding_cache_total", "counter", "资金费率缓存命中/未命中", [({"result": k}, fu.get(k, 0)) for k in ("hit", "miss")])
+    n_kl, n_fu = kl.get("warm", 0)+kl.get("incr", 0), fu.get("hit", 0)+fu.get("miss", 0)
+    o.metric("ats_cache_hit_ratio", "gauge", "累计命中率（K 线=增量占比）",
+             [({"cache": "klines"}, kl.get("incr", 0)/n_kl if n_kl else 0), ({"cache": "funding"}, fu.get("hit", 0)/n_fu if n_fu else 0)])
+    o.metric("ats_tickers_fetches_total", "counter", "24h tickers 实际拉取次数", [({}, tickers_stats()["fetches"])])
+    h = DB_BATCH.hist
+    o.histogram("ats_sqlite_flush_duration_seconds", "每轮攒批写入 SQLite 的事务耗时",
+                [({}, [*h.bounds, "+Inf"], list(h.counts), h.sum)])
+    o.metric("ats_sqlite_rows_written_total", "counter", "攒批写入行数", [({}, DB_BATCH.rows_total)])
+    ns = notify_stats()
+    o.metric("ats_notify_total", "counter", "Telegram 发送/丢弃", [({"result": "sent"}, ns["sent"]), ({"result": "dropped"}, ns["dropped"])])
+    o.metric("ats_notify_queue", "gauge", "Telegram 待发队列长度", [({}, ns["queued"])])
+    return "\n".join(o.lines) + "\n"
+
+def serve(client=None, port: str | int | None = None, host: str = HOST):
+    """METRICS_PORT 未设置则不启动；返回 server（或 None）。"""
+    port = PORT if port is None else port
+    _M["client"] = client
+    if not port or _M["server"] is not None: return _M["server"]
+    class H(BaseHTTPRequestHandler):
+        def log_message(self, *a): pass
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404); return
+            b = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(b))); self.end_headers(); self.wfile.write(b)
+    srv = ThreadingHTTPServer((host, int(port)), H); srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="metrics", daemon=True).start()
+    _M["server"] = srv
+    logger.info("metrics on http://{}:{}/metrics", host, srv.server_address[1])
+    return srv
@@ -1,21 +1,101 @@
-import os, requests
+import os, time, queue, threading, atexit, requests
 from loguru import logger
 
 BOT = os.getenv("TELEGRAM_BOT_TOKEN")
 CHAT = os.getenv("TELEGRAM_CHAT_ID_PRIMARY")
+API = os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org")
+MAX_LEN = 4096                                                     # Telegram 单条上限
+QUEUE_MAX = int(os.getenv("TELEGRAM_QUEUE_MAX", "256"))
+MIN_INTERVAL = float(os.getenv("TELEGRAM_MIN_INTERVAL_SEC", "1.0"))  # 同一会话约 1 条/秒
+ASYNC = os.getenv("TELEGRAM_ASYNC", "1") != "0"
 
-def _post(path, **data):
+_Q: "queue.Queue" = queue.Queue(maxsize=QUEUE_MAX)
+_W = {"thread": None, "session": None, "last": 0.0, "dropped": 0, "sent": 0}
+_LOCK = threading.Lock()
+
+def _session() -> requests.Session:
+    # 单个后台线程发送，一个长连接足够
+    if _W["session"] is None: _W["session"] = requests.Session()
+    return _W["session"]
+
+def _send(data: dict, tries: int = 3):
+    for _ in range(tries):
+        wait = MIN_INTERVAL - (time.monotonic() - _W["last"])
+        if wait > 0: time.sleep(wait)
+        try:
+            r = _session().post(f"{API}/bot{BOT}/sendMessage", data=dict(chat_id=CHAT, **data), timeout=10)
+            _W["last"] = time.monotonic()
+            if r.status_code == 429:
+                # 限流：按返回的 retry_after 等待后重试
+                try: ra = float(r.json().get("parameters", {}).get("retry_after", 1))
+                except Exception: ra = 1.0
+                logger.warning("telegram 429, retry after {}s", ra); time.sleep(ra); continue
+            _W["sent"] += 1
+            return
+        except Exception as e:
+            _W["last"] = time.monotonic()
+            logger.warning(f"telegram send failed: {e}")
+            return
+
+def _chunks(text: str):
+    while len(text) > MAX_LEN:
+        cut = text.rfind("\n", 0, MAX_LEN)
+        cut = cut if cut > 0 else MAX_LEN
+        yield text[:cut]; text = text[cut:].lstrip("\n")
+    if text: yield text
+
+def _worker():
+    while True:
+        item = _Q.get()
+        batch = [item]
+        # 合并队列中已积压的同格式消息（不超过单条上限）
+        while True:
+            try: nxt = _Q.get_nowait()
+            except queue.Empty: break
+            batch.append(nxt)
+        buf, mode = "", None
+        for text, pm in batch:
+            if buf and (pm != mode or len(buf) + 2 + len(text) > MAX_LEN):
+                for part in _chunks(buf): _send(_data(part, mode))
+                buf = ""
+            buf, mode = (buf + "\n\n" + text if buf else text), pm
+        for part in _chunks(buf): _send(_data(part, mode))
+        for _ in batch: _Q.task_done()
+
+def _data(text: str, parse_mode):
+    return dict(text=text, parse_mode=parse_mode) if parse_mode else dict(text=text)
+
+def _enqueue(text: str, parse_mode=None):
     if not BOT or not CHAT:
         logger.warning("TELEGRAM env not set; skip notify.")
         return
+    if not ASYNC:
+        for part in _chunks(text): _send(_data(part, parse_mode))
+        return
+    with _LOCK:
+        if _W["thread"] is None:
+            _W["thread"] = threading.Thread(target=_worker, name="notifier", daemon=True); _W["thread"].start()
     try:
-        requests.post(f"https://api.telegram.org/bot{BOT}{path}",
-                      data=dict(chat_id=CHAT, **data), timeout=10)
-    except Exception as e:
-        logger.warning(f"telegram send failed: {e}")
+        _Q.put_nowait((text, parse_mode))
+    except queue.Full:
+        # 队列满说明 Telegram 长时间不可用：丢弃而不阻塞扫描
+        _W["dropped"] += 1
+        logger.warning("telegram queue full, dropped ({} total)", _W["dropped"])
+
+def flush(timeout: float = 10.0) -> bool:
+    """等待队列发完（最多 timeout 秒）；返回是否已清空。"""
+    if _W["thread"] is None: return True
+    end = time.monotonic() + timeout
+    while _Q.unfinished_tasks and time.monotonic() < end: time.sleep(0.05)
+    return not _Q.unfinished_tasks
+
+atexit.register(flush)
+
+def stats() -> dict:
+    return {"sent": _W["sent"], "dropped": _W["dropped"], "queued": _Q.qsize()}
 
 def send_text(text: str):
-    _post("/sendMessage", text=text, parse_mode="Markdown")
+    _enqueue(text, "Markdown")
 
 def send_text_plain(text: str):
-    _post("/sendMessage", text=text)
+    _enqueue(text)
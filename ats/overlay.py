@@ -1,46 +1,139 @@
 from __future__ import annotations
-import sqlite3, time, math
+# overlay 热度：进程内索引 + 定期落盘到 overlay_queue。
+# heat 只在写入时记下 (heat, ts)，读时按 0.5^((now-ts)/hl) 惰性衰减；
+# 同一半衰期下 log2(heat)+ts/hl 与时间无关，按它排序即按当前热度排序，top-K 无需重算全表。
+import atexit, bisect, sqlite3, threading, time, math
 from typing import Iterable, List
+import numpy as np
+from loguru import logger
+from .tickers import top_k_desc
+from .store import tx
 
-DB = "db/state.db"
 def _now(): return int(time.time())
-def _conn(): return sqlite3.connect(DB)
-
-def decay(half_life_hours: float = 2.0) -> None:
-    now = _now()
-    hl = max(0.1, float(half_life_hours)) * 3600.0
-    with _conn() as c:
-        for sym,heat,ts in c.execute("SELECT symbol,heat,ts FROM overlay_queue"):
-            dt = max(0, now - int(ts or now))
-            factor = math.pow(0.5, dt/hl)
-            new_heat = float(heat or 0.0)*factor
-            c.execute("UPDATE overlay_queue SET heat=?, ts=? WHERE symbol=?",(new_heat, now, sym))
-        c.commit()
+
+def _key(heat: float, ts: int, hl: float) -> float:
+    return (math.log2(heat) if heat > 0 else -math.inf) + ts/hl
+
+class OverlayIndex:
+    def __init__(self, half_life_hours: float = 2.0):
+        self.hl = max(0.1, float(half_life_hours))*3600.0
+        self.rows: dict[str, list] = {}      # symbol -> [heat, ts, last_touch_ts]
+        self._idx: list = []                 # 按 (-key, symbol) 升序 = 当前热度降序
+        self._dirty: set = set(); self._gone: set = set()
+        self._lock = threading.RLock()
+        self.loaded = False; self.last_flush = time.time()
+
+    def _heat(self, sym: str, now: int) -> float:
+        h, ts, _ = self.rows[sym]
+        return h*math.pow(0.5, max(0, now-ts)/self.hl)
+
+    def _put(self, sym: str, heat: float, ts: int, touch: int):
+        old = self.rows.get(sym)
+        if old is not None:
+            del self._idx[bisect.bisect_left(self._idx, (-_key(old[0], old[1], self.hl), sym))]
+        self.rows[sym] = [heat, ts, touch]
+        bisect.insort(self._idx, (-_key(heat, ts, self.hl), sym))
+        self._dirty.add(sym); self._gone.discard(sym)
+
+    def _drop(self, sym: str):
+        h, ts, _ = self.rows.pop(sym)
+        del self._idx[bisect.bisect_left(self._idx, (-_key(h, ts, self.hl), sym))]
+        self._dirty.discard(sym); self._gone.add(sym)
+
+    def load(self):
+        with self._lock:
+            now = _now()
+            try:
+                with tx() as c:
+                    rows = c.execute("SELECT symbol, heat, ts, last_touch_ts FROM overlay_queue").fetchall()
+            except sqlite3.OperationalError as e:
+                logger.warning("overlay load failed: {}", e); rows = []
+            self.rows = {s: [float(h or 0.0), int(ts or now), int(lt or now)] for s, h, ts, lt in rows}
+            self._idx = sorted((-_key(h, ts, self.hl), s) for s, (h, ts, _) in self.rows.items())
+            self._dirty.clear(); self._gone.clear(); self.loaded = True
+
+    def _ensure(self):
+        if not self.loaded: self.load()
+
+    def set_half_life(self, half_life_hours: float):
+        hl = max(0.1, float(half_life_hours))*3600.0
+        with self._lock:
+            self._ensure()
+            if hl == self.hl: return
+            # 半衰期变化：先按旧 hl 结算到当前，再用新 hl 重建排序键
+            now = _now()
+            self.rows = {s: [self._heat(s, now), now, r[2]] for s, r in self.rows.items()}
+            self.hl = hl
+            self._idx = sorted((-_key(h, ts, hl), s) for s, (h, ts, _) in self.rows.items())
+            self._dirty.update(self.rows)
+
+    def prune(self, below: float) -> int:
+        # 热度最低的在索引尾部，从尾部删到不满足为止
+        with self._lock:
+            self._ensure(); now = _now(); n = 0
+            while self._idx and self._heat(self._idx[-1][1], now) < below:
+                self._drop(self._idx[-1][1]); n += 1
+            return n
+
+    def bump(self, symbols: Iterable[str], weight: float = 1.0):
+        with self._lock:
+            self._ensure(); now = _now()
+            for s in symbols:
+                h = self._heat(s, now) if s in self.rows else 0.0
+                self._put(s, h + float(weight), now, now)
+
+    def top(self, limit: int, min_heat: float) -> List[str]:
+        with self._lock:
+            self._ensure(); now = _now(); out = []
+            for _, s in self._idx:
+                if len(out) >= limit or not self._heat(s, now) > min_heat: break
+                out.append(s)
+            return out
+
+    def flush(self) -> int:
+        with self._lock:
+            if not self.loaded or not (self._dirty or self._gone):
+                self.last_flush = time.time(); return 0
+            up = [(s, *self.rows[s]) for s in self._dirty]; gone = [(s,) for s in self._gone]
+            with tx() as c:
+                c.executemany("""
+                INSERT INTO overlay_queue(symbol, heat, ts, last_touch_ts) VALUES (?, ?, ?, ?)
+                ON CONFLICT(symbol) DO UPDATE SET heat=excluded.heat, ts=excluded.ts, last_touch_ts=excluded.last_touch_ts
+                """, up)
+                c.executemany("DELETE FROM overlay_queue WHERE symbol=?", gone)
+            self._dirty.clear(); self._gone.clear(); self.last_flush = time.time()
+            return len(up) + len(gone)
+
+    def maybe_flush(self, every_sec: float) -> int:
+        return self.flush() if time.time() - self.last_flush >= float(every_sec) else 0
+
+INDEX = OverlayIndex()
+
+@atexit.register
+def _flush_at_exit():
+    try: INDEX.flush()
+    except Exception as e: logger.warning("overlay flush at exit failed: {}", e)
+
+def decay(half_life_hours: float = 2.0, prune_below: float = 0.0) -> int:
+    """衰减是惰性的：这里只同步半衰期，并删掉当前 heat 低于 prune_below 的币。返回删除数。"""
+    INDEX.set_half_life(half_life_hours)
+    return INDEX.prune(float(prune_below)) if prune_below > 0 else 0
+
+def set_half_life(half_life_hours: float) -> None:
+    """进程启动时按 sampling.overlay_decay_hours 设好半衰期：快扫的 top() 可能先于第一次 decay() 运行。"""
+    INDEX.set_half_life(half_life_hours)
 
 def bump(symbols: Iterable[str], weight: float = 1.0) -> None:
-    now = _now()
     syms = [s for s in symbols if s and s.endswith("USDT")]
-    if not syms: return
-    with _conn() as c:
-        for s in syms:
-            c.execute("""
-            INSERT INTO overlay_queue(symbol, ts, heat, last_touch_ts)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(symbol) DO UPDATE SET
-              heat = overlay_queue.heat + excluded.heat,
-              last_touch_ts = excluded.last_touch_ts
-            """,(s, now, float(weight), now))
-        c.commit()
+    if syms: INDEX.bump(syms, weight)
 
 def top(limit: int = 18, min_heat: float = 0.01) -> List[str]:
-    with _conn() as c:
-        cur = c.execute("SELECT symbol FROM overlay_queue WHERE heat>? ORDER BY heat DESC LIMIT ?",(float(min_heat), int(limit)))
-        return [r[0] for r in cur.fetchall()]
-
-def update_from_t24(t24: list, k: int = 30) -> None:
-    try:
-        sorted_items = sorted(t24, key=lambda x: abs(float((x.get("priceChangePercent") or "0").replace("%",""))), reverse=True)[: int(k)]
-        syms = [it.get("symbol") for it in sorted_items if it.get("symbol","").endswith("USDT")]
-        bump(syms, weight=1.0)
-    except Exception:
-        pass
+    return INDEX.top(int(limit), float(min_heat))
+
+def flush(every_sec: float = 0.0) -> int:
+    return INDEX.maybe_flush(every_sec)
+
+def update_from_t24(snap, k: int = 30) -> None:
+    """snap: tickers.TickerSnapshot；按 |24h 涨跌幅| 取前 k 个加热（非 USDT 的占位但不加热）。"""
+    top = top_k_desc((np.nan_to_num(np.abs(snap.pcp), nan=0.0),), k)
+    bump(snap.sym[top][snap.quote_mask()[top]].tolist(), weight=1.0)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+# 面板指标引擎：输入对齐的 (symbols × bars) 数组，一次向量化算完整个池子。
+# 各函数与 indicators.py 的 pandas 版本同口径（NaN 规则、min_periods、ewm adjust=False），
+# 返回完整 2-D 结果，last 值取最后一列。
+import numpy as np, pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from pandas.api.indexers import BaseIndexer
+
+def _shift1(x: np.ndarray) -> np.ndarray:
+    out = np.empty_like(x); out[:, 0] = np.nan; out[:, 1:] = x[:, :-1]
+    return out
+
+def _rolling(x: np.ndarray, n: int, fn) -> np.ndarray:
+    out = np.full(x.shape, np.nan)
+    if x.shape[1] >= n:
+        out[:, n-1:] = fn(sliding_window_view(x, n, axis=1), axis=-1)
+    return out
+
+class _RowWindows(BaseIndexer):
+    # 展平的 (S×T) 上每行独立的尾随窗口；行首窗口的 start 等于上一窗口的 end，pandas 内核在此重置累加状态
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values+1, dtype=np.int64)
+        return (end - 1 - np.minimum(np.arange(num_values) % self.T, self.window_size-1)).astype(np.int64), end
+
+def _pd_rolling(x: np.ndarray, n: int, how: str) -> np.ndarray:
+    # 和/均值走 pandas 的滚动内核（增量补偿求和），与 indicators.py 逐位一致（逐窗 np.sum 会在末位不同）；整池一次调用
+    r = pd.Series(x.ravel()).rolling(_RowWindows(window_size=n, T=x.shape[1]), min_periods=n)
+    return getattr(r, how)().to_numpy().reshape(x.shape)
+
+def rolling_mean(x, n): return _pd_rolling(x, n, "mean")
+def rolling_sum(x, n):  return _pd_rolling(x, n, "sum")
+def rolling_max(x, n):  return _rolling(x, n, np.max)
+def rolling_min(x, n):  return _rolling(x, n, np.min)
+
+def ema(x: np.ndarray, n: int) -> np.ndarray:
+    # 复刻 pandas ewm(span=n, adjust=False, min_periods=n)：逐 bar 递推，但每步对全部币向量化
+    alpha = 1.0/(1.0 + (n-1)/2.0)
+    out = np.full(x.shape, np.nan)
+    w = np.full(x.shape[0], np.nan); cnt = np.zeros(x.shape[0]); old = np.ones(x.shape[0])
+    for t in range(x.shape[1]):
+        cur = x[:, t]; obs = ~np.isnan(cur); has = ~np.isnan(w)
+        old = np.where(has, old*(1.0-alpha), old)  # ignore_na=False：缺失值也让旧权重衰减
+        upd = np.where(w != cur, (old*w + alpha*cur)/(old+alpha), w)
+        w = np.where(obs, np.where(has, upd, cur), w)
+        old = np.where(obs & has, 1.0, old)
+        cnt += obs
+        out[:, t] = np.where(cnt >= n, w, np.nan)
+    return out
+
+def true_range(h, l, c) -> np.ndarray:
+    pc = _shift1(c)
+    return np.maximum(h-l, np.maximum(np.abs(h-pc), np.abs(l-pc)))
+
+def atr(h, l, c, n=14) -> np.ndarray:
+    return rolling_mean(true_range(h, l, c), n)
+
+def chop(h, l, c, n=14) -> np.ndarray:
+    tr = true_range(h, l, c)
+    s = rolling_sum(tr, n); s[s == 0] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        num = np.log10((rolling_max(h, n)-rolling_min(l, n))/s)
+    num[np.isinf(num)] = np.nan
+    return 100*num
+
+def pct_change(c) -> np.ndarray:
+    return c/_shift1(c) - 1
+
+def cvd_proxy(c, v, n=50) -> np.ndarray:
+    ret = np.nan_to_num(pct_change(c), nan=0.0, posinf=np.inf, neginf=-np.inf)
+    return rolling_sum(np.sign(ret)*v, n)
+
+def tib_abs(o, h, l, c, n=20) -> np.ndarray:
+    return rolling_mean(np.abs(c-o)/(atr(h, l, c, 14)+1e-12), n)
+
+def vboost(v, n=20) -> np.ndarray:
+    return v/(rolling_mean(v, n)+1e-9)
+
+def bfill(x: np.ndarray) -> np.ndarray:
+    # 按行向后填充（pandas Series.bfill）
+    idx = np.where(~np.isnan(x), np.arange(x.shape[1]), x.shape[1]-1)
+    idx = np.minimum.accumulate(idx[:, ::-1], axis=1)[:, ::-1]
+    return np.take_along_axis(x, idx, axis=1)
+
+def zigzag(h, l, c, atr_mult=0.5) -> np.ndarray:
+    # 与 indicators.zigzag 同一状态机，逐 bar 推进、跨币向量化
+    tr = bfill(atr(h, l, c, 14)); S, T = c.shape
+    piv = np.zeros((S, T), dtype=int)
+    last_p = c[:, 0].copy(); last_dir = np.zeros(S, dtype=int)
+    for t in range(T):
+        ct, m = c[:, t], atr_mult*tr[:, t]
+        up = (last_dir <= 0) & (ct > last_p + m)
+        dn = ~up & (last_dir >= 0) & (ct < last_p - m)
+        piv[up, t] = 1; piv[dn, t] = -1
+        last_dir = np.where(up, 1, np.where(dn, -1, last_dir))
+        last_p = np.where(up | dn, ct, last_p)
+    return piv
+
+def ema_slope_r2(c, n=30, win=30):
+    # 最后 win 个 EMA 值的最小二乘斜率（相对均值）与 R²。拟合仍逐币用同一个 lstsq：闭式解末位不同，
+    # 阈值附近会翻转闸门，且明细要落库（scan_evals）；只有 win 个点，逐币调用的开销可忽略
+    y = ema(c, n)[:, -win:]
+    if y.shape[1] < win:
+        z = np.zeros(c.shape[0]); return z, z.copy()
+    x = np.arange(win); A = np.vstack([x, np.ones_like(x)]).T
+    mb = np.array([np.linalg.lstsq(A, row, rcond=None)[0] for row in y]).reshape(-1, 2)
+    m, b = mb[:, 0], mb[:, 1]
+    ss_res = ((y-(m[:, None]*x+b[:, None]))**2).sum(axis=1)
+    ss_tot = ((y-y.mean(axis=1, keepdims=True))**2).sum(axis=1) + 1e-12
+    return m/(y.mean(axis=1)+1e-9), 1 - ss_res/ss_tot
+
+def rolling_slope_r2(y: np.ndarray, win=30):
+    # 每个 bar 上最后 win 个值的 ema_slope_r2（逐 bar 版，前 win-1 列为 NaN）；逐窗闭式解
+    slope = np.full(y.shape, np.nan); r2 = np.full(y.shape, np.nan)
+    if y.shape[1] < win: return slope, r2
+    w = sliding_window_view(y, win, axis=1)
+    x = np.arange(win, dtype=float); xm = x.mean(); sxx = ((x-xm)**2).sum()
+    ym = w.mean(axis=-1)
+    m = ((w-ym[..., None])*(x-xm)).sum(axis=-1)/sxx
+    b = ym - m*xm
+    ss_res = ((w-(m[..., None]*x+b[..., None]))**2).sum(axis=-1)
+    ss_tot = ((w-ym[..., None])**2).sum(axis=-1) + 1e-12
+    slope[:, win-1:] = m/(ym+1e-9); r2[:, win-1:] = 1 - ss_res/ss_tot
+    return slope, r2
+
+# 与内置 min/max 相同的 NaN 规则：min(a, x) 仅在 x<a 时取 x
+def _pymin(a, x): return np.where(x < a, x, a)
+def _pymax(a, x): return np.where(x > a, x, a)
+
+def stack(dfs: list, cols=("open","high","low","close","volume")) -> dict:
+    """同长度 DataFrame 列表 → {col: (S,T) float64}。"""
+    return {c: np.vstack([df[c].to_numpy(np.float64) for df in dfs]) for c in cols}
+
+def score_panel(p: dict, params: dict):
+    """scoring.score_symbol 的面板版：返回 totals (S,) 与 detail 列数组。"""
+    o, h, l, c, v = p["open"], p["high"], p["low"], p["close"], p["volume"]
+    th = params["thresholds"]
+    slope, r2 = ema_slope_r2(c, n=30, win=30)
+    zz = zigzag(h, l, c, atr_mult=float(th["struct"]["zigzag_min_atr"]["base"]))[:, -40:]
+    piv = (zz == 1).sum(axis=1) - (zz == -1).sum(axis=1)
+    detail = {"ema30_slope": slope, "r2": r2, "chop": chop(h, l, c)[:, -1], "piv_bias": piv,
+              "cvd": cvd_proxy(c, v)[:, -1], "tib": tib_abs(o, h, l, c)[:, -1], "vboost": vboost(v)[:, -1]}
+    return score_terms(detail, rolling_mean(v, 20)[:, -1], params), detail
+
+def score_terms(d: dict, vma, params: dict):
+    """由指标值算总分（score_symbol 同口径）；d 的各值可为任意同形数组（每币最后一根或逐 bar）。"""
+    th = params["thresholds"]
+    # 趋势
+    t = np.where(d["ema30_slope"] >= float(th["trend"]["ema30_slope_min"]), 60, 0) + _pymax(0, _pymin(40, d["r2"]*40))
+    # 结构
+    ch, piv = d["chop"], d["piv_bias"]
+    s = _pymax(0, 30 - _pymin(15, np.abs(ch-50)/50*15) + _pymin(15, np.maximum(0, piv)/10*15))
+    # 量能
+    tv = th["volume"]
+    vs = (np.where(d["vboost"] >= float(tv["vboost_min"]["base"]), 12, 0)
+          + np.where(np.abs(d["cvd"]) >= vma*float(abs(tv["cvd_mix_pct"]["long"])), 9, 0)
+          + np.where(d["tib"] >= float(tv["tib_abs_min"]["base"]), 9, 0))
+    return np.round(t*0.4 + s*0.3 + vs*0.3)
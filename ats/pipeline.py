@@ -0,0 +1,79 @@
+from __future__ import annotations
+# 声明式闸门流水线：每个阶段带代价估计，便宜的否决者先跑；
+# 逐阶段对仍存活的币执行（批量阶段一次处理全部存活者），记录通过/否决次数与耗时。
+import time
+from dataclasses import dataclass
+from typing import Callable
+from loguru import logger
+
+@dataclass
+class Stage:
+    name: str
+    cost: float                      # 相对代价（单币）；决定执行顺序
+    fn: Callable                     # 单币：fn(ctx)->bool；批量：fn(list[ctx])->list[bool]
+    batch: bool = False
+    io: bool = False                 # 含网络请求：交给并发 map 执行
+    after: tuple = ()                # 依赖的阶段名（必须排在其后）
+
+@dataclass
+class StageStats:
+    n_in: int = 0
+    passed: int = 0
+    rejected: int = 0
+    errors: int = 0
+    sec: float = 0.0
+
+class Pipeline:
+    def __init__(self, stages: list[Stage]):
+        self.stages = self._order(stages)
+        self.stats: dict[str, StageStats] = {s.name: StageStats() for s in self.stages}
+
+    @staticmethod
+    def _order(stages: list[Stage]) -> list[Stage]:
+        # 按代价升序（同代价保持声明顺序），并满足 after 依赖
+        pending = sorted(stages, key=lambda s: s.cost)
+        out, done = [], set()
+        while pending:
+            for i, s in enumerate(pending):
+                if all(d in done for d in s.after):
+                    out.append(s); done.add(s.name); pending.pop(i); break
+            else:
+                raise ValueError(f"unresolvable stage deps: {[s.name for s in pending]}")
+        return out
+
+    def run(self, ctxs: list[dict], pmap=None) -> list[dict]:
+        """ctx 需含 "sym"；被否决的写入 ctx["rejected_by"]，异常写入 ctx["error"]。返回全部通过者（原顺序）。"""
+        pmap = pmap or (lambda fn, items: list(map(fn, items)))
+        alive = list(ctxs)
+        for st in self.stages:
+            if not alive: break
+            ss = self.stats[st.name]; ss.n_in += len(alive)
+            t0 = time.perf_counter()
+            if st.batch:
+                try: oks = list(st.fn(alive))
+                except Exception as e:
+                    logger.exception(e); oks = [e]*len(alive)
+            else:
+                def _one(ctx, fn=st.fn):
+                    try: return bool(fn(ctx))
+                    except Exception as e:
+                        logger.exception(e); return e
+                oks = pmap(_one, alive) if st.io else [_one(c) for c in alive]
+            ss.sec += time.perf_counter()-t0
+            nxt = []
+            for ctx, ok in zip(alive, oks):
+                if isinstance(ok, Exception):
+                    ctx["error"] = (repr(ok) or "err")[:240]; ss.errors += 1
+                elif ok:
+                    nxt.append(ctx); ss.passed += 1
+                else:
+                    ctx["rejected_by"] = st.name; ss.rejected += 1
+            alive = nxt
+        return alive
+
+    def summary(self) -> dict:
+        return {k: {"in": v.n_in, "pass": v.passed, "reject": v.rejected, "err": v.errors, "sec": round(v.sec, 3)}
+                for k, v in self.stats.items()}
+
+    def line(self) -> str:
+        return " ".join(f"{k}:{v.n_in}→{v.passed}({v.sec:.2f}s)" for k, v in self.stats.items())
@@ -1,5 +1,5 @@
 from __future__ import annotations
-import numpy as np, pandas as pd
+import pandas as pd
 from .indicators import atr
 
 def make_plan(df: pd.DataFrame, side: str, params: dict):
@@ -1,5 +1,4 @@
 from __future__ import annotations
-from .store import conn
 from loguru import logger
 
 def switches():
@@ -1,8 +1,17 @@
 from __future__ import annotations
+import json, numbers, time
 from loguru import logger
+from .store import BATCH, INSERT_PLAN
+from .risk import switches
 
-def on_plan(symbol: str, plan: dict, ctx: dict):
+def on_plan(symbol: str, plan: dict, ctx: dict, ts: int | None = None, side: str = "LONG"):
     logger.info("on_plan {} {}", symbol, plan)
+    # 进批量写队列，扫描结束统一落库
+    gates = json.dumps({k: round(float(v), 6) for k, v in ctx.items() if isinstance(v, numbers.Real)}, separators=(",",":"))
+    BATCH.add(INSERT_PLAN, (int(ts or time.time()), symbol, side,
+                            *(float(plan[k]) for k in ("l1","l2","l3","w1","w2","w3","sl","tp1","tp2")),
+                            float(plan["l1"]-plan["sl"]), float(plan["costR"]), float(plan["room"]),
+                            gates, "dry" if switches()["dry"] else "live"))
 
 def place_orders(bnz, symbol: str, plan: dict, maker_only=True, dry=True):
     logger.info("place_orders {} (dry={})", symbol, dry)
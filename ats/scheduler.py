@@ -0,0 +1,138 @@
+from __future__ import annotations
+# 多周期调度：作业按 UTC 周期边界 + 偏移触发（可为负：边界之前），单线程逐个执行——扫描永不叠跑。
+# 错过触发点：晚于 max_late_frac×周期 以内立即补跑，否则跳过到下一个边界；两种情况都计数并回调 on_event。
+# 最高优先级作业连续超时时，先让等得更久的低优先级作业各跑一次；长作业（预取）可在更高优先级作业到期时返回 YIELD 让出。
+import threading, time
+from dataclasses import dataclass, field
+from typing import Callable
+from loguru import logger
+from .klines import INTERVAL_MS
+
+YIELD = object()   # 作业 fn 返回它表示被更高优先级作业打断：让它先跑，随后接着跑
+
+def parse_every(v) -> float:
+    """'15m' / '1h' / '1d' / 秒数 → 秒。"""
+    if isinstance(v, (int, float)): return float(v)
+    v = str(v).strip()
+    if v in INTERVAL_MS: return INTERVAL_MS[v]/1000.0
+    return float(v)
+
+@dataclass
+class Job:
+    name: str
+    every: float                     # 周期（秒），边界按 UTC 纪元对齐
+    fn: Callable[[], object]
+    offset: float = 0.0              # 相对边界的偏移（秒）
+    priority: int = 0                # 同时到期时大者先跑
+    covers: tuple = ()               # 与这些作业同一时刻到期时由本作业代劳（它们本次不跑）
+    max_late_frac: float = 0.5
+    next_due: float = 0.0
+    resumed: bool = False            # 上次让出后待续跑：不受迟到跳过规则约束
+    stats: dict = field(default_factory=lambda: {"runs": 0, "errors": 0, "overruns": 0, "skipped": 0, "covered": 0, "yielded": 0,
+                                                 "last_sec": 0.0, "last_late_sec": 0.0, "last_end": 0.0})
+
+    def due_after(self, t: float) -> float:
+        # 严格晚于 t 的第一个触发点
+        k = (t - self.offset)//self.every + 1
+        return k*self.every + self.offset
+
+class Scheduler:
+    def __init__(self, jobs: list[Job], on_event: Callable | None = None, clock=time.time):
+        self.jobs, self.clock = list(jobs), clock
+        self.on_event = on_event or (lambda job, kind, info: None)
+        self.stop = threading.Event()
+        now = clock()
+        for j in self.jobs: j.next_due = j.due_after(now)
+
+    def next_due(self) -> tuple[float, str] | None:
+        """最近的 (触发时间, 作业名)；供预取计算截止时间。"""
+        return min(((j.next_due, j.name) for j in self.jobs), default=None)
+
+    def due_of(self, name: str) -> float | None:
+        return next((j.next_due for j in self.jobs if j.name == name), None)
+
+    def yield_at(self, name: str) -> float:
+        """优先级高于 name 的作业里最近的触发点：name 跑到这一刻应让出。"""
+        p = next(j.priority for j in self.jobs if j.name == name)
+        return min((j.next_due for j in self.jobs if j.priority > p), default=float("inf"))
+
+    def _event(self, job: Job, kind: str, **info):
+        try: self.on_event(job, kind, info)
+        except Exception as e: logger.warning("scheduler on_event failed: {}", e)
+
+    def run_pending(self) -> Job | None:
+        """执行一个到期作业（按优先级，最高者连续超时时先让等得更久的）；没有到期的返回 None。"""
+        now = self.clock()
+        due = [j for j in self.jobs if j.next_due <= now]
+        if not due: return None
+        job = max(due, key=lambda j: (j.priority, -j.next_due))
+        starved = [j for j in due if j.next_due < job.next_due] if job.next_due < job.stats["last_end"] else []
+        if starved:
+            # 最高优先级作业在连续超时（触发点在它上一轮结束前就已过）：先让比它等得更久的作业跑一次，否则它们永远轮不到
+            job = min(starved, key=lambda j: j.next_due)
+        owed = bool(starved) or job.resumed
+        for other in due:
+            if other is not job and other.name in job.covers and other.next_due == job.next_due:
+                other.stats["covered"] += 1; other.next_due = other.due_after(now)
+        late = now - job.next_due
+        if late > job.max_late_frac*job.every and not owed:
+            # 错过太久（上一作业超时 / 进程挂起）：不补跑，直接对齐到下一个边界
+            missed = int(late//job.every) + 1
+            job.stats["skipped"] += missed; job.next_due = job.due_after(now)
+            logger.warning("job {} skipped {} run(s), {:.0f}s late", job.name, missed, late)
+            self._event(job, "skipped", missed=missed, late_sec=late)
+            return job
+        if late > 1.0: logger.info("job {} starting {:.0f}s late", job.name, late)
+        nxt = job.due_after(job.next_due)
+        if owed:
+            # 补跑这一次，跑完对齐到其后的第一个边界；错过的边界记为跳过（起因的超时已单独告警，这里不再逐次推送）
+            missed = int(late//job.every) if starved else 0
+            if missed: job.stats["skipped"] += missed; logger.warning("job {} starved, running once {:.0f}s late", job.name, late)
+            nxt = job.due_after(now)
+        t0 = self.clock(); ret = None
+        try:
+            ret = job.fn()
+        except Exception as e:
+            job.stats["errors"] += 1
+            logger.exception(e)
+            self._event(job, "error", error=e)
+        end = self.clock(); sec = end - t0
+        job.stats.update(runs=job.stats["runs"]+1, last_sec=sec, last_late_sec=late, last_end=end)
+        if ret is YIELD and end < nxt:
+            job.stats["yielded"] += 1; job.next_due, job.resumed = end, True
+            logger.info("job {} yielded after {:.0f}s", job.name, sec)
+            self._event(job, "yielded", sec=sec)
+            return job
+        if owed: nxt = job.due_after(end)
+        job.next_due, job.resumed = nxt, False
+        if end > nxt:
+            # 跑过了自己的下一个触发点：记一次超时，下一轮由上面的补跑/跳过规则处理
+            job.stats["overruns"] += 1
+            logger.warning("job {} overran: {:.0f}s > period {:.0f}s", job.name, sec, job.every)
+            self._event(job, "overrun", sec=sec, over_sec=end-nxt)
+        self._event(job, "done", sec=sec, late_sec=late)
+        return job
+
+    def run_forever(self):
+        while not self.stop.is_set():
+            if self.run_pending() is not None: continue
+            nd = self.next_due()
+            if nd is None: return
+            wait = nd[0] - self.clock()
+            if wait > 0:
+                logger.debug("next {} in {:.0f}s", nd[1], wait)
+                self.stop.wait(min(wait, 60.0))
+
+def spread_batches(items: list, run_batch: Callable[[list], object], deadline: float, yield_at: Callable[[], float] | None = None,
+                   stop: threading.Event | None = None, clock=time.time, sleep=time.sleep) -> tuple[int, bool]:
+    """把 items 约每 30 秒一批均匀摊到 deadline 之前；yield_at() 到点（更高优先级作业到期）即停下。→ (已处理数, 是否让出)"""
+    t0 = clock(); span = max(0.0, deadline - t0)
+    slots = max(1, min(len(items), int(span//30)))
+    per = -(-len(items)//slots) if items else 0; done = 0
+    for i in range(slots):
+        if not items or clock() >= deadline or (stop is not None and stop.is_set()): break
+        if yield_at is not None and clock() >= yield_at(): return done, True
+        batch = items[i*per:(i+1)*per]; run_batch(batch); done += len(batch)
+        wake = min(deadline, t0 + (i+1)*span/slots, yield_at() if yield_at is not None else deadline) - clock()
+        if i < slots-1 and wake > 0: (stop.wait if stop is not None else sleep)(wake)
+    return done, done < len(items) and yield_at is not None and deadline > clock() >= yield_at()
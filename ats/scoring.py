@@ -1,6 +1,6 @@
 from __future__ import annotations
-import pandas as pd
-from .indicators import ema_slope_r2, atr, chop, zigzag, cvd_proxy, tib_abs, vboost
+import numpy as np, pandas as pd
+from .indicators import ema_slope_r2, chop, zigzag, cvd_proxy, tib_abs, vboost
 
 def score_trend(df, params):
     slope, r2 = ema_slope_r2(df["close"], n=30, win=30)
@@ -36,6 +36,26 @@ def score_symbol(df: pd.DataFrame, params: dict):
     detail = {**td, **sd, **vd}
     return total, detail
 
+def score_many(dfs: list, params: dict) -> list:
+    """批量评分：同长度的币拼成面板一次算完（panel.score_panel），其余逐个回退 score_symbol。"""
+    from .panel import stack, score_panel
+    out = [None]*len(dfs)
+    groups: dict[int, list] = {}
+    for i, df in enumerate(dfs):
+        groups.setdefault(len(df), []).append(i)
+    for n, idx in groups.items():
+        if len(idx) < 2 or n < 60: continue
+        total, det = score_panel(stack([dfs[i] for i in idx]), params)
+        for j, i in enumerate(idx):
+            if not np.isfinite(total[j]): continue
+            d = {k: (int(v[j]) if k == "piv_bias" else float(v[j])) for k, v in det.items()}
+            out[i] = (int(total[j]), d)
+    for i, df in enumerate(dfs):
+        if out[i] is None:
+            try: out[i] = score_symbol(df, params)
+            except Exception as e: out[i] = e
+    return out
+
 def aplus_pass(ctx: dict, params: dict):
     th = params["thresholds"]["aplus"]
     total = ctx["total"]
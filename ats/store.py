@@ -1,5 +1,7 @@
-import sqlite3, os
+import sqlite3, os, time, threading, atexit
+from contextlib import contextmanager
 from loguru import logger
+from .instrument import Histogram
 os.makedirs("db", exist_ok=True)
 DB_PATH = "db/state.db"
 
@@ -25,12 +27,97 @@ CREATE TABLE IF NOT EXISTS plans(
   sl REAL, tp1 REAL, tp2 REAL, R REAL, costR REAL, room REAL,
   gates TEXT, mode TEXT
 );
+CREATE INDEX IF NOT EXISTS idx_plans_ts_symbol ON plans(ts, symbol);
+CREATE INDEX IF NOT EXISTS idx_plans_symbol_ts ON plans(symbol, ts);
+CREATE TABLE IF NOT EXISTS scan_evals(
+  ts INTEGER NOT NULL, symbol TEXT NOT NULL,
+  passed INTEGER NOT NULL, rejected_by TEXT, error TEXT,
+  total REAL, ema30_slope REAL, r2 REAL, chop REAL, piv_bias REAL, cvd REAL, tib REAL, vboost REAL,
+  funding_pctl REAL, speed_pctl REAL, z_abs REAL,
+  spread_bps REAL, impact_bps REAL, obi_abs REAL, room REAL, costR REAL
+);
+CREATE INDEX IF NOT EXISTS idx_evals_ts_symbol ON scan_evals(ts, symbol);
+CREATE INDEX IF NOT EXISTS idx_evals_symbol_ts ON scan_evals(symbol, ts);
 """
 
-def conn(): return sqlite3.connect(DB_PATH)
+# 每轮扫描逐币一行：只追加、按列存数值（不存 JSON），按 ts/symbol 两个方向建索引
+EVAL_COLS = ("ts","symbol","passed","rejected_by","error",
+             "total","ema30_slope","r2","chop","piv_bias","cvd","tib","vboost",
+             "funding_pctl","speed_pctl","z_abs","spread_bps","impact_bps","obi_abs","room","costR")
+INSERT_EVAL = f"INSERT INTO scan_evals({','.join(EVAL_COLS)}) VALUES ({','.join('?'*len(EVAL_COLS))})"
+PLAN_COLS = ("ts","symbol","side","l1","l2","l3","w1","w2","w3","sl","tp1","tp2","R","costR","room","gates","mode")
+INSERT_PLAN = f"INSERT INTO plans({','.join(PLAN_COLS)}) VALUES ({','.join('?'*len(PLAN_COLS))})"
+
+# WAL：读写互不阻塞；synchronous=NORMAL 在 WAL 下只在检查点 fsync；cache_size 负数单位 KiB
+PRAGMAS = ("journal_mode=WAL", "synchronous=NORMAL", "cache_size=-16384", "temp_store=MEMORY", "busy_timeout=5000")
+
+_DB = {"conn": None, "path": None, "schema": False}
+_LOCK = threading.RLock()
+
+def conn() -> sqlite3.Connection:
+    """进程内共享的长连接（跨线程使用时经 tx() 加锁）。"""
+    with _LOCK:
+        if _DB["conn"] is None or _DB["path"] != DB_PATH:
+            c = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+            for p in PRAGMAS: c.execute(f"PRAGMA {p}")
+            _DB.update(conn=c, path=DB_PATH, schema=False)
+        return _DB["conn"]
+
+@contextmanager
+def tx():
+    """加锁的单事务：正常退出提交，异常回滚。"""
+    with _LOCK:
+        c = conn()
+        try:
+            yield c
+            c.commit()
+        except BaseException:
+            c.rollback(); raise
 
 def ensure_schema():
-    with conn() as c:
-        c.executescript(DDL)
-        c.commit()
+    # 每个进程（每个库文件）只执行一次
+    with _LOCK:
+        if _DB["schema"] and _DB["path"] == DB_PATH: return
+        with tx() as c:
+            c.executescript(DDL)
+        _DB["schema"] = True
     logger.info("SQLite schema ensured at {}", DB_PATH)
+
+class WriteBatch:
+    """攒批写：扫描过程中 add()，结束时 flush() 一个事务内按语句 executemany。"""
+    def __init__(self):
+        self._rows: dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.hist = Histogram((1, 2, 5, 10, 25, 50, 100, 250, 1000, 5000))  # 每次 flush 的事务耗时（毫秒）
+        self.rows_total = 0
+
+    def add(self, sql: str, row: tuple):
+        with self._lock: self._rows.setdefault(sql, []).append(row)
+
+    def extend(self, sql: str, rows: list):
+        if rows:
+            with self._lock: self._rows.setdefault(sql, []).extend(rows)
+
+    def pending(self) -> int:
+        with self._lock: return sum(map(len, self._rows.values()))
+
+    def flush(self) -> int:
+        with self._lock: rows, self._rows = self._rows, {}
+        if not rows: return 0
+        t = time.perf_counter()
+        with tx() as c:
+            for sql, rs in rows.items(): c.executemany(sql, rs)
+        n = sum(map(len, rows.values()))
+        with self._lock: self.hist.observe((time.perf_counter()-t)*1e3); self.rows_total += n
+        return n
+
+BATCH = WriteBatch()
+
+def close():
+    with _LOCK:
+        if _DB["conn"] is None: return
+        try: BATCH.flush()
+        except Exception as e: logger.warning("store flush at exit failed: {}", e)
+        _DB["conn"].close(); _DB.update(conn=None, schema=False)
+
+atexit.register(close)
@@ -0,0 +1,153 @@
+from __future__ import annotations
+# 增量指标：每来一根 bar O(1) 更新，结果与 indicators.py 的批量版逐位一致。
+# 滚动和/均值复刻 pandas 的补偿求和（add/remove 分别补偿），滚动极值用单调队列。
+import copy, json, math
+from collections import deque
+from pathlib import Path
+from numpy import log10 as _log10
+
+NAN = float("nan")
+
+class EMA:
+    """pandas ewm(span=n, adjust=False, min_periods=n).mean() 的逐点版。"""
+    def __init__(self, n: int):
+        self.n = int(n); self.w = NAN; self.cnt = 0; self.old_wt = 1.0
+        self.alpha = 1.0/(1.0 + (self.n-1)/2.0)
+
+    def update(self, x: float) -> float:
+        obs = not math.isnan(x)
+        if not math.isnan(self.w):
+            # ignore_na=False：缺失值也让旧权重继续衰减
+            self.old_wt *= 1.0-self.alpha
+            if obs:
+                if self.w != x:
+                    self.w = (self.old_wt*self.w + self.alpha*x)/(self.old_wt+self.alpha)
+                self.old_wt = 1.0
+        elif obs:
+            self.w = x
+        self.cnt += obs
+        return self.w if self.cnt >= self.n else NAN
+
+class RollingSum:
+    """Series.rolling(n).sum() / .mean() 的逐点版（min_periods=n）。"""
+    def __init__(self, n: int):
+        self.n = int(n); self.buf = deque(maxlen=self.n)
+        self.nobs = 0; self.sum = 0.0; self.c_add = 0.0; self.c_rm = 0.0
+        self.neg = 0; self.same = 0; self.prev = None
+
+    def push(self, x: float):
+        if len(self.buf) == self.n:
+            old = self.buf[0]
+            if not math.isnan(old):
+                self.nobs -= 1
+                y = -old - self.c_rm; t = self.sum + y
+                self.c_rm = t - self.sum - y; self.sum = t
+                if math.copysign(1.0, old) < 0: self.neg -= 1
+        if self.prev is None: self.prev = x
+        self.buf.append(x)
+        if not math.isnan(x):
+            self.nobs += 1
+            y = x - self.c_add; t = self.sum + y
+            self.c_add = t - self.sum - y; self.sum = t
+            if math.copysign(1.0, x) < 0: self.neg += 1
+            self.same = self.same+1 if x == self.prev else 1
+            self.prev = x
+
+    def total(self) -> float:
+        if self.nobs < self.n: return NAN
+        return self.prev*self.nobs if self.same >= self.nobs else self.sum
+
+    def mean(self) -> float:
+        if self.nobs < self.n or self.nobs <= 0: return NAN
+        r = self.sum/self.nobs
+        if self.same >= self.nobs: return self.prev
+        if self.neg == 0 and r < 0: return 0.0
+        if self.neg == self.nobs and r > 0: return 0.0
+        return r
+
+class RollingExtreme:
+    """Series.rolling(n).max()/.min() 的逐点版：单调队列，均摊 O(1)。"""
+    def __init__(self, n: int, is_max: bool = True):
+        self.n = int(n); self.is_max = is_max
+        self.q = deque(); self.i = 0; self.nan_at = deque()
+
+    def update(self, x: float) -> float:
+        i = self.i; self.i += 1
+        while self.q and self.q[0][0] <= i-self.n: self.q.popleft()
+        while self.nan_at and self.nan_at[0] <= i-self.n: self.nan_at.popleft()
+        if math.isnan(x): self.nan_at.append(i)
+        else:
+            while self.q and ((self.q[-1][1] <= x) if self.is_max else (self.q[-1][1] >= x)): self.q.pop()
+            self.q.append((i, x))
+        if self.i < self.n or self.nan_at or not self.q: return NAN
+        return self.q[0][1]
+
+def _tr(h, l, pc):
+    if math.isnan(pc): return NAN
+    return max(h-l, max(abs(h-pc), abs(l-pc)))
+
+class IndicatorState:
+    """单币全部增量指标：ema30 / atr14 / chop14 / cvd50 / tib20 / vboost20（+ 20 均量）。"""
+    def __init__(self):
+        self.pc = NAN; self.bars = 0
+        self.ema30 = EMA(30)
+        self.atr = RollingSum(14); self.tr14 = RollingSum(14)
+        self.hh = RollingExtreme(14, True); self.ll = RollingExtreme(14, False)
+        self.cvd = RollingSum(50); self.tib = RollingSum(20); self.vol = RollingSum(20)
+        self.last: dict = {}
+
+    def update(self, o: float, h: float, l: float, c: float, v: float) -> dict:
+        o, h, l, c, v = float(o), float(h), float(l), float(c), float(v)
+        tr = _tr(h, l, self.pc)
+        self.atr.push(tr); self.tr14.push(tr)
+        a = self.atr.mean()
+        s = self.tr14.total(); s = NAN if s == 0 else s
+        rng = self.hh.update(h) - self.ll.update(l)
+        ch = NAN if math.isnan(s) or math.isnan(rng) or rng <= 0 else 100*float(_log10(rng/s))  # 与 np.log10 同一实现
+        ret = 0.0 if math.isnan(self.pc) else c/self.pc - 1
+        if math.isnan(ret): ret = 0.0
+        self.cvd.push(((ret > 0) - (ret < 0))*v)  # np.sign(ret)*volume
+        self.tib.push(abs(c-o)/(a+1e-12))
+        self.vol.push(v)
+        vma = self.vol.mean()
+        self.pc = c; self.bars += 1
+        self.last = {"ema30": self.ema30.update(c), "atr": a, "chop": ch, "cvd": self.cvd.total(),
+                     "tib": self.tib.mean(), "vboost": v/(vma+1e-9), "vol_ma20": vma}
+        return self.last
+
+    def peek(self, o, h, l, c, v) -> dict:
+        # 用未收盘 bar 试算，不改变状态
+        return copy.deepcopy(self).update(o, h, l, c, v)
+
+    def to_dict(self) -> dict:
+        def enc(x):
+            if isinstance(x, deque): return {"__deque__": [enc(i) for i in x], "maxlen": x.maxlen}
+            if isinstance(x, tuple): return {"__tuple__": [enc(i) for i in x]}
+            if isinstance(x, (EMA, RollingSum, RollingExtreme)):
+                return {"__cls__": type(x).__name__, **{k: enc(v) for k,v in vars(x).items()}}
+            return x
+        return {k: enc(v) for k,v in vars(self).items()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "IndicatorState":
+        kinds = {"EMA": EMA, "RollingSum": RollingSum, "RollingExtreme": RollingExtreme}
+        def dec(x):
+            if isinstance(x, dict) and "__deque__" in x: return deque([dec(i) for i in x["__deque__"]], maxlen=x["maxlen"])
+            if isinstance(x, dict) and "__tuple__" in x: return tuple(dec(i) for i in x["__tuple__"])
+            if isinstance(x, dict) and "__cls__" in x:
+                obj = kinds[x["__cls__"]].__new__(kinds[x["__cls__"]])
+                obj.__dict__.update({k: dec(v) for k,v in x.items() if k != "__cls__"}); return obj
+            return x
+        st = cls.__new__(cls); st.__dict__.update({k: dec(v) for k,v in d.items()})
+        return st
+
+def dump_states(states: dict, path) -> None:
+    p = Path(path); p.parent.mkdir(parents=True, exist_ok=True)
+    tmp = p.with_suffix(".tmp")
+    tmp.write_text(json.dumps({k: s.to_dict() for k,s in states.items()}))
+    tmp.replace(p)
+
+def load_states(path) -> dict:
+    p = Path(path)
+    if not p.exists(): return {}
+    return {k: IndicatorState.from_dict(d) for k,d in json.loads(p.read_text()).items()}
@@ -0,0 +1,141 @@
+from __future__ import annotations
+# 参数扫描：在离线回测上对 params.yml 的阈值做网格 / 随机搜索。
+#   python -m ats.sweep --set thresholds.aplus.min_total=60,70,80 --set thresholds.gates.A.breakout_pad=-0.01,0 \
+#                       [--range thresholds.gates.C.speed_pctl=60:95 --samples 50] [--workers 8] [--out reports/sweep.csv]
+# 进程池按币分批：每批只载入、只算一次与阈值无关的指标（backtest.Features），再对全部组合求掩码；
+# 依赖阈值的中间量按阈值值缓存，信号掩码相同的组合直接复用撮合结果。
+import argparse, copy, hashlib, itertools, os, random, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np, pandas as pd
+from loguru import logger
+from . import backtest as BT
+from .klines import KLINE_DIR
+
+# 只影响撮合、不影响信号的键
+_SIM_KEYS = ("entry_ttl_bars", "max_hold_bars", "tp1_frac", "fee_maker_bps", "fee_taker_bps")
+# 只决定分批、与结果无关的键：扫描它没有意义（且任务按 base 的值切分），直接拒绝
+_FIXED_KEYS = ("backtest.chunk",)
+
+def check_keys(keys) -> None:
+    bad = [k for k in keys if k in _FIXED_KEYS]
+    if bad: raise ValueError(f"cannot sweep {', '.join(bad)}: it only sets batching, set it in params.yml instead")
+
+def _cast(v: str):
+    for f in (int, float):
+        try: return f(v)
+        except ValueError: pass
+    return v
+
+def set_dotted(params: dict, key: str, value) -> dict:
+    d = params; parts = key.split(".")
+    for k in parts[:-1]: d = d.setdefault(k, {})
+    d[parts[-1]] = value
+    return params
+
+def get_dotted(params: dict, key: str):
+    d = params
+    for k in key.split("."): d = d[k]
+    return d
+
+def combos(grid: dict, ranges: dict, samples: int = 0, seed: int = 0) -> list[dict]:
+    """grid: key -> 取值列表（笛卡尔积）；ranges: key -> (lo, hi, is_int)，每个网格点再随机采 samples 个。"""
+    keys = list(grid)
+    base = [dict(zip(keys, vals)) for vals in itertools.product(*(grid[k] for k in keys))] or [{}]
+    if not ranges: return base
+    rnd = random.Random(seed); out = []
+    for b in base:
+        for _ in range(max(1, samples)):
+            out.append({**b, **{k: (rnd.randint(int(lo), int(hi)) if is_int else round(rnd.uniform(lo, hi), 6))
+                                for k, (lo, hi, is_int) in ranges.items()}})
+    return out
+
+def _digest(mask: np.ndarray) -> str:
+    return hashlib.blake2b(np.packbits(mask).tobytes(), digest_size=16).hexdigest()
+
+def _eval_chunk(args) -> list:
+    # 子进程：一批币 × 全部组合；返回精简成交行（带组合编号）
+    # backtest.window 决定预热长度与 Features 本身：按 window 分组，每组各载入、各算一次
+    base, cs, syms, interval, root, start, end = args
+    groups: dict[int, list] = {}; rows = []
+    for ci, c in enumerate(cs):
+        params = copy.deepcopy(base)
+        for k, v in c.items(): set_dotted(params, k, v)
+        groups.setdefault(int(BT.bt_config(params)["window"]), []).append((ci, params))
+    for window, members in groups.items():
+        for p, keep in BT.iter_chunks(syms, interval, root, start, end, window, len(syms)):
+            F = BT.Features(p, window); sims: dict = {}
+            for ci, params in members:
+                sig = BT.clip(BT.signals(F, params), keep)
+                scfg = BT.bt_config(params); skey = tuple(scfg[k] for k in _SIM_KEYS)
+                wts = tuple(params.get("planner",{}).get("weights",{}).get("default",[0.6,0.3,0.1]))
+                for i in range(len(p["symbols"])):
+                    m = sig["signal"][i]
+                    if not m.any(): continue
+                    key = (i, _digest(m), skey, wts)
+                    if key not in sims: sims[key] = BT.simulate(p, sig, params, i)
+                    rows += [(ci, t["symbol"], t["exit_time"], t["bars"], t["legs_filled"], t["exit_reason"], t["pnl_R"])
+                             for t in sims[key]]
+    return rows
+
+def sweep(base: dict, cs: list[dict], interval: str = "1h", symbols: list | None = None, start=None, end=None,
+          root: str = KLINE_DIR, workers: int = 0) -> pd.DataFrame:
+    check_keys({k for c in cs for k in c})
+    syms = symbols or BT.list_symbols(interval, root)
+    chunk = int(BT.bt_config(base)["chunk"])
+    tasks = [(base, cs, syms[k:k+chunk], interval, root, start, end) for k in range(0, len(syms), chunk)]
+    workers = workers or min(len(tasks), os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex: parts = list(ex.map(_eval_chunk, tasks))
+    else:
+        parts = [_eval_chunk(t) for t in tasks]
+    cols = ["combo","symbol","exit_time","bars","legs_filled","exit_reason","pnl_R"]
+    tr = pd.DataFrame([r for part in parts for r in part], columns=cols)
+    out = []
+    for ci, c in enumerate(cs):
+        st = BT.stats(tr[tr["combo"] == ci])
+        st.pop("exits", None)
+        out.append({**c, **st})
+    res = pd.DataFrame(out)
+    return res.sort_values("sum_R", ascending=False, na_position="last") if "sum_R" in res else res
+
+def _parse_set(items: list) -> dict:
+    out = {}
+    for it in items or []:
+        k, v = it.split("=", 1); out[k] = [_cast(x) for x in v.split(",") if x != ""]
+    return out
+
+def _parse_range(items: list) -> dict:
+    out = {}
+    for it in items or []:
+        k, v = it.split("=", 1); lo, hi = v.split(":")[:2]
+        out[k] = (_cast(lo), _cast(hi), isinstance(_cast(lo), int) and isinstance(_cast(hi), int))
+    return out
+
+def main(argv=None):
+    import yaml
+    ap = argparse.ArgumentParser(prog="python -m ats.sweep")
+    ap.add_argument("--params", default="params.yml"); ap.add_argument("--interval", default="1h")
+    ap.add_argument("--set", action="append", help="点分键=v1,v2,...（网格）")
+    ap.add_argument("--range", action="append", help="点分键=lo:hi（随机，整数端点则取整数）")
+    ap.add_argument("--samples", type=int, default=20); ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--symbols", default=""); ap.add_argument("--start"); ap.add_argument("--end")
+    ap.add_argument("--root", default=KLINE_DIR); ap.add_argument("--workers", type=int, default=0)
+    ap.add_argument("--out", default="")
+    a = ap.parse_args(argv)
+    base = yaml.safe_load(open(a.params)) or {}
+    grid, ranges = _parse_set(a.set), _parse_range(a.range)
+    try: check_keys(list(grid) + list(ranges))
+    except ValueError as e: ap.error(str(e))
+    for k in list(grid) + list(ranges):  # 键写错直接报错（backtest.* 可用默认值）
+        get_dotted({"backtest": BT.DEFAULTS, **base} if k.startswith("backtest.") else base, k)
+    cs = combos(grid, ranges, a.samples, a.seed)
+    t0 = time.perf_counter()
+    res = sweep(base, cs, a.interval, [s for s in a.symbols.split(",") if s] or None, a.start, a.end, a.root, a.workers)
+    out = a.out or f"reports/sweep_{time.strftime('%Y%m%dT%H%M%S')}.csv"
+    Path(out).parent.mkdir(parents=True, exist_ok=True); res.to_csv(out, index=False)
+    logger.info("sweep {} combos in {:.1f}s -> {}", len(cs), time.perf_counter()-t0, out)
+    print(res.head(20).to_string(index=False))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
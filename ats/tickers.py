@@ -0,0 +1,69 @@
+from __future__ import annotations
+# 24h tickers 快照：每次扫描至多拉一次（权重 40），解析一次成数值列，基础池与 overlay 共用
+import time
+import numpy as np
+
+def _num(vals: list) -> np.ndarray:
+    try:
+        return np.asarray(vals, dtype=np.float64)
+    except (TypeError, ValueError):
+        # 个别脏值：逐个解析，失败记 NaN
+        out = np.full(len(vals), np.nan)
+        for i, v in enumerate(vals):
+            try: out[i] = float(str(v).replace("%", ""))
+            except (TypeError, ValueError): pass
+        return out
+
+class TickerSnapshot:
+    def __init__(self, sym: np.ndarray, qv: np.ndarray, pcp: np.ndarray, last: np.ndarray, ts: float):
+        self.sym, self.qv, self.pcp, self.last, self.ts = sym, qv, pcp, last, ts
+        self._masks: dict = {}
+
+    @classmethod
+    def from_payload(cls, t24: list, ts: float | None = None) -> "TickerSnapshot":
+        sym = np.array([str(it.get("symbol") or "") for it in t24], dtype=str)
+        qv = _num([it.get("quoteVolume") or 0.0 for it in t24])
+        pcp = _num([it.get("priceChangePercent") or "0" for it in t24])
+        last = _num([it.get("lastPrice") or "nan" for it in t24])
+        return cls(sym, qv, pcp, last, time.time() if ts is None else ts)
+
+    def __len__(self): return len(self.sym)
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.ts
+
+    def quote_mask(self, quotes=("USDT",)) -> np.ndarray:
+        # 快照不可变，按报价资产缓存（np.char.endswith 逐元素走 Python，比 str.endswith 还慢）
+        key = tuple(quotes)
+        if key not in self._masks:
+            self._masks[key] = np.fromiter((s.endswith(key) for s in self.sym.tolist()), dtype=bool, count=len(self.sym))
+        return self._masks[key]
+
+def top_k_desc(keys: tuple, k: int, idx: np.ndarray | None = None) -> np.ndarray:
+    """按 keys（主键在前）降序取前 k 的下标；同值保持原顺序（与 sorted(reverse=True) 一致）。
+    先对主键 argpartition 取第 k 大的阈值，只对 ≥ 阈值的候选做 lexsort。"""
+    idx = np.arange(len(keys[0])) if idx is None else idx
+    k = int(k)
+    if k <= 0 or idx.size == 0: return idx[:0]
+    if idx.size > k:
+        p = keys[0][idx]
+        thr = p[np.argpartition(-p, k-1)[k-1]]
+        idx = idx[p >= thr]
+    order = np.lexsort((idx,) + tuple(-key[idx] for key in reversed(keys)))
+    return idx[order][:k]
+
+_SNAP = {"snap": None, "fetches": 0}
+
+def get_snapshot(bnz, ttl_sec: float) -> TickerSnapshot:
+    snap = _SNAP["snap"]
+    if snap is not None and len(snap) and snap.age < float(ttl_sec):
+        return snap
+    snap = TickerSnapshot.from_payload(bnz.tickers_24h())
+    _SNAP.update(snap=snap, fetches=_SNAP["fetches"]+1)
+    return snap
+
+def snapshot_stats() -> dict:
+    snap = _SNAP["snap"]
+    return {"n": len(snap) if snap is not None else 0, "age_sec": round(snap.age, 1) if snap is not None else None,
+            "fetches": _SNAP["fetches"]}
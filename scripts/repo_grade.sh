@@ -32,12 +32,12 @@ fi
 # ---------- params.yml 关键项（用 sed 提取） ----------
 PARAMS="${ROOT}/params.yml"
 [ -f "${PARAMS}" ] || { echo "❌ 缺少 params.yml"; pass=0; }
-MAX_SYM=""; MIN_QV=""; SCAN_MAX=""; SCAN_PAUSE=""
+MAX_SYM=""; MIN_QV=""; SCAN_MAX=""; SCAN_WEIGHT=""
 if [ -f "${PARAMS}" ]; then
   MAX_SYM=$(sed -n 's/^[[:space:]]*max_symbols:[[:space:]]*\([0-9]\+\)$/\1/p' "${PARAMS}" | head -n1)
   MIN_QV=$(sed -n 's/^[[:space:]]*min_quote_vol:[[:space:]]*\([0-9][0-9]*\).*$/\1/p' "${PARAMS}" | head -n1)
   SCAN_MAX=$(sed -n 's/^[[:space:]]*max_symbols_per_scan:[[:space:]]*\([0-9]\+\)$/\1/p' "${PARAMS}" | head -n1)
-  SCAN_PAUSE=$(sed -n 's/^[[:space:]]*per_symbol_pause_ms:[[:space:]]*\([0-9]\+\)$/\1/p' "${PARAMS}" | head -n1)
+  SCAN_WEIGHT=$(sed -n 's/^[[:space:]]*weight_limit_1m:[[:space:]]*\([0-9]\+\)$/\1/p' "${PARAMS}" | head -n1)
 
   # 规则：max_symbols <= 30（推荐 18）；min_quote_vol 必须有数值
   if [ -z "${MAX_SYM}" ]; then warns+=("⚠️ 未检测到 symbol_pool.max_symbols"); pass=0; fi
@@ -111,7 +111,7 @@ PY
   echo "- symbol_pool.max_symbols: \`${MAX_SYM:-unset}\`"
   echo "- symbol_pool.min_quote_vol: \`${MIN_QV:-unset}\`"
   echo "- scan.max_symbols_per_scan: \`${SCAN_MAX:-unset}\`"
-  echo "- scan.per_symbol_pause_ms: \`${SCAN_PAUSE:-unset}\`"
+  echo "- scan.weight_limit_1m: \`${SCAN_WEIGHT:-unset}\`"
   echo
   echo "## 其他检查"
   echo "- .gitignore 忽略 .env: \`${IGNORE_OK}\`"
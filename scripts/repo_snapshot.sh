@@ -34,7 +34,7 @@ USES_MODULE=$(grep -q 'python -m ats.app' "${COMPOSE}" 2>/dev/null && echo "yes"
 MAX_SYM=$(sed -n 's/^[[:space:]]*max_symbols:[[:space:]]*\([0-9]\+\)$/\1/p' "${ROOT}/params.yml" | head -n1)
 MIN_QV=$(sed -n 's/^[[:space:]]*min_quote_vol:[[:space:]]*\([0-9][0-9]*\).*$/\1/p' "${ROOT}/params.yml" | head -n1)
 SCAN_MAX=$(sed -n 's/^[[:space:]]*max_symbols_per_scan:[[:space:]]*\([0-9]\+\)$/\1/p' "${ROOT}/params.yml" | head -n1)
-SCAN_PAUSE=$(sed -n 's/^[[:space:]]*per_symbol_pause_ms:[[:space:]]*\([0-9]\+\)$/\1/p' "${ROOT}/params.yml" | head -n1)
+SCAN_WEIGHT=$(sed -n 's/^[[:space:]]*weight_limit_1m:[[:space:]]*\([0-9]\+\)$/\1/p' "${ROOT}/params.yml" | head -n1)
 
 # 统计
 PY_COUNT=$(find "${ROOT}" -type f -name "*.py" -not -path "*/.git/*" | wc -l | tr -d ' ')
@@ -114,7 +114,7 @@ PY
   echo "- symbol_pool.max_symbols: \`${MAX_SYM:-unset}\`"
   echo "- symbol_pool.min_quote_vol: \`${MIN_QV:-unset}\`"
   echo "- scan.max_symbols_per_scan: \`${SCAN_MAX:-unset}\`"
-  echo "- scan.per_symbol_pause_ms: \`${SCAN_PAUSE:-unset}\`"
+  echo "- scan.weight_limit_1m: \`${SCAN_WEIGHT:-unset}\`"
   echo
   echo "## .env（打码）"
   echo "- BINANCE_API_KEY: \`$(mask "${BINANCE_API_KEY:-}")\`"
@@ -139,7 +139,7 @@ PY
   [ -z "${MAX_SYM:-}" ] && { echo "- ⚠️ params.yml 未设置 \`symbol_pool.max_symbols\`"; WARN=1; }
   [ -z "${MIN_QV:-}" ] && { echo "- ⚠️ params.yml 未设置 \`symbol_pool.min_quote_vol\`"; WARN=1; }
   [ -z "${SCAN_MAX:-}" ] && { echo "- ℹ️ 未设置 \`scan.max_symbols_per_scan\`（将采用代码默认值）"; }
-  [ -z "${SCAN_PAUSE:-}" ] && { echo "- ℹ️ 未设置 \`scan.per_symbol_pause_ms\`（将采用代码默认值）"; }
+  [ -z "${SCAN_WEIGHT:-}" ] && { echo "- ℹ️ 未设置 \`scan.weight_limit_1m\`（将采用代码默认值）"; }
   [ "${CHANGES}" != "0" ] && { echo "- ℹ️ 工作区有本地改动数量：${CHANGES}（如需对齐远端可 \`git reset --hard origin/main\`）"; }
   [ "${WARN}" = "0" ] && echo "- ✅ 关键配置看起来正常"
 } > "${OUT}"
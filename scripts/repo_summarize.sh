@@ -115,7 +115,7 @@ print("## 关键配置摘录")
 print(f"- symbol_pool.max_symbols: `{sympool.get('max_symbols','unset')}`")
 print(f"- symbol_pool.min_quote_vol: `{sympool.get('min_quote_vol','unset')}`")
 print(f"- scan.max_symbols_per_scan: `{scan.get('max_symbols_per_scan','unset')}`")
-print(f"- scan.per_symbol_pause_ms: `{scan.get('per_symbol_pause_ms','unset')}`")
+print(f"- scan.weight_limit_1m: `{scan.get('weight_limit_1m','unset')}`")
 print(f"- scan.tickers_cache_sec: `{scan.get('tickers_cache_sec','unset')}`")
 print()
 print("## docker-compose.yml（关键信息）")
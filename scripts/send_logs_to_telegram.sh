@@ -75,7 +75,7 @@ if p.exists():
     sc = params.get('scan', {}) or {}
     thD = (params.get('thresholds', {}) or {}).get('D', {}) or {}
     print(f"- symbol_pool: max_symbols={sp.get('max_symbols')}  min_quote_vol={sp.get('min_quote_vol')}")
-    print(f"- scan: max_symbols_per_scan={sc.get('max_symbols_per_scan')}  per_symbol_pause_ms={sc.get('per_symbol_pause_ms')}  tickers_cache_sec={sc.get('tickers_cache_sec')}")
+    print(f"- scan: max_symbols_per_scan={sc.get('max_symbols_per_scan')}  weight_limit_1m={sc.get('weight_limit_1m')}  tickers_cache_sec={sc.get('tickers_cache_sec')}")
     print(f"- thresholds.D: spread_bps={thD.get('spread_bps')}  impact_bps={thD.get('impact_bps')}  obi_abs={thD.get('obi_abs')}  room_atr_min={thD.get('room_atr_min')}  cost_R_max={thD.get('cost_R_max')}")
 else:
     print("(params.yml not found)")